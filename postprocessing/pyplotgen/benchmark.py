@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+:date: October 2026
+
+Benchmark harness for the PyPlotGen pipeline.
+It synthesizes CLUBB-like zt, zm and sfc netcdf files of configurable size and runs the stages of a
+normal PyPlotGen run on them one after another, measuring the wall time and peak memory of each stage:
+
+* case loading: Creating the CaseGallerySetup, which opens the netcdf files
+* variable groups: Creating the VariableGroups, which read the data and create the panels
+  (excluding the time spent in _calc functions)
+* calc functions: Evaluating the _calc functions of the VariableGroups
+* panel rendering: Plotting every panel to an image file
+* gallery: Generating the html gallery
+
+Since the input files are synthesized, results of different versions of PyPlotGen (or different options) can be
+compared offline. Example usage:
+
+    ./benchmark.py --levels 200 --timesteps 720 -b --json before.json
+
+Peak memory is measured with tracemalloc, which covers all allocations made by python and numpy,
+and is given relative to the memory allocated when the stage started.
+"""
+import argparse
+import copy
+import functools
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from netCDF4 import Dataset
+
+try:
+    import resource
+except ImportError:
+    # resource is not available on Windows, so the maximum resident set size is not reported there
+    resource = None
+
+from config import Case_definitions
+from python_html_gallery import gallery
+from src.CaseGallerySetup import CaseGallerySetup
+from src.DatasetCache import getSharedArrayCache, getSharedDatasetCache
+
+STAGE_CASE_LOADING = 'case loading'
+STAGE_VARIABLE_GROUPS = 'variable groups'
+STAGE_CALC_FUNCTIONS = 'calc functions'
+STAGE_PANEL_RENDERING = 'panel rendering'
+STAGE_GALLERY = 'gallery'
+ALL_STAGES = [STAGE_CASE_LOADING, STAGE_VARIABLE_GROUPS, STAGE_CALC_FUNCTIONS, STAGE_PANEL_RENDERING, STAGE_GALLERY]
+
+# Seconds between two synthesized output times, CLUBB's usual statistics output interval
+OUTPUT_INTERVAL = 60.0
+# Height of the top level of the synthesized grids in meters
+GRID_TOP = 2500.0
+
+
+class PipelineBenchmark:
+    """
+    Synthesizes input files for a case and times the stages of the PyPlotGen pipeline on them.
+    The case uses the definition of BOMEX, except for its input files, time averaging interval and height range,
+    which are adjusted to the synthesized files.
+
+    For information on the input parameters of this class, please see the documentation for the
+    ``__init__()`` method.
+    """
+
+    def __init__(self, work_folder, num_levels=100, num_timesteps=360, num_variables=None, plot_budgets=False,
+                 image_extension=".png", trace_memory=True, seed=0):
+        """
+        Creates a benchmark. No files are written until synthesizeInput() or run() is called.
+
+        :param work_folder: Folder in which the input files and the output of the benchmark are written
+        :param num_levels: Number of vertical levels of the zt and zm files
+        :param num_timesteps: Number of output times in each file
+        :param num_variables: Number of profile variables written to the zt and zm files. If None (default),
+            every variable plotted by the benchmarked VariableGroups is written. If it is larger than the number of
+            plotted variables, the files are padded with unplotted filler variables.
+        :param plot_budgets: If True, the budget panels are benchmarked as well (like pyplotgen's -b option)
+        :param image_extension: Image format of the rendered panels, e.g. ".png" or ".svg"
+        :param trace_memory: If True (default), the peak memory of each stage is measured. Memory tracing slows
+            down python code considerably, so disable it for more accurate wall times.
+        :param seed: Seed of the random numbers used as data
+        """
+        self.work_folder = os.path.abspath(work_folder)
+        self.input_folder = os.path.join(self.work_folder, 'input')
+        self.output_folder = os.path.join(self.work_folder, 'output')
+        self.num_levels = num_levels
+        self.num_timesteps = num_timesteps
+        self.num_variables = num_variables
+        self.plot_budgets = plot_budgets
+        self.image_extension = image_extension
+        self.trace_memory = trace_memory
+        self.seed = seed
+
+        self.case_definition = copy.copy(Case_definitions.BOMEX)
+        self.case_definition['clubb_file'] = {'zm': '/' + self.case_definition['name'] + '_zm.nc',
+                                              'zt': '/' + self.case_definition['name'] + '_zt.nc',
+                                              'sfc': '/' + self.case_definition['name'] + '_sfc.nc'}
+        # Average over the second half of the run, like most case definitions do
+        end_time = int(num_timesteps * OUTPUT_INTERVAL / 60)
+        self.case_definition['start_time'] = end_time // 2 + 1
+        self.case_definition['end_time'] = end_time
+        self.case_definition['height_min_value'] = 0
+        self.case_definition['height_max_value'] = GRID_TOP
+        self.var_groups = list(self.case_definition['var_groups'])
+
+        self.__calc_time = 0
+        self.__calc_peak = 0
+        self.__calc_depth = 0
+        self.__stage_peak = 0
+
+    def synthesizeInput(self):
+        """
+        Writes the zt, zm and sfc files of the benchmark case into the input folder.
+        Timeseries variables are written to the sfc file and all other variables to both the zt and zm files.
+
+        :return: Name of the input folder
+        """
+        profile_names, timeseries_names = self.getPlottedVariableNames()
+        if self.num_variables is not None:
+            num_fillers = max(self.num_variables - len(profile_names), 0)
+            profile_names = profile_names[:self.num_variables] + \
+                            ['benchmark_filler_' + str(i) for i in range(num_fillers)]
+
+        os.makedirs(self.input_folder, exist_ok=True)
+        random_generator = np.random.default_rng(self.seed)
+        grid_spacing = GRID_TOP / max(self.num_levels - 1, 1)
+        zt_levels = np.linspace(0, GRID_TOP, self.num_levels)
+        grids = {'zt': (zt_levels, profile_names),
+                 'zm': (zt_levels + grid_spacing / 2, profile_names),
+                 'sfc': (np.zeros(1), timeseries_names)}
+        for type_ext, (levels, varnames) in grids.items():
+            filename = self.input_folder + self.case_definition['clubb_file'][type_ext]
+            self.__writeDataset__(filename, levels, varnames, random_generator)
+        return self.input_folder
+
+    def getPlottedVariableNames(self):
+        """
+        Returns the names of the CLUBB variables read by the benchmarked VariableGroups.
+        The groups are created for a case without any input files, which only sets up their variable definitions.
+
+        :return: Tuple of sorted lists (names of profile variables, names of timeseries variables)
+        """
+        case = CaseGallerySetup(self.case_definition, clubb_folders=[], sam_folders=[])
+        profile_names = set()
+        timeseries_names = set()
+        for VarGroup in self.__getVariableGroupClasses__():
+            for variable in VarGroup(case).variable_definitions:
+                varnames = [name for name in variable['var_names']['clubb'] if isinstance(name, str)]
+                lines = variable.get('lines', [])
+                if isinstance(lines, dict):
+                    lines = lines.get('clubb', [])
+                for line in lines:
+                    varnames.extend(name for name in line['var_names'] if isinstance(name, str))
+                # Skip placeholders like '' that do not name a variable
+                varnames = [name for name in varnames if name.isidentifier()]
+                if variable.get('type') == 'timeseries':
+                    timeseries_names.update(varnames)
+                else:
+                    profile_names.update(varnames)
+        # rcm is needed for the background rcm contours of the profile panels
+        profile_names.add('rcm')
+        profile_names -= set(Case_definitions.TIME_VAR_NAMES + Case_definitions.HEIGHT_VAR_NAMES)
+        timeseries_names -= set(Case_definitions.TIME_VAR_NAMES + Case_definitions.HEIGHT_VAR_NAMES)
+        return sorted(profile_names), sorted(timeseries_names)
+
+    def run(self, stages=ALL_STAGES):
+        """
+        Synthesizes the input files if they do not exist yet and runs the pipeline on them.
+        The shared dataset and array caches are cleared first, so each run starts cold.
+        Stages that are not listed are skipped, but the stages they depend on still run.
+
+        :param stages: List of the stages to run, see ALL_STAGES
+        :return: List of dicts, one for each stage that was run, with the keys 'stage', 'wall_time' (seconds),
+            'peak_memory' (bytes, None if memory was not traced) and 'max_rss' (maximum resident set size
+            of the process at the end of the stage in bytes, None if unknown)
+        """
+        if not os.path.exists(self.input_folder + self.case_definition['clubb_file']['zt']):
+            self.synthesizeInput()
+        if os.path.exists(self.output_folder):
+            shutil.rmtree(self.output_folder)
+        os.makedirs(self.output_folder)
+        getSharedArrayCache().clear()
+        getSharedDatasetCache().clear()
+
+        if self.trace_memory:
+            tracemalloc.start()
+        try:
+            return self.__runStages__(stages)
+        finally:
+            if self.trace_memory:
+                tracemalloc.stop()
+
+    @staticmethod
+    def formatResults(results):
+        """
+        Formats benchmark results as a table
+
+        :param results: List of result dicts as returned by run()
+        :return: Table string
+        """
+        lines = ["{:<16} {:>12} {:>16} {:>14}".format('Stage', 'Wall time', 'Peak memory', 'Max RSS')]
+        for result in results:
+            lines.append("{:<16} {:>11.3f}s {:>16} {:>14}".format(result['stage'], result['wall_time'],
+                                                                PipelineBenchmark.__formatBytes__(result['peak_memory']),
+                                                                PipelineBenchmark.__formatBytes__(result['max_rss'])))
+        lines.append("{:<16} {:>11.3f}s".format('total', sum(result['wall_time'] for result in results)))
+        return '\n'.join(lines)
+
+    def __runStages__(self, stages):
+        """
+        Runs the pipeline stages, see run()
+
+        :param stages: List of the stages to run
+        :return: List of result dicts
+        """
+        results = []
+        case_definition = dict(self.case_definition, var_groups=[])
+        case, result = self.__measure__(STAGE_CASE_LOADING, CaseGallerySetup, case_definition,
+                                        clubb_folders=[self.input_folder], sam_folders=[],
+                                        image_extension=self.image_extension)
+        if STAGE_CASE_LOADING in stages:
+            results.append(result)
+        if not set(stages) - {STAGE_CASE_LOADING}:
+            return results
+
+        # The case was created without panels, so the VariableGroups are created here, through the same methods
+        # CaseGallerySetup uses
+        case.var_groups = self.var_groups
+        case.plot_budgets = self.plot_budgets
+        self.__calc_time = 0
+        self.__calc_peak = 0
+        original_calc_functions = self.__wrapCalcFunctions__()
+        try:
+            total_panels, result = self.__measure__(STAGE_VARIABLE_GROUPS, self.__generatePanels__, case)
+        finally:
+            self.__restoreCalcFunctions__(original_calc_functions)
+        case.total_panels_to_plot = total_panels
+        result['wall_time'] -= self.__calc_time
+        calc_result = {'stage': STAGE_CALC_FUNCTIONS, 'wall_time': self.__calc_time,
+                       'peak_memory': self.__calc_peak if self.trace_memory else None,
+                       'max_rss': result['max_rss']}
+        results.extend(result for result in [result, calc_result] if result['stage'] in stages)
+
+        if STAGE_PANEL_RENDERING in stages or STAGE_GALLERY in stages:
+            plot_jobs = case.getPlotJobs(self.output_folder)
+            filtering_flags, result = self.__measure__(STAGE_PANEL_RENDERING, lambda: [job.run() for job in plot_jobs])
+            if STAGE_PANEL_RENDERING in stages:
+                results.append(result)
+        if STAGE_GALLERY in stages:
+            working_directory = os.getcwd()
+            try:
+                gallery_result = self.__measure__(STAGE_GALLERY, gallery.main, self.output_folder,
+                                                  file_extension=self.image_extension)[1]
+            finally:
+                # The gallery changes into the output folder
+                os.chdir(working_directory)
+            results.append(gallery_result)
+        return results
+
+    @staticmethod
+    def __generatePanels__(case):
+        """
+        Creates the budget and VariableGroup panels of a case that was created without them
+
+        :param case: CaseGallerySetup object
+        :return: Number of panels of the case
+        """
+        case.__generateBudgetPanels__()
+        return case.__generateVariableGroupPanels__()
+
+    def __measure__(self, stage, function, *args, **kwargs):
+        """
+        Calls a function and measures its wall time and peak memory
+
+        :param stage: Name of the stage the function belongs to
+        :param function: The function to call
+        :param args: Positional arguments passed to function
+        :param kwargs: Keyword arguments passed to function
+        :return: Tuple (return value of function, result dict as described in run())
+        """
+        start_memory = 0
+        if self.trace_memory:
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.__stage_peak = 0
+        start_time = time.perf_counter()
+        return_value = function(*args, **kwargs)
+        wall_time = time.perf_counter() - start_time
+        peak_memory = None
+        if self.trace_memory:
+            peak_memory = max(self.__stage_peak, tracemalloc.get_traced_memory()[1]) - start_memory
+        return return_value, {'stage': stage, 'wall_time': wall_time, 'peak_memory': peak_memory,
+                              'max_rss': self.__getMaxRss__()}
+
+    def __wrapCalcFunctions__(self):
+        """
+        Replaces the _calc functions of the benchmarked VariableGroup classes with wrappers that measure them.
+        _calc functions are recognized by their dataset_override parameter.
+
+        :return: List of tuples (class, function name, original class attribute or None) for
+            __restoreCalcFunctions__()
+        """
+        original_calc_functions = []
+        for VarGroup in self.__getVariableGroupClasses__():
+            for name, function in inspect.getmembers(VarGroup, inspect.isfunction):
+                if 'dataset_override' in inspect.signature(function).parameters:
+                    original_calc_functions.append((VarGroup, name, VarGroup.__dict__.get(name)))
+                    setattr(VarGroup, name, self.__getCalcWrapper__(function))
+        return original_calc_functions
+
+    @staticmethod
+    def __restoreCalcFunctions__(original_calc_functions):
+        """
+        Undoes __wrapCalcFunctions__()
+
+        :param original_calc_functions: List returned by __wrapCalcFunctions__()
+        :return: None
+        """
+        for VarGroup, name, original_function in reversed(original_calc_functions):
+            if original_function is None:
+                delattr(VarGroup, name)
+            else:
+                setattr(VarGroup, name, original_function)
+
+    def __getCalcWrapper__(self, function):
+        """
+        Returns a wrapper for a _calc function that adds its wall time and peak memory to the calc totals.
+        Calls of _calc functions from within other _calc functions are only counted once.
+
+        :param function: The _calc function
+        :return: Wrapper function
+        """
+        @functools.wraps(function)
+        def calcWrapper(*args, **kwargs):
+            if self.__calc_depth > 0:
+                return function(*args, **kwargs)
+            start_memory = 0
+            if self.trace_memory:
+                start_memory, peak_memory = tracemalloc.get_traced_memory()
+                self.__stage_peak = max(self.__stage_peak, peak_memory)
+                tracemalloc.reset_peak()
+            self.__calc_depth += 1
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.__calc_time += time.perf_counter() - start_time
+                self.__calc_depth -= 1
+                if self.trace_memory:
+                    peak_memory = tracemalloc.get_traced_memory()[1]
+                    self.__stage_peak = max(self.__stage_peak, peak_memory)
+                    self.__calc_peak = max(self.__calc_peak, peak_memory - start_memory)
+
+        return calcWrapper
+
+    def __getVariableGroupClasses__(self):
+        """
+        Returns the VariableGroup classes benchmarked by this object
+
+        :return: List of classes
+        """
+        if self.plot_budgets:
+            return self.var_groups + [CaseGallerySetup.ADDITIONAL_VARIABLE_GROUPS[0]]
+        return list(self.var_groups)
+
+    def __writeDataset__(self, filename, levels, varnames, random_generator):
+        """
+        Writes a netcdf file in the format of CLUBB's output files, filled with random data
+
+        :param filename: Name of the file to write
+        :param levels: Heights of the vertical levels in meters
+        :param varnames: Names of the variables to write in addition to time and altitude
+        :param random_generator: numpy random Generator used for the data
+        :return: None
+        """
+        dataset = Dataset(filename, 'w', format='NETCDF4')
+        dataset.createDimension('time', self.num_timesteps)
+        dataset.createDimension('altitude', len(levels))
+        dataset.createDimension('latitude', 1)
+        dataset.createDimension('longitude', 1)
+        time_variable = dataset.createVariable('time', 'f8', ('time',))
+        time_variable.units = 'seconds since 2000-01-01 00:00:00'
+        time_variable[:] = np.arange(1, self.num_timesteps + 1) * OUTPUT_INTERVAL
+        altitude_variable = dataset.createVariable('altitude', 'f8', ('altitude',))
+        altitude_variable.long_name = 'altitude (height above mean sea level)'
+        altitude_variable.units = 'm'
+        altitude_variable[:] = levels
+        for varname in varnames:
+            variable = dataset.createVariable(varname, 'f4', ('time', 'altitude', 'latitude', 'longitude'))
+            variable.long_name = varname
+            variable.units = '-'
+            variable[:] = random_generator.random((self.num_timesteps, len(levels), 1, 1), dtype=np.float32)
+        dataset.close()
+
+    @staticmethod
+    def __getMaxRss__():
+        """
+        Returns the maximum resident set size the process had so far
+
+        :return: Size in bytes, or None on platforms without the resource module
+        """
+        if resource is None:
+            return None
+        # ru_maxrss is given in kilobytes on Linux and in bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if os.uname().sysname == 'Darwin' else max_rss * 1024
+
+    @staticmethod
+    def __formatBytes__(num_bytes):
+        """
+        Formats a number of bytes for the result table
+
+        :param num_bytes: Number of bytes or None
+        :return: String in MiB
+        """
+        if num_bytes is None:
+            return '-'
+        return "{:.1f} MiB".format(num_bytes / 1024 ** 2)
+
+
+def __processArguments__():
+    """
+    This method takes arguments in from the command line and runs the benchmark
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the PyPlotGen pipeline on synthesized CLUBB output.")
+    parser.add_argument("--levels", help="Number of vertical levels in the zt and zm files.", type=int, default=100)
+    parser.add_argument("--timesteps", help="Number of output times in each file.", type=int, default=360)
+    parser.add_argument("--variables", help="Number of profile variables in the zt and zm files. "
+                                            "Defaults to all variables plotted by the benchmarked VariableGroups.",
+                        type=int, default=None)
+    parser.add_argument("-b", "--plot-budgets", help="Include budget panels.", action="store_true")
+    parser.add_argument("--svg", help="Render images to .svg instead of .png.", action="store_true")
+    parser.add_argument("--stages", help="Stages to run. Defaults to all stages.", nargs='+', choices=ALL_STAGES,
+                        default=ALL_STAGES)
+    parser.add_argument("--repeat", help="Number of times the stages are run. For each stage the fastest run is "
+                                         "reported.", type=int, default=1)
+    parser.add_argument("--no-memory", help="Do not trace memory. This makes the wall times more accurate.",
+                        action="store_true")
+    parser.add_argument("--work-dir", help="Folder for the input and output files. Defaults to a temporary "
+                                           "folder that is removed afterwards.", default=None)
+    parser.add_argument("--json", help="Also write the results to this json file.", default=None)
+    args = parser.parse_args()
+
+    work_folder = args.work_dir
+    if work_folder is None:
+        temp_folder = tempfile.TemporaryDirectory(prefix='pyplotgen_benchmark_')
+        work_folder = temp_folder.name
+    image_extension = ".svg" if args.svg else ".png"
+    benchmark = PipelineBenchmark(work_folder, num_levels=args.levels, num_timesteps=args.timesteps,
+                                  num_variables=args.variables, plot_budgets=args.plot_budgets,
+                                  image_extension=image_extension, trace_memory=not args.no_memory)
+    start_time = time.perf_counter()
+    benchmark.synthesizeInput()
+    print("Synthesized input files in {:.3f}s".format(time.perf_counter() - start_time))
+
+    best_results = None
+    for _ in range(args.repeat):
+        results = benchmark.run(args.stages)
+        if best_results is None:
+            best_results = results
+        else:
+            best_results = [min(best, result, key=lambda stage_result: stage_result['wall_time'])
+                            for best, result in zip(best_results, results)]
+    print(PipelineBenchmark.formatResults(best_results))
+
+    if args.json is not None:
+        settings = {'levels': args.levels, 'timesteps': args.timesteps, 'variables': args.variables,
+                    'plot_budgets': args.plot_budgets, 'image_extension': image_extension, 'repeat': args.repeat}
+        with open(args.json, 'w') as json_file:
+            json.dump({'settings': settings, 'results': best_results}, json_file, indent=4)
+
+
+if __name__ == "__main__":
+    __processArguments__()
@@ -94,6 +94,7 @@ FRAMES_PER_SECOND = 10 # FOR ANIMATIONS
 HQ_DPI = 100 # This value overwrites the default IMG_OUTPUT_DPI when --high-quality is passed in via command line
 IMG_OUTPUT_DPI = 45 # Recommended default value: 45
 FIGSIZE = (10,6) # The x,y proportions (in inches) to pass into matplotlib. It's not recommended to change this.
+THUMBNAIL_WIDTH = 450 # Maximum width (in pixels) of the webpage thumbnails created with --thumbnails
 
 # Time-height plot settings
 # An overview of all colormaps available in matplotlib can be found here:
@@ -5,6 +5,7 @@
 import numpy as np
 from netCDF4 import Dataset
 
+from src.CalcGraph import calcInputs
 from src.Panel import Panel
 from src.VariableGroup import VariableGroup
 
@@ -685,6 +686,7 @@ class VariableGroupBase(VariableGroup):
                          priority_vars=priority_vars, background_rcm=background_rcm,
                          background_rcm_folder=background_rcm_folder)
 
+    @calcInputs('THETAL', 'THETA', 'TABS', 'QI')
     def getThlmSamCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -723,6 +725,7 @@ class VariableGroupBase(VariableGroup):
         thlm = thetal + (2500.4 * (theta / tabs) * (qi / 1000))
         return thlm, indep
 
+    @calcInputs('QT', 'QI')
     def getRtmSamCalc(self, dataset_override=None):
         """
          This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -761,6 +764,7 @@ class VariableGroupBase(VariableGroup):
 
         return rtm, indep
 
+    @calcInputs(['WP3', 'W3', 'wp3'], ['WP2', 'W2', 'wp2'])
     def getSkwZtLesCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -802,6 +806,7 @@ class VariableGroupBase(VariableGroup):
 
         return skw_zt, indep
 
+    @calcInputs(['RTP3', 'qtp3', 'rtp3'], ['RTP2', 'qtp2', 'rtp2', 'rlp2'])
     def getSkrtZtLesCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -847,6 +852,7 @@ class VariableGroupBase(VariableGroup):
 
         return skrt_zt, indep
 
+    @calcInputs(['THLP3', 'thlp3'], ['THLP2', 'thlp2'])
     def getSkthlZtLesCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -894,6 +900,7 @@ class VariableGroupBase(VariableGroup):
         skthl_zt = thlp3 / (thlp2 + 4e-4)**1.5
         return skthl_zt, indep
 
+    @calcInputs(['TLFLUX'], ['RHO'], ['WPTHLP_SGS'])
     def getWpthlpSamCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -936,6 +943,7 @@ class VariableGroupBase(VariableGroup):
 
         return wpthlp, indep
 
+    @calcInputs(['QTFLUX'], ['RHO'], ['WPRTP_SGS'])
     def getWprtpSamCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -980,6 +988,7 @@ class VariableGroupBase(VariableGroup):
 
         return wprtp, indep
 
+    @calcInputs(['TVFLUX'], ['RHO'])
     def getWpthvpSamCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1017,6 +1026,7 @@ class VariableGroupBase(VariableGroup):
         # z,z, dataset = self.getVarForCalculations(['z', 'lev', 'altitude'], self.sam_benchmark_dataset)
         return wpthvp, indep
 
+    @calcInputs(['QT2'], ['RTP2_SGS'])
     def getRtp2SamCalc(self, dataset_override=None):
         """
          This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1056,6 +1066,7 @@ class VariableGroupBase(VariableGroup):
         # z,z, dataset = self.getVarForCalculations(['z', 'lev', 'altitude'], self.sam_benchmark_dataset)
         return rtp2, indep
 
+    @calcInputs('rc_coef_zm', 'rtprcp', 'QCFLUX', 'RHO', 'PRES', 'THETAV')
     def getRtp3SamCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1104,6 +1115,7 @@ class VariableGroupBase(VariableGroup):
                         2.5e6 / (1004.67 * ((PRES / 1000) ** (287.04 / 1004.67))) - 1.61 * THETAV)
         return rtp3, indep
 
+    @calcInputs('rc_coef_zm', 'wprcp')
     def get_rc_coef_zm_X_wprcp_clubb_line(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1140,6 +1152,7 @@ class VariableGroupBase(VariableGroup):
         output = rc_coef_zm * wprcp
         return output, indep
 
+    @calcInputs('rc_coef_zm', 'wprcp')
     def get_rc_coef_zm_X_wprcp_wrf_line(self, dataset_override=None):
         """
         Same as above function except used for WRF datasets.
@@ -1154,6 +1167,7 @@ class VariableGroupBase(VariableGroup):
         output = rc_coef_zm * wprcp
         return output, indep
 
+    @calcInputs('WPRCP', 'QCFLUX', 'RHO', 'PRES', 'THETAV')
     def get_rc_coef_zm_X_wprcp_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1203,6 +1217,7 @@ class VariableGroupBase(VariableGroup):
         return output, indep
 
     # rc_coef_zm. * thlprcp
+    @calcInputs('rc_coef_zm', 'thlprcp')
     def get_rc_coef_zm_X_thlprcp_clubb_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1241,6 +1256,7 @@ class VariableGroupBase(VariableGroup):
         return output, indep
 
     # rc_coef_zm. * thlprcp
+    @calcInputs('rc_coef_zm', 'thlprcp')
     def get_rc_coef_zm_X_thlprcp_wrf_calc(self, dataset_override=None):
         """
         Same as above but for WRF datasets
@@ -1256,6 +1272,7 @@ class VariableGroupBase(VariableGroup):
         output = rc_coef_zm * thlprcp
         return output, indep
 
+    @calcInputs('rc_coef_zm', 'rtprcp')
     def get_rc_coef_zm_X_rtprcp_clubb_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1293,6 +1310,7 @@ class VariableGroupBase(VariableGroup):
         output = rc_coef_zm * rtprcp
         return output, indep
 
+    @calcInputs('rc_coef_zm', 'rtprcp')
     def get_rc_coef_zm_X_rtprcp_wrf_calc(self, dataset_override=None):
         """
         Same as above except for WRF datasets
@@ -1308,6 +1326,7 @@ class VariableGroupBase(VariableGroup):
         output = rc_coef_zm * rtprcp
         return output, indep
 
+    @calcInputs('wpup', 'wpup_sgs')
     def getUwCoampsData(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1342,6 +1361,7 @@ class VariableGroupBase(VariableGroup):
         upwp = wpup + wpup_sgs
         return upwp, indep
 
+    @calcInputs('wpvp', 'wpvp_sgs')
     def getVwCoampsData(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1377,6 +1397,7 @@ class VariableGroupBase(VariableGroup):
         vpwp = wpvp + wpvp_sgs
         return vpwp, indep
 
+    @calcInputs(['thlpqcp', 'wpqcp', 'wprlp'], ['ex0'], 'p', 'thvm')
     def get_rc_coef_zm_X_wprcp_coamps_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1421,6 +1442,7 @@ class VariableGroupBase(VariableGroup):
         output = self.pickNonZeroOutput(output1, output2)
         return output, indep
 
+    @calcInputs(['THLPRCP'], 'PRES', 'THETAV')
     def get_rc_coef_zm_X_thlprcp_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1454,6 +1476,7 @@ class VariableGroupBase(VariableGroup):
         output = THLPRCP * (2.5e6 / (1004.67 * ((PRES / 1000) ** (287.04 / 1004.67))) - 1.61 * THETAV)
         return output, indep
 
+    @calcInputs(['thlpqcp'], 'ex0', 'thvm', ['thlprlp'], 'p')
     def get_rc_coef_zm_X_thlprcp_coamps_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1497,6 +1520,7 @@ class VariableGroupBase(VariableGroup):
 
         return output, indep
 
+    @calcInputs(['qtpqcp', 'rtprcp'], 'ex0', 'thvm', 'rtprlp', 'p')
     def get_rc_coef_zm_X_rtprcp_coamps_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1542,6 +1566,7 @@ class VariableGroupBase(VariableGroup):
 
         return output, indep
 
+    @calcInputs('RTPRCP', 'PRES', 'THETAV')
     def get_rc_coef_zm_X_rtprcp_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1576,6 +1601,7 @@ class VariableGroupBase(VariableGroup):
         output = RTPRCP * (2.5e6 / (1004.67 * ((PRES / 1000) ** (287.04 / 1004.67))) - 1.61 * THETAV)
         return output, indep
 
+    @calcInputs('WP2RCP', 'PRES', 'THETAV')
     def get_rc_coef_X_wp2rcp_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1609,6 +1635,7 @@ class VariableGroupBase(VariableGroup):
         output = WP2RCP * (2.5e6 / (1004.67 * ((PRES / 1000) ** (287.04 / 1004.67))) - 1.61 * THETAV)
         return output, indep
 
+    @calcInputs('rc_coef', 'wp2rcp')
     def get_rc_coef_X_wp2rcp_clubb_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1643,6 +1670,7 @@ class VariableGroupBase(VariableGroup):
         output = rc_coef * wp2rcp
         return output, indep
 
+    @calcInputs('rc_coef', 'wp2rcp')
     def get_rc_coef_X_wp2rcp_wrf_calc(self, dataset_override=None):
         """
         Same as above except for WRF datasets
@@ -1657,6 +1685,7 @@ class VariableGroupBase(VariableGroup):
         output = rc_coef * wp2rcp
         return output, indep
 
+    @calcInputs('wp2qcp', 'ex0', 'thvm', 'wp2rlp', 'p')
     def get_rc_coef_X_wp2rcp_coamps_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1701,6 +1730,7 @@ class VariableGroupBase(VariableGroup):
         return output, indep
 
 
+    @calcInputs('WP2_SGS', 'W2')
     def get_wp2_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1735,6 +1765,7 @@ class VariableGroupBase(VariableGroup):
 
         return output, z
 
+    @calcInputs('WP3_SGS', 'W3')
     def get_wp3_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1769,6 +1800,7 @@ class VariableGroupBase(VariableGroup):
 
         return output, z
 
+    @calcInputs('TL2', 'THLP2_SGS')
     def get_thlp2_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1803,6 +1835,7 @@ class VariableGroupBase(VariableGroup):
 
         return output, z
 
+    @calcInputs('UW', 'UPWP_SGS')
     def get_upwp_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1837,6 +1870,7 @@ class VariableGroupBase(VariableGroup):
 
         return output, z
 
+    @calcInputs('VW', 'VPWP_SGS')
     def get_vpwp_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1871,6 +1905,7 @@ class VariableGroupBase(VariableGroup):
 
         return output, z
 
+    @calcInputs('U2', 'UP2_SGS')
     def get_up2_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1905,6 +1940,7 @@ class VariableGroupBase(VariableGroup):
 
         return output, z
 
+    @calcInputs('V2', 'VP2_SGS')
     def get_vp2_sam_calc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1939,6 +1975,7 @@ class VariableGroupBase(VariableGroup):
 
         return output, z
 
+    @calcInputs('U2', 'UP2_SGS', 'V2', 'VP2_SGS', 'W2', 'WP2_SGS')
     def get_tke_sam_calc(self, dataset_override=None):
         """
         This function calculates TKE from SAM data by explicitly summing the squared
@@ -4,6 +4,7 @@
 TODO:   - Arrange lines so that styles match for different panels -> reduced momentum flux budgets
 '''
 from src.Panel import Panel
+from src.CalcGraph import calcInputs
 from src.VariableGroup import VariableGroup
 
 
@@ -984,6 +985,7 @@ class VariableGroupSamBudgets(VariableGroup):
                          priority_vars=priority_vars, background_rcm=background_rcm,
                          background_rcm_folder=background_rcm_folder)
 
+    @calcInputs('HLADV', 'HLDFSN', 'HLLAT', 'HLRAD', 'HLSTOR', 'TTEND')
     def getHlResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1035,6 +1037,7 @@ class VariableGroupSamBudgets(VariableGroup):
         HL_RES = (HLSTOR - (HLADV + HLDFSN + HLLAT + HLRAD + TTEND)) * self.g_per_second_to_kg_per_day
         return HL_RES, indep
 
+    @calcInputs('QTADV', 'QTDFSN', 'QTEND', 'QTSINK', 'QTSRC', 'QTSTOR', 'QV_TNDCY')
     def getQtResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1083,6 +1086,7 @@ class VariableGroupSamBudgets(VariableGroup):
         QT_RES = QTSTOR - (QTADV + QTDFSN + QTEND + QTSRC + QTSINK)
         return QT_RES, indep
 
+    @calcInputs('TWBUOY', 'TWPRES')
     def getTwBuoyPlusPres(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1116,6 +1120,7 @@ class VariableGroupSamBudgets(VariableGroup):
         TW_BUOY_PRES = TWBUOY + TWPRES
         return TW_BUOY_PRES, indep
 
+    @calcInputs('TWADV', 'TWBT', 'TWBUOY', 'TWDFSN', 'TWFORC', 'TWGRAD', 'TWPREC', 'TWPRES', 'TWRAD')
     def getTwResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1156,6 +1161,7 @@ class VariableGroupSamBudgets(VariableGroup):
         TW_RES = TWBT - (TWADV + TWBUOY + TWDFSN + TWFORC + TWGRAD + TWPREC + TWPRES + TWRAD)
         return TW_RES, indep
 
+    @calcInputs('THLWBUOY', 'THLWPRES')
     def getThlwBuoyPlusPres(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1189,6 +1195,7 @@ class VariableGroupSamBudgets(VariableGroup):
         THLW_BUOY_PRES = THLWBUOY + THLWPRES
         return THLW_BUOY_PRES, indep
 
+    @calcInputs('THLWADV', 'THLWBT', 'THLWBUOY', 'THLWDFSN', 'THLWFORC', 'THLWGRAD', 'THLWPREC', 'THLWPRES', 'THLWRAD')
     def getThlwResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1229,6 +1236,7 @@ class VariableGroupSamBudgets(VariableGroup):
         THLW_RES = THLWBT - (THLWADV + THLWBUOY + THLWDFSN + THLWFORC + THLWGRAD + THLWPREC + THLWPRES + THLWRAD)
         return THLW_RES, indep
 
+    @calcInputs('QWBUOY', 'QWPRES')
     def getQwBuoyPlusPres(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1262,6 +1270,7 @@ class VariableGroupSamBudgets(VariableGroup):
         QW_BUOY_PRES = QWBUOY + QWPRES
         return QW_BUOY_PRES, indep
 
+    @calcInputs('QWADV', 'QWBT', 'QWBUOY', 'QWDFSN', 'QWFORC', 'QWGRAD', 'QWPREC', 'QWPRES')
     def getQwResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1301,6 +1310,7 @@ class VariableGroupSamBudgets(VariableGroup):
         QW_RES = QWBT - (QWGRAD + QWADV + QWDFSN + QWBUOY + QWPRES + QWPREC + QWFORC)
         return QW_RES, indep
 
+    @calcInputs('QTOGWBUOY', 'QTOGWPRES')
     def getQtogwBuoyPlusPres(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1334,6 +1344,7 @@ class VariableGroupSamBudgets(VariableGroup):
         QTOGW_BUOY_PRES = QTOGWBUOY + QTOGWPRES
         return QTOGW_BUOY_PRES, indep
 
+    @calcInputs('QTOGWADV', 'QTOGWBT', 'QTOGWBUOY', 'QTOGWDFSN', 'QTOGWFORC', 'QTOGWGRAD', 'QTOGWPREC', 'QTOGWPRES')
     def getQtogwResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1373,6 +1384,7 @@ class VariableGroupSamBudgets(VariableGroup):
         QTOGW_RES = QTOGWBT - (QTOGWGRAD + QTOGWADV + QTOGWDFSN + QTOGWBUOY + QTOGWPRES + QTOGWPREC + QTOGWFORC)
         return QTOGW_RES, indep
 
+    @calcInputs('T2ADVTR', 'T2BT', 'T2DISSIP', 'T2DIFTR', 'T2FORC', 'T2GRAD', 'T2PREC', 'T2RAD')
     def getT2Residual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1412,6 +1424,7 @@ class VariableGroupSamBudgets(VariableGroup):
         T2_RES = T2BT - (T2ADVTR + T2GRAD + T2DISSIP + T2DIFTR + T2PREC + T2RAD + T2FORC)
         return T2_RES, indep
 
+    @calcInputs('THL2ADVTR', 'THL2BT', 'THL2DISSIP', 'THL2DIFTR', 'THL2FORC', 'THL2GRAD', 'THL2PREC', 'THL2RAD')
     def getThl2Residual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1451,6 +1464,7 @@ class VariableGroupSamBudgets(VariableGroup):
         THL2_RES = THL2BT - (THL2ADVTR + THL2GRAD + THL2DISSIP + THL2DIFTR + THL2PREC + THL2RAD + THL2FORC)
         return THL2_RES, indep
 
+    @calcInputs('Q2ADVTR', 'Q2BT', 'Q2DISSIP', 'Q2DIFTR', 'Q2FORC', 'Q2GRAD', 'Q2PREC')
     def getQt2Residual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1489,6 +1503,7 @@ class VariableGroupSamBudgets(VariableGroup):
         Q2_RES = Q2BT - (Q2ADVTR + Q2GRAD + Q2DISSIP + Q2DIFTR + Q2PREC + Q2FORC)
         return Q2_RES, indep
 
+    @calcInputs('QTOG2ADVTR', 'QTOG2BT', 'QTOG2DIFTR', 'QTOG2DISSIP', 'QTOG2FORC', 'QTOG2GRAD', 'QTOG2PREC')
     def getQtog2Residual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1527,6 +1542,7 @@ class VariableGroupSamBudgets(VariableGroup):
         QTOG2_RES = QTOG2BT - (QTOG2ADVTR + QTOG2GRAD + QTOG2DISSIP + QTOG2DIFTR + QTOG2PREC + QTOG2FORC)
         return QTOG2_RES, indep
 
+    @calcInputs('QTHLADV', 'QTHLBT', 'QTHLDIFTR', 'QTHLDISSIP', 'QTHLFORC', 'QTHLGRAD', 'QTHLPREC', 'QTHLRAD')
     def getQThlResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1566,6 +1582,7 @@ class VariableGroupSamBudgets(VariableGroup):
         QTHLW_RES = QTHLBT - (QTHLADV + QTHLGRAD + QTHLDISSIP + QTHLDIFTR + QTHLPREC + QTHLRAD + QTHLFORC)
         return QTHLW_RES, indep
 
+    @calcInputs('DIFTR', 'DISSIP')
     def getTkeDissPlusDfsn(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1599,6 +1616,7 @@ class VariableGroupSamBudgets(VariableGroup):
         TKE_DISS_DFSN = DIFTR + DISSIP
         return TKE_DISS_DFSN, indep
 
+    @calcInputs('ADVTR', 'BT', 'BUOYA', 'DIFTR', 'DISSIP', 'PRESSTR', 'SDMP', 'SHEAR')
     def getTkeResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1638,6 +1656,7 @@ class VariableGroupSamBudgets(VariableGroup):
         TKE_RES = BT - (SHEAR + BUOYA + ADVTR + PRESSTR + DIFTR + SDMP + DISSIP)
         return TKE_RES, indep
 
+    @calcInputs('ADVTRS', 'BUOYAS', 'DISSIPS', 'SHEARS')
     def getTkesResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1673,6 +1692,7 @@ class VariableGroupSamBudgets(VariableGroup):
         TKES_RES = -(SHEARS + BUOYAS + ADVTRS + DISSIPS)
         return TKES_RES, indep
 
+    @calcInputs('U2ADV', 'U2BT', 'U2DFSN', 'U2REDIS', 'U2SHEAR')
     def getU2Residual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1709,6 +1729,7 @@ class VariableGroupSamBudgets(VariableGroup):
         U2_RES = U2BT - (U2ADV + U2SHEAR + U2REDIS + U2DFSN)
         return U2_RES, indep
 
+    @calcInputs('V2ADV', 'V2BT', 'V2DFSN', 'V2REDIS', 'V2SHEAR')
     def getV2Residual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1745,6 +1766,7 @@ class VariableGroupSamBudgets(VariableGroup):
         V2_RES = V2BT - (V2ADV + V2SHEAR + V2REDIS + V2DFSN)
         return V2_RES, indep
 
+    @calcInputs('W2PRES', 'W2REDIS')
     def getW2RedisPlusPres(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1778,6 +1800,7 @@ class VariableGroupSamBudgets(VariableGroup):
         W2_REDIS_PRES = W2REDIS + W2PRES
         return W2_REDIS_PRES, indep
 
+    @calcInputs('W2ADV', 'W2BT', 'W2BUOY', 'W2DFSN', 'W2PRES', 'W2REDIS', 'W2SDMP')
     def getW2Residual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1816,6 +1839,7 @@ class VariableGroupSamBudgets(VariableGroup):
         W2_RES = W2BT - (W2ADV + W2PRES + W2REDIS + W2BUOY + W2DFSN + W2SDMP)
         return W2_RES, indep
 
+    @calcInputs('ADVTR', 'W2ADV')
     def getU2V2Adv(self, dataset_override):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1849,6 +1873,7 @@ class VariableGroupSamBudgets(VariableGroup):
         U2V2_ADV = 2 * ADVTR + W2ADV
         return U2V2_ADV, indep
 
+    @calcInputs('BUOYA', 'W2BUOY')
     def getU2V2Buoy(self, dataset_override):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1882,6 +1907,7 @@ class VariableGroupSamBudgets(VariableGroup):
         U2V2_BUOY = 2 * BUOYA + W2BUOY
         return U2V2_BUOY, indep
 
+    @calcInputs('PRESSTR', 'W2PRES')
     def getU2V2Pres(self, dataset_override):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1915,6 +1941,7 @@ class VariableGroupSamBudgets(VariableGroup):
         U2V2_PRES = 2 * PRESSTR + W2PRES
         return U2V2_PRES, indep
 
+    @calcInputs('DIFTR', 'W2DFSN')
     def getU2V2Dfsn(self, dataset_override):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1948,6 +1975,7 @@ class VariableGroupSamBudgets(VariableGroup):
         U2V2_DFSN = 2 * DIFTR + W2DFSN
         return U2V2_DFSN, indep
 
+    @calcInputs('SDMP', 'W2SDMP')
     def getU2V2Sdmp(self, dataset_override):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1981,6 +2009,7 @@ class VariableGroupSamBudgets(VariableGroup):
         U2V2_SDMP = 2 * SDMP + W2SDMP
         return U2V2_SDMP, indep
 
+    @calcInputs('BT', 'W2BT')
     def getU2V2Bt(self, dataset_override):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -2014,6 +2043,8 @@ class VariableGroupSamBudgets(VariableGroup):
         U2V2_BT = 2 * BT + W2BT
         return U2V2_BT, indep
 
+    @calcInputs('ADVTR', 'W2ADV', 'BT', 'W2BT', 'BUOYA', 'W2BUOY', 'DIFTR', 'W2DFSN', 'DISSIP', 'PRESSTR', 'W2PRES',
+                'W2REDIS', 'SDMP', 'W2SDMP', 'SHEAR')
     def getU2V2Residual(self, dataset_override):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -2061,6 +2092,7 @@ class VariableGroupSamBudgets(VariableGroup):
                 W2ADV + W2BUOY + W2PRES + W2DFSN + W2SDMP + W2REDIS)
         return U2V2_RES, indep
 
+    @calcInputs('W3PRES', 'W3REDIS')
     def getW3PRESS(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -2096,6 +2128,7 @@ class VariableGroupSamBudgets(VariableGroup):
         W3PRESS = W3PRES + W3REDIS
         return W3PRESS, indep
 
+    @calcInputs('W3ADV', 'W3BT', 'W3BUOY', 'W3DFSN', 'W3PRES')
     def getW3Residual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -2134,6 +2167,7 @@ class VariableGroupSamBudgets(VariableGroup):
         W3_RES = W3BT - (W3ADV + W3PRES + W3BUOY + W3DFSN)
         return W3_RES, indep
 
+    @calcInputs('WUANIZ', 'WUPRES')
     def getUWPresPlusAniz(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -2167,6 +2201,7 @@ class VariableGroupSamBudgets(VariableGroup):
         WU_ANIZ_PRES = WUANIZ + WUPRES
         return WU_ANIZ_PRES, indep
 
+    @calcInputs('WUADV', 'WUANIZ', 'WUBT', 'WUBUOY', 'WUDFSN', 'WUPRES', 'WUSHEAR', 'WUSDMP')
     def getUWResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -2206,6 +2241,7 @@ class VariableGroupSamBudgets(VariableGroup):
         WU_RES = WUBT - (WUDFSN + WUSHEAR + WUADV + WUPRES + WUANIZ + WUBUOY + WUSDMP)
         return WU_RES, indep
 
+    @calcInputs('WVANIZ', 'WVPRES')
     def getVWPresPlusAniz(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -2239,6 +2275,7 @@ class VariableGroupSamBudgets(VariableGroup):
         WV_ANIZ_PRES = WVANIZ + WVPRES
         return WV_ANIZ_PRES, indep
 
+    @calcInputs('WVADV', 'WVANIZ', 'WVBT', 'WVBUOY', 'WVDFSN', 'WVPRES', 'WVSHEAR', 'WVSDMP')
     def getVWResidual(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -5,6 +5,7 @@ TODO:   - Figure out how to include standard plots in VariableGroupBase (labels
 '''
 import numpy as np
 
+from src.CalcGraph import calcInputs
 from src.VariableGroup import VariableGroup
 
 
@@ -1204,6 +1205,7 @@ class VariableGroupSamProfiles(VariableGroup):
                          priority_vars=priority_vars, background_rcm=background_rcm,
                          background_rcm_folder=background_rcm_folder)
             
+    @calcInputs('THETAL', 'THETA', 'TABS', 'QI')
     def getThlmSamCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1240,6 +1242,7 @@ class VariableGroupSamProfiles(VariableGroup):
         thlm = thetal + (2500.4 * (theta / tabs) * (qi / 1000))
         return thlm, indep
     
+    @calcInputs('QT', 'QI')
     def getRtmSamCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1274,6 +1277,7 @@ class VariableGroupSamProfiles(VariableGroup):
         rtm = (qt - qi) / 1000
         return rtm, indep
     
+    @calcInputs(['TLFLUX'], ['RHO'], 'WPTHLP_SGS')
     def getWpthlpCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1310,6 +1314,7 @@ class VariableGroupSamProfiles(VariableGroup):
         
         return wpthlp, indep
     
+    @calcInputs('TLFLUX', 'RHO', 'WPTHLP_SGS', 'W2', 'TL2')
     def getCorrWpThlpCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1347,6 +1352,7 @@ class VariableGroupSamProfiles(VariableGroup):
         CorrWpThlp = ( TLFLUX / (RHO * 1004) + WPTHLP_SGS ) / np.sqrt(W2 * TL2 + 1e-4)
         return CorrWpThlp, indep
     
+    @calcInputs(['QTFLUX'], ['RHO'], 'WPRTP_SGS')
     def getWprtpCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1382,6 +1388,7 @@ class VariableGroupSamProfiles(VariableGroup):
         wprtp = qtflux / (rho * 2.5104e+6) + WPRTP_SGS
         return wprtp, indep
     
+    @calcInputs('WPRTP', 'WPRTP_SGS', 'W2', 'QT2')
     def getCorrWpRtpCalc(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1418,6 +1425,7 @@ class VariableGroupSamProfiles(VariableGroup):
         CorrWpRtp = WPRTP / (np.sqrt(W2*QT2*1e-6)+1e-8)
         return CorrWpRtp, indep
     
+    @calcInputs('W2', 'WP2_SGS')
     def getWp2Calc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1451,6 +1459,7 @@ class VariableGroupSamProfiles(VariableGroup):
         WP2 = W2 + WP2_SGS
         return WP2, indep
     
+    @calcInputs('W3', 'WP3_SGS')
     def getWp3Calc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1484,6 +1493,7 @@ class VariableGroupSamProfiles(VariableGroup):
         WP3 = W3 + WP3_SGS
         return WP3, indep
     
+    @calcInputs('TL2', 'THLP2_SGS')
     def getThetalVarCalc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1517,6 +1527,7 @@ class VariableGroupSamProfiles(VariableGroup):
         THETALVAR = TL2 + THLP2_SGS
         return THETALVAR, indep
     
+    @calcInputs('QT2', 'RTP2_SGS')
     def getRtVarCalc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1550,6 +1561,7 @@ class VariableGroupSamProfiles(VariableGroup):
         RTVAR = (QT2 * 1e-6) + RTP2_SGS
         return RTVAR, indep
     
+    @calcInputs('UW', 'UPWP_SGS')
     def getUpWpCalc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1583,6 +1595,7 @@ class VariableGroupSamProfiles(VariableGroup):
         UPWP = UW + UPWP_SGS
         return UPWP, indep
     
+    @calcInputs('VW', 'VPWP_SGS')
     def getVpWpCalc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1616,6 +1629,7 @@ class VariableGroupSamProfiles(VariableGroup):
         VPWP = VW + VPWP_SGS
         return VPWP, indep
     
+    @calcInputs('U2', 'UP2_SGS')
     def getUp2Calc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1649,6 +1663,7 @@ class VariableGroupSamProfiles(VariableGroup):
         UVAR = U2 + UP2_SGS
         return UVAR, indep
     
+    @calcInputs('V2', 'VP2_SGS')
     def getVp2Calc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1682,6 +1697,7 @@ class VariableGroupSamProfiles(VariableGroup):
         VVAR = V2 + VP2_SGS
         return VVAR, indep
 
+    @calcInputs('UW', 'UPWP_SGS')
     def getUpWpCorrCalc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1715,6 +1731,7 @@ class VariableGroupSamProfiles(VariableGroup):
         UPWP = UW + UPWP_SGS
         return UPWP, indep
     
+    @calcInputs('VW', 'VPWP_SGS')
     def getVpWpCorrCalc(self, dataset_override = None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -1748,6 +1765,7 @@ class VariableGroupSamProfiles(VariableGroup):
         VPWP = VW + VPWP_SGS
         return VPWP, indep
     
+    @calcInputs('qrainp2_ip', 'qrainm_ip')
     def getQRP2_QRIP(self, dataset_override=None):
         """
         This is a "calculate function". Calculate functions are intended to be written by the user in the event that
@@ -15,13 +15,16 @@ import os
 import logging
 import shutil
 import subprocess
+import tempfile
+import threading
 import time
 from datetime import datetime
 from difflib import SequenceMatcher
-from multiprocessing import Pool, Array
+from multiprocessing import Pool
 from multiprocessing import freeze_support
 
 from fpdf import FPDF
+from PIL import Image
 
 from config import Case_definitions, Style_definitions
 from python_html_gallery import gallery
@@ -31,7 +34,9 @@ from src.DataReader import DataReader
 from src.interoperability import clean_path
 import src.OutputHandler
 from src.OutputHandler import logToFile, logToFileAndConsole
-from src.OutputHandler import initializeProgress, writeFinalErrorLog, warnUser
+from src.OutputHandler import initializeProgress, updateProgress, writeFinalErrorLog, warnUser
+from src.PanelPlotJob import PanelPlotJob
+from src.Profiler import CATEGORY_CASE, Profiler, enableProfiling, getProfiler
 
 class PyPlotGen:
     """
@@ -47,7 +52,9 @@ class PyPlotGen:
                  e3sm_folders=[""], sam_folders=[""], wrf_folders=[""], cam_folders=[""], priority_vars=False,
                  plot_budgets=False, bu_morr=False, lumped_buoy_budgets=False, background_rcm=False, diff=None,
                  show_alphabetic_id=False, time_height=False, animation=None, samstyle=False, disable_multithreading=False,
-                 pdf=False, pdf_filesize_limit=None, plot_subcolumns=False, image_extension=".png"):
+                 pdf=False, pdf_filesize_limit=None, plot_subcolumns=False, image_extension=".png", cache_folder=None,
+                 incremental=False, profile=False, stream_movies=False, movie_chunks=1, max_movie_frames=None,
+                 movie_frame_interval=None, average_movie_frames=False, thumbnails=False, extra_image_extensions=()):
         """
         This creates an instance of PyPlotGen. Each parameter is a command line parameter passed in from the argparser
         below.
@@ -92,6 +99,30 @@ class PyPlotGen:
         :param time_height: If True, plot time-height (contourf) plots instead of profile-like plots
         :param animation: If True, create time animations instead of time-averaged plots
             (works with profile and budget plots) (Not yet implemented).
+        :param cache_folder: Folder in which the data of all panels is stored and reused by later runs with
+            unchanged input files. If None (default), the panel data is not cached.
+        :param incremental: If True, an existing output folder is reused and only panels whose data or style changed
+            since the last incremental run are plotted again. Without a cache_folder, the panels are created lazily,
+            so no data is read for panels whose variable definition and input files did not change either.
+        :param profile: If True, the wall time and bytes read of every case, VariableGroup, variable, calc function
+            and panel are recorded and written to profile.json and profile.csv in the output folder,
+            and a summary table is printed at the end of the run.
+        :param stream_movies: If True, the frames of animations are rendered in memory and piped to the movie encoder
+            instead of being saved as temporary images that are stitched together afterwards.
+        :param movie_chunks: Number of chunks into which the frames of every movie are split when multithreading.
+            The chunks are written to separate segments by the worker processes and joined without re-encoding
+            (if ffmpeg is installed). Values greater than 1 imply stream_movies.
+        :param max_movie_frames: Maximum number of frames of each movie. Longer simulations are decimated in time.
+            If None (default), every time step becomes a frame.
+        :param movie_frame_interval: Minimum number of simulated minutes between two frames of a movie.
+            If None (default), every time step becomes a frame.
+        :param average_movie_frames: If True, each frame of a decimated movie shows the time average over the
+            time steps it replaces instead of the last of these time steps.
+        :param thumbnails: If True, the webpage shows thumbnails (at most Style_definitions.THUMBNAIL_WIDTH pixels
+            wide) linking to the images. Thumbnails of unchanged images are reused by later runs.
+        :param extra_image_extensions: Further formats, e.g. ['.svg', '.pdf'], that every panel is saved to besides
+            image_extension. Each panel is plotted once and saved to all formats. Only image_extension is shown
+            on the web page and printed to the pdf.
         """
         self.clubb_folders = clubb_folders
         self.output_folder = output_folder
@@ -131,8 +162,20 @@ class PyPlotGen:
         self.pdf = pdf
         self.pdf_filesize_limit = pdf_filesize_limit
         self.image_extension = image_extension
-
-        if os.path.isdir(self.output_folder) and self.replace_images is False:
+        self.cache_folder = cache_folder
+        self.incremental = incremental
+        self.profile = profile
+        self.movie_chunks = movie_chunks
+        self.stream_movies = stream_movies or movie_chunks > 1
+        self.max_movie_frames = max_movie_frames
+        self.movie_frame_interval = movie_frame_interval
+        self.average_movie_frames = average_movie_frames
+        self.thumbnails = thumbnails
+        self.extra_image_extensions = list(extra_image_extensions)
+        if self.cache_folder is not None:
+            self.cache_folder = os.path.abspath(self.cache_folder)
+
+        if os.path.isdir(self.output_folder) and self.replace_images is False and not self.incremental:
             current_date_time = datetime.now()
             rounded_down_datetime = current_date_time.replace(microsecond=0)
             datetime_generated_on = str(rounded_down_datetime)
@@ -141,7 +184,8 @@ class PyPlotGen:
         self.output_folder = clean_path(self.output_folder)
 
         # If --replace flag was set, delete old output folder
-        if self.replace_images:
+        # Incremental runs keep the folder to reuse the images in it
+        if self.replace_images and not self.incremental:
             subprocess.run(['rm', '-rf', self.output_folder + '/'])
             # TODO: Use for Windows
             # shutil.rmtree(self.output_folder)
@@ -195,20 +239,31 @@ class PyPlotGen:
         cases_plotted_bools = []
 
         # initialize counter and progress display
-        total_progress_counter = Array('i',[0,0])
+        # [total number of panels to be plotted, number of panels plotted so far]
+        total_progress_counter = [0, 0]
         initializeProgress(self.image_extension, self.animation)
 
+        # All processes write their profiling records into this folder
+        profile_records_folder = None
+        if self.profile:
+            profile_records_folder = tempfile.mkdtemp(prefix='pyplotgen_profile_')
+        enableProfiling(profile_records_folder)
+
         if self.multithreaded:
             freeze_support()  # Required for multithreading
             n_processors = multiprocessing.cpu_count()
-            with Pool(processes=n_processors,initializer=tpc_init,initargs=(total_progress_counter, )) as pool:
-                cases_plotted_bools = pool.map(self.__plotCase__, all_enabled_cases)
+            with Pool(processes=n_processors, initializer=enableProfiling,
+                      initargs=(profile_records_folder,)) as pool:
+                cases_plotted_bools = self.__plotCasesInPool__(pool, all_enabled_cases, total_progress_counter)
         else:
             for case_def in all_enabled_cases:
-                cases_plotted_bools.append(self.__plotCase__(case_def))
+                cases_plotted_bools.append(self.__plotCase__(case_def, total_progress_counter))
         logToFileAndConsole('')
         logToFileAndConsole('-------------------------------------------')
 
+        if self.profile:
+            self.__writeProfile__(profile_records_folder)
+
         self.num_cases_plotted = self.__extractNumCasesPlotted__(cases_plotted_bools)
 
         if self.num_cases_plotted == 0:
@@ -233,21 +288,34 @@ class PyPlotGen:
 
         self.__copySetupFiles__()
         # Generate html pages
-        # Multithreading changes the order the cases are plotted on the webpage, so it has been disabled.
-        # The capability is being left here as a demo.
+        # The gallery fixes the order of the cases before handing work to other processes,
+        # so multithreading does not change the order the cases are plotted on the webpage.
+        thumbnail_width = self.__getThumbnailWidth__()
         if self.animation is not None:
             movie_extension = "." + self.animation
-            gallery.main(self.output_folder, multithreaded=False, file_extension=movie_extension)
+            gallery.main(self.output_folder, multithreaded=self.multithreaded, file_extension=movie_extension)
         else:
-            gallery.main(self.output_folder, multithreaded=False, file_extension=self.image_extension)
+            gallery.main(self.output_folder, multithreaded=self.multithreaded, file_extension=self.image_extension,
+                         thumbnail_width=thumbnail_width)
         logToFileAndConsole('-------------------------------------------')
         logToFileAndConsole("Output can be viewed at file://" + self.output_folder + "/index.html with a web browser")
 
+    def __getThumbnailWidth__(self):
+        """
+        Returns the width of the thumbnails on the web page
+
+        :return: Style_definitions.THUMBNAIL_WIDTH if thumbnails were requested, None otherwise
+        """
+        if self.thumbnails:
+            return Style_definitions.THUMBNAIL_WIDTH
+        return None
+
     def __printToPDF__(self):
         """
         If --pdf was specified, this prints a pdf. Otherwise, this does nothing.
-        If --pdf and --pdf-filesize-limit were specified, this will loop over the run() method, reducing image size on
-        each loop, until a pdf is output less than or equal to the specified target pdf filesize.
+        If --pdf and --pdf-filesize-limit were specified, the images of the single plotting pass are scaled down
+        while the pdf is assembled until the pdf is smaller than the specified target pdf filesize
+        (see __writeSizeLimitedPdf__()).
 
         :return: None
         """
@@ -268,49 +336,80 @@ class PyPlotGen:
             logToFileAndConsole("PDF Output can be viewed at file://" + pdf_output_path_plus_filename + " with a web browser/ pdf viewer")
             logToFileAndConsole('-------------------------------------------')
         if self.pdf_filesize_limit is not None:
-            output_dpi = Style_definitions.IMG_OUTPUT_DPI
-            pdf_too_large = True
-            filesize_impossible = False
             logToFileAndConsole('-------------------------------------------')
             logToFileAndConsole('Generating PDF file ' + pdf_output_path_plus_filename)
-            logToFileAndConsole('Searching for minimum viable DPI for output images to print within '
-                  + str(self.pdf_filesize_limit) + 'MB')
-            attempted_prints = 0
-            while pdf_too_large and not filesize_impossible:
-                attempted_prints += 1
-                bytes_to_mb = 1 / 1000000
-                self.__writePdfToDisk__(pdf_output_path_plus_filename, case_descriptions, case_times)
-                pdf_filesize = os.path.getsize(pdf_output_path_plus_filename) * bytes_to_mb
-                logToFileAndConsole("PDF generated using a DPI of " + str(Style_definitions.IMG_OUTPUT_DPI) +
-                                    " with a filesize of " + str(pdf_filesize) + "MB.")
-                Style_definitions.IMG_OUTPUT_DPI = output_dpi
+            logToFileAndConsole('Searching for the image scale needed to print within '
+                                + str(self.pdf_filesize_limit) + 'MB')
+            self.__writeSizeLimitedPdf__(pdf_output_path_plus_filename, case_descriptions, case_times)
 
-                if pdf_filesize < self.pdf_filesize_limit:
-                    pdf_too_large = False
-                    logToFileAndConsole("PDF output can be found at: file://" + pdf_output_path_plus_filename)
-                    logToFileAndConsole("Printing PDF to the target filesize took " + str(attempted_prints) + 
-                                        " attempts to find the right DPI.")
+    def __writeSizeLimitedPdf__(self, pdf_output_filename, case_descriptions, case_times):
+        """
+        Writes a PDF that is smaller than self.pdf_filesize_limit from the images of the single plotting pass.
+        The images on the web page keep their full resolution. Instead, if the pdf with the original images is too
+        large, the images are recompressed with a color palette (which loses next to nothing for line plots)
+        and then scaled down while the pdf is assembled. The scale is estimated from the size of the previous attempt:
+        Everything except the images stays the same, and since the compressed size of a line plot is dominated by
+        its edges, the size of a scaled image is roughly proportional to the scale.
+        Since only the pdf is assembled again, a failed attempt costs a fraction of a plotting pass.
+
+        :param pdf_output_filename: Name of the file to be created
+        :param case_descriptions: A dict of name -> description maps. E.g. {'bomex': "I am the bomex case. Fear me!"}
+        :param case_times: A dict of name -> [start_time, end_time] maps
+        :return: None
+        """
+        bytes_to_mb = 1 / 1000000
+        filesize_limit_bytes = self.pdf_filesize_limit / bytes_to_mb
+        # Aim slightly below the limit, since the estimate is not exact
+        target_fraction = 0.95
+        image_scale = None
+        # Parsing the original images is slow in fpdf, so they are only tried if they can fit
+        original_image_bytes = sum(os.path.getsize(filename) for foldername in self.__getPdfCaseFolders__()
+                                   for filename in self.__getPdfImageFilenames__(foldername))
+        if original_image_bytes >= filesize_limit_bytes:
+            logToFileAndConsole("The images alone are larger than " + str(self.pdf_filesize_limit) + "MB. "
+                                "Recompressing images.")
+            image_scale = 1.0
+        attempted_prints = 0
+        with tempfile.TemporaryDirectory(prefix='pyplotgen_pdf_') as downscaled_folder:
+            while True:
+                attempted_prints += 1
+                image_bytes = self.__writePdfToDisk__(pdf_output_filename, case_descriptions, case_times,
+                                                      image_scale=image_scale, downscaled_folder=downscaled_folder)
+                pdf_filesize_bytes = os.path.getsize(pdf_output_filename)
+                pdf_filesize = pdf_filesize_bytes * bytes_to_mb
+                if image_scale is None:
+                    logToFileAndConsole("PDF generated using the original images with a filesize of " +
+                                        str(pdf_filesize) + "MB.")
                 else:
-                    # output downscaled images to a new folder so that the original quality ones can still be referenced
-                    # via the web page
-                    if "_downscaled_for_pdf" not in self.output_folder:
-                        self.output_folder = self.output_folder + "_downscaled_for_pdf"
-                        pdf_output_path_plus_filename = self.output_folder + '/pyplotgen_output.pdf'
-
-                    output_dpi = self.__getDecreasedDpiValue__(output_dpi, pdf_filesize)
-                    logToFileAndConsole("Attempted to print but the file was too large (" + str(pdf_filesize) + 
-                          "MB insead of <" + str(self.pdf_filesize_limit) + "MB). Reducing DPI and trying again.")
-                    logToFileAndConsole("Attempting to print pdf with dpi of " + str(output_dpi))
-
-                    # delete 'downscaled' output folder and run again
-                    subprocess.run(['rm', '-rf', self.output_folder + '/'])
-                    self.run()
-                if output_dpi <= 1:
-                    logToFileAndConsole("There is no possible dpi that fits within " + str(self.pdf_filesize_limit) + "MB.")
-                    logToFileAndConsole("The most recent PDF output attempt can be found at: file://" + pdf_output_path_plus_filename)
-                    filesize_impossible = True
-
-    def __writePdfToDisk__(self, pdf_output_filename, case_descriptions, case_times):
+                    logToFileAndConsole("PDF generated using recompressed images scaled to {:.0%} "
+                                        "with a filesize of {}MB.".format(image_scale, pdf_filesize))
+                if pdf_filesize < self.pdf_filesize_limit:
+                    logToFileAndConsole("PDF output can be found at: file://" + pdf_output_filename)
+                    logToFileAndConsole("Printing PDF to the target filesize took " + str(attempted_prints) +
+                                        " attempts to find the right image scale.")
+                    return
+
+                if image_scale is None:
+                    image_scale = 1.0
+                    logToFileAndConsole("Attempted to print but the file was too large (" + str(pdf_filesize) +
+                                        "MB instead of <" + str(self.pdf_filesize_limit) + "MB). "
+                                        "Recompressing images and trying again.")
+                    continue
+                image_byte_budget = filesize_limit_bytes * target_fraction - (pdf_filesize_bytes - image_bytes)
+                if image_byte_budget <= 0 or image_scale * Style_definitions.IMG_OUTPUT_DPI <= 1:
+                    logToFileAndConsole("There is no possible image scale that fits within " +
+                                        str(self.pdf_filesize_limit) + "MB.")
+                    logToFileAndConsole("The most recent PDF output attempt can be found at: file://" +
+                                        pdf_output_filename)
+                    return
+                # Reduce the scale by at least 10% per attempt, in case the estimate was too optimistic
+                image_scale *= min(image_byte_budget / image_bytes, 0.9)
+                logToFileAndConsole("Attempted to print but the file was too large (" + str(pdf_filesize) +
+                                    "MB instead of <" + str(self.pdf_filesize_limit) + "MB). "
+                                    "Scaling images to {:.0%} and trying again.".format(image_scale))
+
+    def __writePdfToDisk__(self, pdf_output_filename, case_descriptions, case_times, image_scale=None,
+                           downscaled_folder=None):
         """
         This is a helper function that actually writes the PDF to the disk. This uses the fpdf package to generate the
         pdf.
@@ -318,70 +417,89 @@ class PyPlotGen:
         :param pdf_output_filename: Name of the file to be created. While it can be a relative name, it's recommended
             to use a full file path.
         :param case_descriptions: A dict of name -> description maps. E.g. {'bomex': "I am the bomex case. Fear me!"}
-        :return: None
+        :param image_scale: If None (default), the images are added as they are. Otherwise, recompressed copies of the
+            images, with width and height scaled by this factor, are added (see __getDownscaledImage__()).
+            The images in the output folder are not changed.
+        :param downscaled_folder: Folder for the copies of the images. Required if image_scale is given.
+        :return: Total size in bytes of the image files added to the pdf
         """
+        image_bytes = 0
         pdf = FPDF()
-        for foldername in sorted(os.listdir(self.output_folder)):
-            if os.path.isdir(foldername):
-                pdf.add_page()
-                pdf.set_font('Arial', 'B', 18)
-                pdf.cell(0, 10, foldername + " minutes " + str(case_times[foldername][0]) + "-" + str(case_times[foldername][1]))
-                pdf.ln()
-                pdf.set_font('Arial', '', 12)
-                pdf.multi_cell(0, 8, case_descriptions[foldername])
-                current_date_time = datetime.now()
-                rounded_down_datetime = str(current_date_time.replace(microsecond=0))
-                pdf.set_font('Arial', '', 10)
-                pdf.multi_cell(0, 6, "Generated on: " + rounded_down_datetime)
-                loop_counter = 0
-                num_imgs_per_row = 3
-                for filename in sorted(os.listdir(self.output_folder + "/" + foldername)):
-                    filename = self.output_folder + '/' + foldername + '/' + filename
-
-                    if "html" not in filename and "txt" not in filename and os.path.isfile(filename):
-                        x_coord = 20 + loop_counter * 60
-                        pdf.set_x(x_coord)
-                        pdf.image(filename, w=50, h=30)
-                        pdf.set_y(pdf.get_y() - 30)
-                        if loop_counter == num_imgs_per_row - 1:
-                            pdf.ln()
-                            loop_counter = 0
-                            pdf.set_y(pdf.get_y() + 25)
-                        else:
-                            loop_counter += 1
+        for foldername in self.__getPdfCaseFolders__():
+            pdf.add_page()
+            pdf.set_font('Arial', 'B', 18)
+            pdf.cell(0, 10, foldername + " minutes " + str(case_times[foldername][0]) + "-" + str(case_times[foldername][1]))
+            pdf.ln()
+            pdf.set_font('Arial', '', 12)
+            pdf.multi_cell(0, 8, case_descriptions[foldername])
+            current_date_time = datetime.now()
+            rounded_down_datetime = str(current_date_time.replace(microsecond=0))
+            pdf.set_font('Arial', '', 10)
+            pdf.multi_cell(0, 6, "Generated on: " + rounded_down_datetime)
+            loop_counter = 0
+            num_imgs_per_row = 3
+            for filename in self.__getPdfImageFilenames__(foldername):
+                if image_scale is not None:
+                    filename = self.__getDownscaledImage__(filename, image_scale, downscaled_folder)
+                image_bytes += os.path.getsize(filename)
+                x_coord = 20 + loop_counter * 60
+                pdf.set_x(x_coord)
+                pdf.image(filename, w=50, h=30)
+                pdf.set_y(pdf.get_y() - 30)
+                if loop_counter == num_imgs_per_row - 1:
+                    pdf.ln()
+                    loop_counter = 0
+                    pdf.set_y(pdf.get_y() + 25)
+                else:
+                    loop_counter += 1
 
         pdf.output(pdf_output_filename, 'F')
+        return image_bytes
 
-    def __getDecreasedDpiValue__(self, previous_dpi, previous_filesize):
+    def __getPdfCaseFolders__(self):
         """
-        When printing files to PDF, dpi lowering the dpi is useful for fitting the pdf's filesize under a certain value.
-        This method returns a suggested dpi value to print the pdf to that's more likely to fit within a given filesize.
-        Note, it is not guranteed that this function will return a dpi that DOES fit within a certain file size. This
-        function is intended to be used multiple times throughout a loop as it gets closer to an optimal dpi.
-        This function takes an incremental methodology to approaching an optimal dpi.
+        Returns the names of the case folders printed to the pdf, in the order they are printed
 
-        Since the relationship between dpi and pdf filesize is mostly linear, the algorithm used to calculate the next
-        recommended dpi is based on subtracting a percentage of the dpi relative to how far off the filesize was.
+        :return: List of folder names
+        """
+        return [foldername for foldername in sorted(os.listdir(self.output_folder)) if os.path.isdir(foldername)]
 
-        An optional step_multiplier can be modified in the code to increase or decrease the strength of the dpi change.
+    def __getPdfImageFilenames__(self, foldername):
+        """
+        Returns the images of a case folder that are printed to the pdf, in the order they are printed
 
-        This method was inspired by the optimization functions used in artificial intelligence.
+        :param foldername: Name of the case folder
+        :return: List of image filenames
+        """
+        filenames = [self.output_folder + '/' + foldername + '/' + filename
+                     for filename in sorted(os.listdir(self.output_folder + "/" + foldername))]
+        # The gallery format may also be listed as an extra format, its images are still printed
+        extra_extensions = tuple(extension for extension in self.extra_image_extensions
+                                 if extension != self.image_extension)
+        return [filename for filename in filenames
+                if "html" not in filename and "txt" not in filename and os.path.isfile(filename)
+                and not filename.endswith(extra_extensions)]
+
+    @staticmethod
+    def __getDownscaledImage__(filename, image_scale, downscaled_folder):
+        """
+        Writes a copy of an image scaled by the given factor and stored with an adaptive palette of 256 colors,
+        which compresses plots much better than full RGB colors
 
-        :param previous_dpi: A dpi value that was larger than desired. The dpi value returend will be less than this one
-        :param previous_filesize: The filesize of the pdf generated by the previous_dpi
-        :return: A recommended dpi value that is closer to an optimal dpi value for the target filesize
+        :param filename: Name of the image file
+        :param image_scale: Factor by which the width and height of the image are scaled
+        :param downscaled_folder: Folder in which the copy is written
+        :return: Name of the copy
         """
-        # Values >1 make run faster, but may not find the best dpi, values <1 are slower but are more likely to find the
-        # best dpi. It's recommended to use values from 0->1. Recommended value: 0.25.
-        # General rule of thumb:
-        #   1.0 takes ~2-3 iterations, 0.75 takes ~3 iterations, 0.5 takes ~4 iterations, 0.25 takes ~5 iterations
-        # Note: A step size of 0 or close to 0 will result in dpi reductions of 1 per iteration. This is the slowest
-        #       option but it's guaranteed to find the best dpi.
-        step_multiplier = 0.25
-        filesize_ratio = (previous_filesize / self.pdf_filesize_limit)
-        dpi_reduction_amount = max(previous_dpi * step_multiplier / filesize_ratio, 1)
-        new_dpi = round(previous_dpi - dpi_reduction_amount)
-        return new_dpi
+        case_folder, basename = os.path.split(filename)
+        downscaled_filename = os.path.join(downscaled_folder, os.path.basename(case_folder) + '_' + basename)
+        with Image.open(filename) as image:
+            image = image.convert('RGB')
+            if image_scale != 1.0:
+                size = (max(round(image.width * image_scale), 1), max(round(image.height * image_scale), 1))
+                image = image.resize(size, Image.LANCZOS)
+            image.quantize(256).save(downscaled_filename, optimize=True)
+        return downscaled_filename
 
     def __extractNumCasesPlotted__(self, plotCaseDataArray):
         """
@@ -399,36 +517,188 @@ class PyPlotGen:
                 num_true += 1
         return num_true
 
-    def __plotCase__(self, case_def):
+    def __plotCasesInPool__(self, pool, case_defs, total_progress_counter):
         """
-        Plots the given case. Pulled out into it's own function to help move towards multithreading
-        :param case_def:
-        :return: True if case was plotted, False if case was not plotted
+        Plots the given cases using a process pool.
+        The data of each case is extracted by one worker (see __setupCase__). As soon as a case is set up,
+        each of its panels is submitted to the pool as a separate render job. All workers take their next task
+        from the same queue, so the panels of a single large case are spread over all processes instead of being
+        rendered one after another by the process that loaded the case.
+        The image filenames are fixed when the render jobs are created, so the output does not depend on
+        the order in which the jobs finish.
+        If movie_chunks is greater than 1, the frames of each streamed movie are split into chunks which are
+        rendered as separate jobs. Once all chunks of a movie are written, their segments are joined in this process.
+
+        :param pool: A multiprocessing.Pool
+        :param case_defs: List of case definitions (see Case_definitions.py)
+        :param total_progress_counter: List [total number of panels, number of panels plotted so far]
+        :return: List of True/False values, one for each case that was (not) plotted
+        """
+        cases_plotted_bools = []
+        case_render_results = []
+        # Render callbacks run in a separate thread of this process
+        progress_lock = threading.Lock()
+
+        def panelPlotted(filtering_flag):
+            with progress_lock:
+                total_progress_counter[1] += 1
+                updateProgress(total_progress_counter, self.image_extension, self.animation)
+
+        def getChunkPlottedCallback(num_chunks):
+            # A movie counts as plotted once all of its chunks are written
+            chunks_left = [num_chunks]
+
+            def chunkPlotted(filtering_flag):
+                with progress_lock:
+                    chunks_left[0] -= 1
+                    movie_plotted = chunks_left[0] == 0
+                if movie_plotted:
+                    panelPlotted(filtering_flag)
+            return chunkPlotted
+
+        for case_plotted, casename, plot_jobs in pool.imap_unordered(self.__setupCase__, case_defs):
+            cases_plotted_bools.append(case_plotted)
+            if not case_plotted:
+                continue
+            with progress_lock:
+                total_progress_counter[0] += len(plot_jobs)
+            render_results = []
+            for plot_job in plot_jobs:
+                if self.movie_chunks > 1 and plot_job.isSplittable():
+                    if not plot_job.needsPlotting():
+                        panelPlotted(None)
+                        continue
+                    chunkPlotted = getChunkPlottedCallback(self.movie_chunks)
+                    chunk_results = [pool.apply_async(chunk_job.run, callback=chunkPlotted)
+                                     for chunk_job in plot_job.getMovieChunkJobs(self.movie_chunks)]
+                    render_results.append((plot_job, chunk_results))
+                else:
+                    render_results.append((None, [pool.apply_async(plot_job.run, callback=panelPlotted)]))
+            case_render_results.append((casename, render_results))
+
+        # Wait for all panels and re-raise errors that occurred while rendering
+        for casename, render_results in case_render_results:
+            filtering_flags = []
+            for plot_job, results in render_results:
+                filtering_flags.extend(result.get() for result in results)
+                if plot_job is not None:
+                    plot_job.concatenateMovieChunks(self.movie_chunks)
+            PanelPlotJob.logFilteredAnimations(casename, filtering_flags)
+        return cases_plotted_bools
+
+    def __setupCase__(self, case_def):
+        """
+        Loads the data of the given case and creates the render jobs for all of its panels.
+
+        :param case_def: The case definition object
+        :return: Tuple (case_plotted, casename, plot_jobs). plot_jobs is None if there is no data for the case.
         """
         self.case_diff_datasets = None
         casename = case_def['name']
-        case_plotted = False
-        if self.__dataForCaseExists__(case_def):
-            logToFile('-------------------------------------------')
-            logToFile("Processing: {}".format(case_def['name'].upper()))
-            if self.diff is not None:
-                self.case_diff_datasets = self.diff_datasets[casename]
+        if not self.__dataForCaseExists__(case_def):
+            return False, casename, None
+        logToFile('-------------------------------------------')
+        logToFile("Processing: {}".format(case_def['name'].upper()))
+        if self.diff is not None:
+            self.case_diff_datasets = self.diff_datasets[casename]
+        profiler = getProfiler()
+        with profiler.measure(CATEGORY_CASE, casename):
             case_gallery_setup = CaseGallerySetup(case_def, clubb_folders=self.clubb_folders, plot_les=self.les,
                                                   plot_budgets=self.plot_budgets, sam_folders=self.sam_folders,
                                                   wrf_folders=self.wrf_folders, diff_datasets=self.case_diff_datasets,
-                                                  plot_r408=self.cgbest, plot_hoc=self.hoc, e3sm_folders=self.e3sm_folders,
-                                                  cam_folders=self.cam_folders, time_height=self.time_height,
-                                                  animation=self.animation, samstyle=self.sam_style_budgets, 
-                                                  plot_subcolumns=self.plot_subcolumns, lumped_buoy_budgets=self.lumped_buoy_budgets,
-                                                  background_rcm=self.background_rcm, image_extension=self.image_extension,
-                                                  total_panels_to_plot=0, priority_vars=self.priority_vars)
-            # Call plot function of case instance
-            case_gallery_setup.plot(self.output_folder, replace_images=self.replace_images, no_legends=self.no_legends,
-                                    thin_lines=self.thin, show_alphabetic_id=self.show_alphabetic_id,
-                                    total_progress_counter=total_progress_counter)
-            self.cases_plotted.append(case_def)
-            case_plotted = True
+                                                  plot_r408=self.cgbest, plot_hoc=self.hoc,
+                                                  e3sm_folders=self.e3sm_folders, cam_folders=self.cam_folders,
+                                                  time_height=self.time_height, animation=self.animation,
+                                                  samstyle=self.sam_style_budgets, plot_subcolumns=self.plot_subcolumns,
+                                                  lumped_buoy_budgets=self.lumped_buoy_budgets,
+                                                  background_rcm=self.background_rcm,
+                                                  image_extension=self.image_extension, total_panels_to_plot=0,
+                                                  priority_vars=self.priority_vars, cache_folder=self.cache_folder,
+                                                  lazy=self.incremental)
+        profiler.flush()
+        logToFile("\tSaving panels to {} images".format(self.image_extension))
+        plot_jobs = case_gallery_setup.getPlotJobs(self.output_folder, replace_images=self.replace_images,
+                                                   no_legends=self.no_legends, thin_lines=self.thin,
+                                                   show_alphabetic_id=self.show_alphabetic_id,
+                                                   incremental=self.incremental,
+                                                   stream_movies=self.stream_movies,
+                                                   max_movie_frames=self.max_movie_frames,
+                                                   movie_frame_interval=self.movie_frame_interval,
+                                                   average_movie_frames=self.average_movie_frames,
+                                                   extra_image_extensions=self.extra_image_extensions,
+                                                   thumbnail_width=self.__getThumbnailWidth__())
+        if self.incremental:
+            self.__removeStaleOutput__(casename, plot_jobs)
+        self.cases_plotted.append(case_def)
+        return True, casename, plot_jobs
+
+    def __writeProfile__(self, records_folder):
+        """
+        Collects the profiling records of all processes, writes them to the output folder
+        and prints a summary table.
+
+        :param records_folder: Folder into which all processes flushed their profiling records
+        :return: None
+        """
+        profiler = getProfiler()
+        profiler.flush()
+        summary = Profiler.writeReport(Profiler.readRecords(records_folder), self.output_folder)
+        profiler.disable()
+        shutil.rmtree(records_folder, ignore_errors=True)
+        logToFileAndConsole("Profile of this run (times include nested entries, e.g. a variable group includes "
+                            "its variables):")
+        logToFileAndConsole(Profiler.formatSummary(summary))
+        logToFileAndConsole("Full profile written to " + self.output_folder + "/profile.json and profile.csv")
+        logToFileAndConsole('-------------------------------------------')
+
+    def __removeStaleOutput__(self, casename, plot_jobs):
+        """
+        Deletes images/movies (and their content hashes) of a case that were written by an earlier incremental run
+        but are not part of the current run anymore, e.g. because a variable was removed or panels moved.
+
+        :param casename: The name of the case
+        :param plot_jobs: All PanelPlotJobs of the case in the current run
+        :return: None
+        """
+        case_folder = self.output_folder + '/' + casename
+        if not os.path.isdir(case_folder):
+            return
+        output_filenames = set(plot_job.getOutputFilename() for plot_job in plot_jobs)
+        output_extensions = (self.image_extension, '.mp4', '.avi')
+        for filename in os.listdir(case_folder):
+            filename = clean_path(case_folder + '/' + filename)
+            # Files in extra formats belong to the image of the same name
+            basename, extension = os.path.splitext(filename)
+            if extension in self.extra_image_extensions and extension != self.image_extension:
+                if basename + self.image_extension not in output_filenames and os.path.isfile(filename):
+                    logToFile("\tRemoving stale output file " + filename)
+                    os.remove(filename)
+                continue
+            if filename.endswith(output_extensions) and os.path.isfile(filename) \
+                    and filename not in output_filenames:
+                logToFile("\tRemoving stale output file " + filename)
+                os.remove(filename)
+                hash_filename = PanelPlotJob.getHashFilename(filename)
+                if os.path.exists(hash_filename):
+                    os.remove(hash_filename)
+
+    def __plotCase__(self, case_def, total_progress_counter):
+        """
+        Plots the given case in the current process.
 
+        :param case_def: The case definition object
+        :param total_progress_counter: List [total number of panels, number of panels plotted so far]
+        :return: True if case was plotted, False if case was not plotted
+        """
+        case_plotted, casename, plot_jobs = self.__setupCase__(case_def)
+        if case_plotted:
+            total_progress_counter[0] += len(plot_jobs)
+            filtering_flags = []
+            for plot_job in plot_jobs:
+                filtering_flags.append(plot_job.run())
+                total_progress_counter[1] += 1
+                updateProgress(total_progress_counter, self.image_extension, self.animation)
+            PanelPlotJob.logFilteredAnimations(casename, filtering_flags)
         return case_plotted
 
     def __dataForCaseExists__(self, case_def):
@@ -721,6 +991,49 @@ def __processArguments__():
                         default=[], nargs='+')
     parser.add_argument("--priority-variables", help="Plot only variables with the 'priority' key.",
                         action="store_true")
+    parser.add_argument("--cache-dir", help="Store the data of all panels in this folder and reuse it when pyplotgen "
+                                            "is run again with the same input files, case definitions and "
+                                            "variable definitions. This skips reading the netcdf files for "
+                                            "unchanged panels.",
+                        action="store", default=None)
+    parser.add_argument("--incremental",
+                        help="Reuse the output folder of an earlier run with this option and only plot panels whose "
+                             "data, plot options or style settings changed since then. Unchanged images are kept.",
+                        action="store_true")
+    parser.add_argument("--profile",
+                        help="Record the wall time and the amount of data read for every case, variable group, "
+                             "variable, calc function and panel. The records are written to profile.json and "
+                             "profile.csv in the output folder and summarized at the end of the run.",
+                        action="store_true")
+    parser.add_argument("--stream-movies",
+                        help="With -m, render the frames of each movie in memory and pipe them to the encoder "
+                             "(ffmpeg, or opencv if ffmpeg is not installed) instead of writing temporary images.",
+                        action="store_true")
+    parser.add_argument("--movie-chunks",
+                        help="With -m, split the frames of each movie into this many chunks that are rendered by "
+                             "different processes and joined afterwards. Implies --stream-movies. Has no effect "
+                             "with --disable-multithreading.",
+                        action="store", type=int, default=1)
+    parser.add_argument("--max-movie-frames",
+                        help="With -m, limit every movie to this many frames. Longer simulations are decimated in time "
+                             "(see --average-movie-frames).",
+                        action="store", type=int, default=None)
+    parser.add_argument("--movie-frame-interval",
+                        help="With -m, show at most one frame per this many simulated minutes.",
+                        action="store", type=float, default=None)
+    parser.add_argument("--average-movie-frames",
+                        help="With --max-movie-frames or --movie-frame-interval, show the time average over the time "
+                             "steps each frame replaces instead of the last of these time steps.",
+                        action="store_true")
+    parser.add_argument("--extra-formats",
+                        help="Also save every panel in these formats (e.g. --extra-formats svg pdf). Each panel is "
+                             "plotted once and saved to all formats. The web page shows the png (or --svg/--eps) "
+                             "images. Not compatible with --movies.",
+                        nargs='+', choices=['png', 'svg', 'eps', 'pdf'], default=[])
+    parser.add_argument("--thumbnails",
+                        help="Show thumbnails linking to the images on the webpage. Useful with --high-quality. "
+                             "Thumbnails of unchanged images are kept between runs.",
+                        action="store_true")
     parser.add_argument("--sam-style-budgets", help="Lump together certain CLUBB budget terms so that the relevant " 
                                                     "CLUBB budgets look comparable to SAM's budgets.",
                         action="store_true")
@@ -763,6 +1076,9 @@ def __processArguments__():
     if args.eps:
         image_extension = ".eps"
 
+    if args.movies is not None and len(args.extra_formats) > 0:
+        raise RuntimeError("The --extra-formats option does not apply to --movies. Please remove one of them.")
+
     if args.eps and args.svg:
         raise RuntimeError("The --svg and --eps options are not compatible with one another. Please select either --eps "
                            "or --svg but not both.")
@@ -805,16 +1121,15 @@ def __processArguments__():
                           show_alphabetic_id=args.show_alphabetic_id, time_height=args.time_height_plots, animation=args.movies,
                           samstyle=args.sam_style_budgets, disable_multithreading=args.disable_multithreading, pdf=args.pdf,
                           pdf_filesize_limit=args.pdf_filesize_limit, plot_subcolumns=args.plot_subcolumns,
-                          image_extension=image_extension)
+                          image_extension=image_extension, cache_folder=args.cache_dir,
+                          incremental=args.incremental, profile=args.profile, stream_movies=args.stream_movies,
+                          movie_chunks=args.movie_chunks, max_movie_frames=args.max_movie_frames,
+                          movie_frame_interval=args.movie_frame_interval,
+                          average_movie_frames=args.average_movie_frames, thumbnails=args.thumbnails,
+                          extra_image_extensions=['.' + extension for extension in args.extra_formats])
     return pyplotgen
 
 
-# Added to track progress with multithreading
-def tpc_init(x):
-    global total_progress_counter
-    total_progress_counter = x
-
-
 if __name__ == "__main__":
     pyplotgen = __processArguments__()
     start_time = time.time()
@@ -5,6 +5,7 @@
 import datetime
 import fnmatch
 import glob
+import io
 import multiprocessing
 import os
 import random
@@ -17,6 +18,7 @@ from multiprocessing import freeze_support
 from config import Case_definitions
 from python_html_gallery import static_varbles
 from src.OutputHandler import logToFile, logToFileAndConsole
+from src.Panel import THUMBNAIL_FOLDER
 
 try:
     from PIL import Image
@@ -27,6 +29,9 @@ except ImportError:
         logToFile('Requires Python Imaging Library. See README.md.')
         sys.exit(1)
 
+# Image types PIL can create thumbnails for
+THUMBNAIL_EXTENSIONS = {'.png'}
+
 
 def ListFiles(regex, path):
     """Returns list of matching files in path."""
@@ -77,21 +82,79 @@ def OrganizeRoot(output_dir,file_extension=".png"):
                 logToFile('%s already exists' % os.path.join(datehour, jpg))
 
 
-def GenerateHtmlImages(page, jpgs, file_extension):
+def ThumbnailPath(page, jpg):
+    """
+    Returns path to the thumbnail of an image of a page.
+    Thumbnails are kept in a hidden folder (THUMBNAIL_FOLDER) inside the page folder,
+    so they are not picked up as images of the page themselves.
+    """
+    return page + '/' + THUMBNAIL_FOLDER + '/' + jpg
+
+
+def GenerateThumbnail(thumbnail_job):
+    """
+    Creates the thumbnail of an image, unless the thumbnail is newer than the image.
+
+  Args:
+    thumbnail_job: tuple, (path of the image, path of the thumbnail, maximum thumbnail width in pixels).
+  Returns:
+    bool, True if the thumbnail was created.
+  """
+    jpg, thumbnail, thumbnail_width = thumbnail_job
+    if os.path.exists(thumbnail) and os.path.getmtime(thumbnail) >= os.path.getmtime(jpg):
+        return False
+    with Image.open(jpg) as img:
+        img.thumbnail((thumbnail_width, img.height))
+        img.save(thumbnail)
+    return True
+
+
+def GenerateThumbnails(pages, file_extension, thumbnail_width, pool=None):
+    """
+    Creates the thumbnails of all images of the given pages that are missing or older than their image,
+    and removes thumbnails whose image no longer exists.
+    Thumbnails that panels already wrote while plotting are newer than their image and are not created again.
+
+  Args:
+    pages: list, names of pages under root directory.
+    thumbnail_width: int, maximum thumbnail width in pixels.
+    pool: multiprocessing.Pool used to create the thumbnails, or None to create them in this process.
+  """
+    thumbnail_jobs = []
+    for page in pages:
+        jpgs = ListFiles('*' + file_extension, page) or []
+        thumbnail_folder = os.path.join(page, THUMBNAIL_FOLDER)
+        os.makedirs(thumbnail_folder, exist_ok=True)
+        for thumbnail in os.listdir(thumbnail_folder):
+            if thumbnail not in jpgs:
+                os.remove(os.path.join(thumbnail_folder, thumbnail))
+        for jpg in jpgs:
+            thumbnail_jobs.append((page + '/' + jpg, ThumbnailPath(page, jpg), thumbnail_width))
+
+    if pool is not None:
+        created = pool.map(GenerateThumbnail, thumbnail_jobs, chunksize=16)
+    else:
+        created = [GenerateThumbnail(thumbnail_job) for thumbnail_job in thumbnail_jobs]
+    logToFile('Created %s of %s thumbnail(s)' % (sum(created), len(thumbnail_jobs)))
+
+
+def GenerateHtmlImages(page, jpgs, file_extension, thumbnails=False):
     """
     Creates HTML image elements
 
   Args:
     page: str, name of page for thumbnails.
     jpgs: list, jpg files to create thumbnails for.
+    thumbnails: bool, if True, the images are shown as thumbnails (see GenerateThumbnails) linking to the images.
   Returns:
     url_imgs: list, image links to write.
   """
     url_imgs = []
     for jpg in jpgs:
+        thumbnail = ThumbnailPath(page, jpg)
         jpg = page + '/' + jpg
         if file_extension in {'.png','.svg','.eps'}:
-            url_imgs.append(static_varbles.url_img % (jpg, jpg, jpg))
+            url_imgs.append(static_varbles.url_img % (jpg, jpg, thumbnail if thumbnails else jpg))
         elif file_extension in {'.mp4','.avi'}:
             url_imgs.append(static_varbles.url_mov % (jpg))
     return url_imgs
@@ -119,15 +182,18 @@ def get_description(casename):
             return case['description']
 
 
-def WriteGalleryPage(page,file_extension=".png"):
-    """Writes a gallery page for jpgs in path.
+def GetGalleryPage(page,file_extension=".png",thumbnails=False):
+    """Returns the gallery section for jpgs in path.
 
   Args:
     page: str, name of page under root directory.
+    thumbnails: bool, if True, the images are shown as thumbnails.
+  Returns:
+    str, HTML of the gallery section.
   """
     # os.chdir(static_varbles.root)
 
-    with open(static_varbles.plots_filename, 'a') as plots_file:
+    with io.StringIO() as plots_file:
         # plots_file.write(static_varbles.header % page)
         # plots_file.write(static_varbles.case_title % page)
         start_time,end_time = get_start_end_minutes(page)
@@ -157,31 +223,44 @@ def WriteGalleryPage(page,file_extension=".png"):
                 logToFileAndConsole('%s: SUCCESS --> Movies found.' % page.upper())
         except TypeError:
             logToFileAndConsole('%s: ERROR --> No images or movies found...' % page.upper())
-            return
+            return plots_file.getvalue()
 
-        for e in GenerateHtmlImages(page, jpgs, file_extension):
+        for e in GenerateHtmlImages(page, jpgs, file_extension, thumbnails):
             plots_file.write(e)
 
         # plots_file.write(static_varbles.footer)
+        return plots_file.getvalue()
 
 
-def WriteGalleryPages(multithreaded=False,file_extension=".png"):
-    """Write gallery pages for directories in root path."""
-    with open(static_varbles.plots_filename, 'w') as index_file:
-        index_file.write(static_varbles.header)
+def WriteGalleryPages(multithreaded=False,file_extension=".png",thumbnail_width=None):
+    """Write gallery pages for directories in root path.
+
+  The order of the pages is fixed before any work is handed to other processes,
+  and the pages are written in that order, so the output does not depend on multithreading.
 
+  Args:
+    thumbnail_width: int, if given, images are shown as thumbnails of at most this width in pixels.
+  """
     all_pages = sorted(ListDirs(static_varbles.root))
+    thumbnails = thumbnail_width is not None and file_extension in THUMBNAIL_EXTENSIONS
+    page_jobs = [(page, file_extension, thumbnails) for page in all_pages]
 
     if multithreaded:
         freeze_support()  # Required for multithreading
         n_processors = multiprocessing.cpu_count()
         with Pool(processes=n_processors) as pool:
-            pool.map(WriteGalleryPage, all_pages)
+            if thumbnails:
+                GenerateThumbnails(all_pages, file_extension, thumbnail_width, pool=pool)
+            gallery_pages = pool.starmap(GetGalleryPage, page_jobs)
     else:
-        for page in all_pages:
-            WriteGalleryPage(page,file_extension)
+        if thumbnails:
+            GenerateThumbnails(all_pages, file_extension, thumbnail_width)
+        gallery_pages = [GetGalleryPage(*page_job) for page_job in page_jobs]
 
-    with open(static_varbles.plots_filename, 'a') as index_file:
+    with open(static_varbles.plots_filename, 'w') as index_file:
+        index_file.write(static_varbles.header)
+        for gallery_page in gallery_pages:
+            index_file.write(gallery_page)
         index_file.write(static_varbles.footer)
 
 
@@ -218,10 +297,10 @@ def WriteIndex():
 
     logToFile("Wrote index.html")
 
-def main(output_dir, multithreaded=False, file_extension=".png"):
+def main(output_dir, multithreaded=False, file_extension=".png", thumbnail_width=None):
     """Main function."""
     OrganizeRoot(output_dir,file_extension)
-    WriteGalleryPages(multithreaded=multithreaded,file_extension=file_extension)
+    WriteGalleryPages(multithreaded=multithreaded,file_extension=file_extension,thumbnail_width=thumbnail_width)
     WriteNavigation()
     WriteIndex()
 
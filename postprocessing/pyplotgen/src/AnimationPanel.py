@@ -12,15 +12,17 @@ The changed plot routine outputs animations of profile plots instead of simple p
 import glob
 import os
 import shutil
+import tempfile
 import warnings
 from datetime import datetime
 from textwrap import fill
 
 import matplotlib.pyplot as plt
 import numpy as np
-from cycler import cycler
 
 from config import Style_definitions
+from src.DataReader import DataReader
+from src.MovieEncoder import MovieEncoder
 from src.interoperability import clean_path, clean_title
 
 try:
@@ -60,9 +62,12 @@ class AnimationPanel(Panel):
         #       that handles background-rcm into AnimationPanel
         super().__init__(plots, 0, 0, 0, 0,
                          panel_type, title, dependent_title, sci_scale=None, centered=False)
+        # x-axis limits of the undecimated time steps, set by __decimateTimeSteps__()
+        self.fixed_x_limits = None
 
     def plot(self, output_folder, casename, replace_images = False, no_legends = True, thin_lines = False,
-             alphabetic_id="", paired_plots = True, image_extension=".png", movie_extension=".mp4"):
+             alphabetic_id="", paired_plots = True, image_extension=".png", movie_extension=".mp4", timestamp=None,
+             stream_movie=False, movie_chunk=None, max_frames=None, frame_interval=None, average_frames=False):
         """
         New version of plot routine to generate movies of profiles.
 
@@ -76,238 +81,46 @@ class AnimationPanel(Panel):
             use the color/style rotation specified in Style_definitions.py
         :param image_extension: Present in case movies can be made from different image types (only .png for now)
         :param movie_extension: Passed so the movies are output to the user's desired format (mp4, avi, etc.)
-        :return: None
+        :param timestamp: String used in the movie filename to order the panels in the gallery.
+            If None (default), the time the last frame was plotted is used.
+        :param stream_movie: If True, the frames are rendered in memory and piped to the movie encoder
+            (see streamMovie()) instead of being saved as temporary images.
+        :param movie_chunk: Tuple (chunk_index, num_chunks). If given with stream_movie, only the given chunk of
+            the time steps is written to a movie segment (see streamMovie() and concatenateMovieChunks()).
+        :param max_frames: Maximum number of frames of the movie. If None (default), the number of frames is not limited.
+        :param frame_interval: Minimum number of simulated minutes between two frames.
+            If None (default), every time step is used.
+        :param average_frames: If True, each frame shows the average over the time steps it replaces
+            instead of the last of these time steps (see __decimateTimeSteps__()).
+        :return: True if time steps had to be filtered out of some of the plotted simulations, False otherwise
         Warning! Argument `replace_images` is unused here!
         """
-        #find tmax and x_dataset
-        #tmax -- # of time steps of shortest simulation
-        #x_dataset = time step list of shortest sim.
-        tmax = np.inf ; idx = 0
-        sim_lengths=[]
-        for var in self.all_plots:
-            sim_lengths.append(len(var.x))
-            if len(var.x) < tmax:
-                x_dataset=var.x
-                tmax=len(x_dataset)
-                idx_max = idx
-            idx+=1
-
-        #if discrepanies in number of time steps, filter out the
-        #extraneous time steps from those simulations that have extra steps
-        if np.all(sim_lengths==tmax):
-            filteringFlag=False
-        else:
-            filteringFlag=True
-            idx = 0
-            for var in self.all_plots:
-                if idx == idx_max:
-                    idx+=1
-                else:
-                    temp_x_data=var.x
-                    temp_y_data=var.y
-                    temp_data=var.data
-                    filtered_data = np.zeros((len(x_dataset),len(temp_y_data)))
-                    for i in range(len(x_dataset)):
-                        for j in range(len(temp_x_data)):
-                            if x_dataset[i] == temp_x_data[j] or abs(x_dataset[i]-temp_x_data[j]) < 0.5:
-                                filtered_data[i,:]=temp_data[j,:]
-                    var.data = filtered_data
-                    idx+=1
-
-
-        min_x_value = np.inf ; max_x_value = -1*np.inf  #set large to be overwritten during first pass below
-        for t in range(0,tmax):
-
-            # Suppress deprecation warnings
-            with warnings.catch_warnings():
-                # Create new figure and axis
-                warnings.simplefilter("ignore")
-                plt.subplot(111)
-
-            # Set line color/style. This will cycle through all colors,
-            # then once colors run out use a new style and cycle through colors again
-            default_cycler = ( cycler(linestyle=Style_definitions.STYLE_ROTATION)
-                               * cycler(color=Style_definitions.COLOR_ROTATION))
-            plt.rc('axes', prop_cycle=default_cycler)
-
-            # Set graph size
-            plt.figure(figsize=Style_definitions.FIGSIZE)
-
-            # Set font sizes
-            plt.rc('font', size=Style_definitions.DEFAULT_TEXT_SIZE)          # controls default text sizes
-            plt.rc('axes', titlesize=Style_definitions.AXES_TITLE_FONT_SIZE)     # fontsize of the axes title
-            plt.rc('axes', labelsize=Style_definitions.AXES_LABEL_FONT_SIZE)    # fontsize of the x and y labels
-            plt.rc('xtick', labelsize=Style_definitions.X_TICKMARK_FONT_SIZE)    # fontsize of the tick labels
-            plt.rc('ytick', labelsize=Style_definitions.Y_TICKMARK_FONT_SIZE)    # fontsize of the tick labels
-            plt.rc('legend', fontsize=Style_definitions.LEGEND_FONT_SIZE)    # legend fontsize
-            plt.rc('figure', titlesize=Style_definitions.TITLE_TEXT_SIZE)  # fontsize of the figure title
-
-            label_scale_factor = ""
-            # Use custom sci scaling
-            if self.sci_scale is not None:
-                scalepower = -1 * self.sci_scale
-                if self.sci_scale != 0:
-                    label_scale_factor = "x 1e" + str(self.sci_scale)
-                math_scale_factor =  10 ** (scalepower)
-                plt.ticklabel_format(style='plain', axis='x')
-            # Use pyplot's default sci scaling
-            else:
-                plt.ticklabel_format(style='sci', axis='x', scilimits=Style_definitions.POW_LIMS)
-
-            # Prevent x-axis label from getting cut off
-            plt.gcf().subplots_adjust(bottom=0.15)
-
-            # Plot dashed line. This var will oscillate between true and false
-            plot_dashed = True
-
-            for var in self.all_plots:
-                legend_char_wrap_length = 17
-                var.label = var.label.replace('_', ' ') # replace _'s in foldernames with spaces for the legend label
-                var.label = fill(var.label, width=legend_char_wrap_length)
-                c_data = var.data
-                if self.sci_scale is not None:
-                    c_data[t,:] = c_data[t,:] * math_scale_factor
-                y_data = var.y
-
-                # Find min/max values for fixed x-axis
-                # Suppress "All-NaN slice encountered" warning
-                with warnings.catch_warnings():
-                    warnings.simplefilter("ignore")
-                    # Exclude first frame from finding min/max since it
-                    # may have some very extreme values
-                    current_min=np.nanmin(np.ndarray.flatten(c_data[1:,:]))
-                    current_max=np.nanmax(np.ndarray.flatten(c_data[1:,:]))
-                    if current_min < min_x_value:
-                        min_x_value = current_min
-                    elif np.isnan(current_min):
-                        min_x_value = -1.0
-                    if current_max > max_x_value:
-                        max_x_value = current_max
-                    elif np.isnan(current_max):
-                        max_x_value = 1.0
-
-                #shape sanity check
-                if c_data[t,:].shape[0] != y_data.shape[0]:
-                    raise ValueError("X and Y dependent_data have different shapes X: "+str(c_data[t,:].shape)
-                                     + "  Y:" + str(y_data.shape) + ". Attempted to plot " + self.title +
-                                     " using X: " + self.x_title + "  Y: " + self.y_title)
-
-                # Set correct line formatting and plot data
-                if var.line_format == Style_definitions.BENCHMARK_LINE_STYLES['coamps']:
-                    line_width = Style_definitions.LES_LINE_THICKNESS
-                elif var.line_format == Style_definitions.BENCHMARK_LINE_STYLES['sam']:
-                    line_width = Style_definitions.LES_LINE_THICKNESS
-                elif var.line_format == Style_definitions.BENCHMARK_LINE_STYLES['r408']:
-                    line_width = Style_definitions.ARCHIVED_CLUBB_LINE_THICKNESS
-                elif var.line_format == Style_definitions.BENCHMARK_LINE_STYLES['e3sm']:
-                    line_width = Style_definitions.E3SM_LINE_THICKNESS
-                else:
-                    line_width = Style_definitions.CLUBB_LINE_THICKNESS
-                if thin_lines:
-                    line_width = Style_definitions.THIN_LINE_THICKNESS
-                plotting_benchmark = var.line_format != ""
-                if plotting_benchmark:
-                    plt.plot(c_data[t,:], y_data, var.line_format, label=var.label, linewidth=line_width)
-                    # If a benchmark defines a custom color (e.g. "gray" or "#404040) this messes up the color rotation.
-                    # Setting the prop cycle to None and then redefining it fixes the color rotation.
-                    # This fix may be dependent on benchmarks being plotted first. If this stops being the case, colors may
-                    # repeat themselves sooner than expected.
-                    plt.gca().set_prop_cycle(None)
-                    plt.rc('axes', prop_cycle=default_cycler)
-                # If format is not specified and paired_plots are enabled,
-                # use the color/style rotation specified in Style_definitions.py
-                elif paired_plots:
-                    if plot_dashed:
-                        line_width = Style_definitions.DASHED_LINE_THICKNESS
-                        line_style = '--'
-                        plot_dashed = False
-                    else:
-                        line_width = Style_definitions.FLAT_LINE_THICKNESS
-                        line_style = '-'
-                        plot_dashed = True
-
-                    plt.plot(c_data[t,:], y_data, linestyle=line_style, label=var.label, linewidth=line_width)
-                else:
-                    plt.plot(c_data[t,:], y_data, label=var.label, linewidth=line_width)
-
-            # Show grid if enabled
-            ax = plt.gca()
-            ax.grid(Style_definitions.SHOW_GRID)
-
-            ax.set_prop_cycle(default_cycler)
-
-            # Set titles---top title includes minute counter for reference
-            plt.title(self.title +'\nMinute = {}'.format(int(x_dataset[t])))
-            plt.ylabel(self.y_title)
-            plt.text(1, -0.15, label_scale_factor, transform=ax.transAxes, fontsize=Style_definitions.MEDIUM_FONT_SIZE)
-            plt.xlabel(self.x_title)
-
-            # Add alphabetic ID
-            if alphabetic_id != "":
-                ax.text(0.9, 0.9, '('+alphabetic_id+')', ha='center', va='center', transform=ax.transAxes,
-                        fontsize=Style_definitions.LARGE_FONT_SIZE) # Add letter label to panels
-
-            # Plot legend
-            if no_legends is False:
-                # Shrink current axis by 20%
-                box = ax.get_position()
-                ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
-                # Put a legend to the right of the current axis
-                ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
-
-            # Fix x-axis
-            if min_x_value != 0 and max_x_value != 0:
-                plt.xlim( min_x_value - abs(min_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR,
-                          max_x_value + abs(max_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR)
-            if min_x_value == 0 and max_x_value == 0:
-                plt.xlim(-1,1)
-            elif min_x_value == 0:
-                plt.xlim( min_x_value - abs(max_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR,
-                          max_x_value + abs(max_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR)
-            elif max_x_value == 0:
-                plt.xlim( min_x_value - abs(min_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR,
-                          max_x_value + abs(min_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR)
-
-            # Emphasize 0 line in profile plots if 0 is in x-axis range
-            xlim = plt.xlim()
-            if xlim[0] <= 0 <= xlim[1]:
-                plt.axvline(x=0, color='grey', ls='-')
-
-            # Create folders
-            # Because os.mkdir("output") can fail and prevent os.mkdir("output/" + casename) from being called we must
-            # use two separate try blocks
-            try:
-                os.mkdir(output_folder)
-            except FileExistsError:
-                pass # do nothing
-            try:
-                os.mkdir(output_folder + "/" + casename)
-            except FileExistsError:
-                pass # do nothing
-
-            #create tmp folder to house original images for movie
-            temp_dir='tmp'
-            try:
-                os.mkdir(output_folder + "/" + casename + "/" + temp_dir)
-            except FileExistsError:
-                pass #do nothing
-
-            # Generate image filename
-            filename = self.panel_type + "_"+ str(datetime.now())
-            # Force subcolumn plots to show up on top
-            if self.panel_type == Panel.TYPE_SUBCOLUMN:
-                filename = 'aaa' + filename
-            if self.panel_type == Panel.TYPE_BUDGET:
-                filename = filename + "_"+ self.title
-            else:
-                filename = filename + '_' + self.y_title + "_VS_" + self.x_title
-            filename = self.__removeInvalidFilenameChars__(filename)
-            # Concatenate with output foldername
-            rel_filename = output_folder + "/" + casename + '/' + temp_dir + '/' + filename
-            rel_filename = clean_path(rel_filename)
-            # Save image file
-            plt.savefig(rel_filename+image_extension, dpi=Style_definitions.IMG_OUTPUT_DPI, bbox_inches='tight')
-            plt.close()
+        x_dataset, tmax, filteringFlag = self.__alignTimeSteps__()
+        x_dataset = self.__decimateTimeSteps__(x_dataset, max_frames=max_frames, frame_interval=frame_interval,
+                                               average_frames=average_frames)
+        if stream_movie:
+            self.streamMovie(output_folder, casename, x_dataset, no_legends=no_legends, thin_lines=thin_lines,
+                             alphabetic_id=alphabetic_id, paired_plots=paired_plots,
+                             movie_extension=movie_extension, timestamp=timestamp, movie_chunk=movie_chunk)
+            return filteringFlag
+
+        # Create folders
+        os.makedirs(output_folder + "/" + casename, exist_ok=True)
+
+        #create tmp folder to house original images for movie
+        #each panel gets its own folder since several panels of a case may be rendered at the same time
+        temp_dir = os.path.basename(tempfile.mkdtemp(prefix='tmp_', dir=output_folder + "/" + casename))
+
+        # Save the frames as images, named so that they sort in frame order
+        for t, frame in enumerate(self.renderFrames(x_dataset, no_legends=no_legends, thin_lines=thin_lines,
+                                                    alphabetic_id=alphabetic_id, paired_plots=paired_plots)):
+            rel_filename = clean_path(output_folder + "/" + casename + '/' + temp_dir + '/frame_{:06d}'.format(t))
+            cv2.imwrite(rel_filename + image_extension, frame[:, :, ::-1])
+
+        # Name the movie after the given timestamp instead of the time of the last frame
+        if timestamp is None:
+            timestamp = str(datetime.now())
+        filename = self.getFilename(timestamp)
 
         # Lights, camera, action!
         img_array=[]
@@ -325,7 +138,7 @@ class AnimationPanel(Panel):
 
         # check to see if FFMPEG is available--determines if we need a temporary name
         if shutil.which('ffmpeg') is not None and movie_extension == '.mp4':
-            moviename = output_folder + '/' + casename + '/' + "movie" + movie_extension
+            moviename = output_folder + '/' + casename + '/' + temp_dir + '/' + "movie" + movie_extension
         else:
             moviename = output_folder + '/' + casename + '/' + filename + movie_extension
 
@@ -347,4 +160,362 @@ class AnimationPanel(Panel):
         # Delete temp folder
         shutil.rmtree(output_folder + "/" + casename + "/" + temp_dir)
 
-        return filteringFlag
\ No newline at end of file
+        return filteringFlag
+
+    def streamMovie(self, output_folder, casename, x_dataset, no_legends=True, thin_lines=False, alphabetic_id="",
+                    paired_plots=True, movie_extension=".mp4", timestamp=None, movie_chunk=None):
+        """
+        Writes the movie of this panel without any temporary image files.
+        The frames are rendered into an in-memory RGB buffer by renderFrames() and written to a MovieEncoder.
+        Expects the time steps of the plotted simulations to be aligned already (see __alignTimeSteps__()).
+        For a description of the parameters, please see the documentation of plot().
+
+        If movie_chunk is given, the time steps are split into num_chunks consecutive chunks and only the frames
+        of the chunk with the given index are written to a movie segment (see getMovieChunkFilename()).
+        Since every frame is rendered the same way no matter which frames are rendered with it,
+        the chunks can be written by different processes and joined with concatenateMovieChunks().
+
+        :param x_dataset: Time steps (in minutes) of the frames
+        :param movie_chunk: Tuple (chunk_index, num_chunks), or None to write the whole movie
+        :return: Name of the movie (or segment) file, or None if the chunk is empty
+        """
+        os.makedirs(output_folder + "/" + casename, exist_ok=True)
+        if timestamp is None:
+            timestamp = str(datetime.now())
+        moviename = clean_path(output_folder + '/' + casename + '/' + self.getFilename(timestamp) + movie_extension)
+        time_indices = None
+        if movie_chunk is not None:
+            chunk_index, num_chunks = movie_chunk
+            time_indices = np.array_split(np.arange(len(x_dataset)), num_chunks)[chunk_index]
+            if len(time_indices) == 0:
+                return None
+            moviename = self.getMovieChunkFilename(moviename, chunk_index)
+        with MovieEncoder(moviename, movie_extension, Style_definitions.FRAMES_PER_SECOND) as encoder:
+            for frame in self.renderFrames(x_dataset, no_legends=no_legends, thin_lines=thin_lines,
+                                           alphabetic_id=alphabetic_id, paired_plots=paired_plots,
+                                           time_indices=time_indices):
+                encoder.write(frame)
+        return moviename
+
+    def concatenateMovieChunks(self, output_folder, casename, num_chunks, movie_extension=".mp4", timestamp=None):
+        """
+        Joins the movie segments written by streamMovie() for all chunks of this panel into the movie file
+        and removes the segments.
+        For a description of the parameters, please see the documentation of plot().
+
+        :param num_chunks: Number of chunks the time steps were split into
+        :return: Name of the movie file
+        """
+        moviename = clean_path(output_folder + '/' + casename + '/' + self.getFilename(timestamp) + movie_extension)
+        # Chunks without time steps do not write a segment
+        segment_filenames = [self.getMovieChunkFilename(moviename, chunk_index) for chunk_index in range(num_chunks)]
+        segment_filenames = [segment_filename for segment_filename in segment_filenames
+                             if os.path.exists(segment_filename)]
+        MovieEncoder.concatenate(segment_filenames, moviename, movie_extension, Style_definitions.FRAMES_PER_SECOND)
+        return moviename
+
+    @staticmethod
+    def getMovieChunkFilename(moviename, chunk_index):
+        """
+        Returns the name of the movie segment holding the frames of a chunk
+
+        :param moviename: Name of the complete movie file
+        :param chunk_index: Index of the chunk
+        :return: Filename string
+        """
+        basename, movie_extension = os.path.splitext(moviename)
+        return basename + '_chunk{:04d}'.format(chunk_index) + movie_extension
+
+    def renderFrames(self, x_dataset, no_legends=True, thin_lines=False, alphabetic_id="", paired_plots=True,
+                     time_indices=None):
+        """
+        Renders the frames of the movie of this panel into memory using blitting.
+        The axis limits are fixed for the whole movie (see __getFixedXLimits__() and __getFixedYLimits__()),
+        so the static parts of the figure (axes, ticks, labels, legend, ...) are drawn only once.
+        For every frame, this background is restored and only the lines and the title (which holds the
+        minute counter) are drawn on top of it.
+        All frames are cropped to the tight bounding box of the first frame and have the same size.
+        For a description of the other parameters, please see the documentation of plot().
+
+        :param x_dataset: Time steps (in minutes) of the frames
+        :param time_indices: Indices of the time steps to render. Defaults to all time steps in x_dataset.
+        :return: Generator of uint8 arrays of shape (height, width, 3) holding the RGB values of the frames
+        """
+        if time_indices is None:
+            time_indices = range(len(x_dataset))
+        time_indices = list(time_indices)
+        if len(time_indices) == 0:
+            return
+
+        # Get the cleared figure of this process and create a new axis
+        fig = self.__getFigure__()
+        default_dpi = fig.dpi
+        fig.set_dpi(Style_definitions.IMG_OUTPUT_DPI)
+        ax = fig.add_subplot(111)
+        ax.ticklabel_format(style='sci', axis='x', scilimits=Style_definitions.POW_LIMS)
+        # Prevent x-axis label from getting cut off
+        fig.subplots_adjust(bottom=0.15)
+
+        # The figure is set up with the first time step of the movie, so that every frame looks the same
+        # (in particular, is cropped the same) no matter which other frames are rendered with it
+        first_t = 0
+        lines = []
+        # Plot dashed line. This var will oscillate between true and false
+        plot_dashed = True
+        for var in self.all_plots:
+            legend_char_wrap_length = 17
+            var.label = var.label.replace('_', ' ') # replace _'s in foldernames with spaces for the legend label
+            var.label = fill(var.label, width=legend_char_wrap_length)
+            #shape sanity check
+            if var.data.shape[1] != var.y.shape[0]:
+                raise ValueError("X and Y dependent_data have different shapes X: "+str(var.data[first_t,:].shape)
+                                 + "  Y:" + str(var.y.shape) + ". Attempted to plot " + self.title +
+                                 " using X: " + self.x_title + "  Y: " + self.y_title)
+
+            # Set correct line formatting and plot data
+            if var.line_format == Style_definitions.BENCHMARK_LINE_STYLES['coamps']:
+                line_width = Style_definitions.LES_LINE_THICKNESS
+            elif var.line_format == Style_definitions.BENCHMARK_LINE_STYLES['sam']:
+                line_width = Style_definitions.LES_LINE_THICKNESS
+            elif var.line_format == Style_definitions.BENCHMARK_LINE_STYLES['r408']:
+                line_width = Style_definitions.ARCHIVED_CLUBB_LINE_THICKNESS
+            elif var.line_format == Style_definitions.BENCHMARK_LINE_STYLES['e3sm']:
+                line_width = Style_definitions.E3SM_LINE_THICKNESS
+            else:
+                line_width = Style_definitions.CLUBB_LINE_THICKNESS
+            if thin_lines:
+                line_width = Style_definitions.THIN_LINE_THICKNESS
+            plotting_benchmark = var.line_format != ""
+            if plotting_benchmark:
+                line, = ax.plot(var.data[first_t,:], var.y, var.line_format, label=var.label, linewidth=line_width)
+                # Resets the color rotation after benchmarks with custom colors, see Panel.plot()
+                ax.set_prop_cycle(None)
+            # If format is not specified and paired_plots are enabled,
+            # use the color/style rotation specified in Style_definitions.py
+            elif paired_plots:
+                if plot_dashed:
+                    line_width = Style_definitions.DASHED_LINE_THICKNESS
+                    line_style = '--'
+                    plot_dashed = False
+                else:
+                    line_width = Style_definitions.FLAT_LINE_THICKNESS
+                    line_style = '-'
+                    plot_dashed = True
+                line, = ax.plot(var.data[first_t,:], var.y, linestyle=line_style, label=var.label,
+                                linewidth=line_width)
+            else:
+                line, = ax.plot(var.data[first_t,:], var.y, label=var.label, linewidth=line_width)
+            lines.append(line)
+
+        # Show grid if enabled
+        ax.grid(Style_definitions.SHOW_GRID)
+
+        # Set titles---top title includes minute counter for reference
+        title = ax.set_title(self.title +'\nMinute = {}'.format(int(x_dataset[first_t])))
+        ax.set_ylabel(self.y_title)
+        ax.set_xlabel(self.x_title)
+
+        # Add alphabetic ID
+        if alphabetic_id != "":
+            ax.text(0.9, 0.9, '('+alphabetic_id+')', ha='center', va='center', transform=ax.transAxes,
+                    fontsize=Style_definitions.LARGE_FONT_SIZE) # Add letter label to panels
+
+        # Plot legend
+        if no_legends is False:
+            # Shrink current axis by 20%
+            box = ax.get_position()
+            ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
+            # Put a legend to the right of the current axis
+            ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
+
+        # Fix the axis limits for all frames
+        ax.set_xlim(*self.__getFixedXLimits__())
+        ax.set_ylim(*self.__getFixedYLimits__())
+
+        # Emphasize 0 line in profile plots if 0 is in x-axis range
+        xlim = ax.get_xlim()
+        if xlim[0] <= 0 <= xlim[1]:
+            ax.axvline(x=0, color='grey', ls='-')
+
+        # The crop box (in pixels, measured from the top left corner) is taken from the first frame,
+        # padded like savefig(bbox_inches='tight') does.
+        canvas = fig.canvas
+        canvas.draw()
+        dpi = fig.dpi
+        tight_bbox = fig.get_tightbbox(canvas.get_renderer()).padded(plt.rcParams['savefig.pad_inches'])
+        fig_height = fig.bbox.height
+        left = max(int(np.floor(tight_bbox.x0 * dpi)), 0)
+        right = min(int(np.ceil(tight_bbox.x1 * dpi)), int(fig.bbox.width))
+        top = max(int(np.floor(fig_height - tight_bbox.y1 * dpi)), 0)
+        bottom = min(int(np.ceil(fig_height - tight_bbox.y0 * dpi)), int(fig_height))
+
+        # Draw everything except the artists that change between frames once and keep it as the background
+        animated_artists = lines + [title]
+        for artist in animated_artists:
+            artist.set_animated(True)
+        canvas.draw()
+        background = canvas.copy_from_bbox(fig.bbox)
+
+        try:
+            for t in time_indices:
+                for line, var in zip(lines, self.all_plots):
+                    line.set_xdata(var.data[t,:])
+                title.set_text(self.title +'\nMinute = {}'.format(int(x_dataset[t])))
+                canvas.restore_region(background)
+                for artist in animated_artists:
+                    ax.draw_artist(artist)
+                yield np.asarray(canvas.buffer_rgba())[top:bottom, left:right, :3].copy()
+        finally:
+            # The figure is shared with the other panels of this process
+            fig.set_dpi(default_dpi)
+
+    def __getFixedXLimits__(self):
+        """
+        Returns the x-axis limits used for all frames of the movie.
+        The limits span the values of all plotted simulations over all time steps except the first,
+        which may contain very extreme values, and are widened by Style_definitions.MOVIE_XAXIS_SCALE_FACTOR.
+        If the time steps were decimated, the limits of the time steps before decimation are returned,
+        so the axis does not depend on the number of frames.
+
+        :return: Tuple (minimum, maximum)
+        """
+        if self.fixed_x_limits is not None:
+            return self.fixed_x_limits
+        #set large to be overwritten below
+        min_x_value = np.inf ; max_x_value = -1*np.inf
+        for var in self.all_plots:
+            # The first time step is only used if there is no other
+            data = var.data[1:,:] if var.data.shape[0] > 1 else var.data
+            # Suppress "All-NaN slice encountered" warning
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                current_min=np.nanmin(np.ndarray.flatten(data))
+                current_max=np.nanmax(np.ndarray.flatten(data))
+            if current_min < min_x_value:
+                min_x_value = current_min
+            elif np.isnan(current_min):
+                min_x_value = -1.0
+            if current_max > max_x_value:
+                max_x_value = current_max
+            elif np.isnan(current_max):
+                max_x_value = 1.0
+
+        if min_x_value == 0 and max_x_value == 0:
+            return -1, 1
+        if min_x_value == 0:
+            return (min_x_value - abs(max_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR,
+                    max_x_value + abs(max_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR)
+        if max_x_value == 0:
+            return (min_x_value - abs(min_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR,
+                    max_x_value + abs(min_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR)
+        return (min_x_value - abs(min_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR,
+                max_x_value + abs(max_x_value) * Style_definitions.MOVIE_XAXIS_SCALE_FACTOR)
+
+    def __getFixedYLimits__(self):
+        """
+        Returns the y-axis limits used for all frames of the movie,
+        i.e. the range of the heights of all plotted simulations with matplotlib's default margins.
+
+        :return: Tuple (minimum, maximum)
+        """
+        min_y_value = min(np.nanmin(var.y) for var in self.all_plots)
+        max_y_value = max(np.nanmax(var.y) for var in self.all_plots)
+        margin = (max_y_value - min_y_value) * plt.rcParams['axes.ymargin']
+        if margin == 0:
+            return min_y_value - 1, max_y_value + 1
+        return min_y_value - margin, max_y_value + margin
+
+    def __decimateTimeSteps__(self, x_dataset, max_frames=None, frame_interval=None, average_frames=False):
+        """
+        Reduces the number of time steps shown in the movie, so the cost of rendering it is bounded
+        no matter how long the simulation is.
+        The time steps are split into consecutive blocks covering frame_interval minutes each,
+        i.e. (0, frame_interval], (frame_interval, 2*frame_interval], ... If there are still more than max_frames blocks, neighboring blocks
+        are merged until there are max_frames blocks. Each block becomes one frame, labeled with the time of
+        its last time step, which shows either the data of that time step or the time average over the block
+        (computed by DataReader.__averageData__()).
+        The data of the plotted simulations is replaced by the data of the frames, after the x-axis limits
+        of all time steps have been stored (see __getFixedXLimits__()).
+        Expects the time steps of the plotted simulations to be aligned already (see __alignTimeSteps__()).
+
+        :param x_dataset: Time steps (in minutes) of the plotted simulations
+        :param max_frames: Maximum number of frames, or None
+        :param frame_interval: Minimum number of minutes between two frames, or None
+        :param average_frames: If True, the frames show time averages instead of single time steps
+        :return: Times (in minutes) of the frames
+        """
+        if max_frames is not None and max_frames < 1:
+            raise ValueError("Movies need at least one frame, but max_frames is {}".format(max_frames))
+        if frame_interval is not None and frame_interval <= 0:
+            raise ValueError("The interval between frames must be positive, but frame_interval is {}".format(
+                frame_interval))
+        time_indices = np.arange(len(x_dataset))
+        blocks = [[index] for index in time_indices]
+        if frame_interval is not None:
+            # The small offset keeps time steps that fall exactly on a multiple of frame_interval
+            # in the block they close despite rounding errors in the time variable
+            block_numbers = np.floor(np.asarray(x_dataset) / frame_interval - 1e-6)
+            blocks = np.split(time_indices, np.flatnonzero(np.diff(block_numbers)) + 1)
+        if max_frames is not None and len(blocks) > max_frames:
+            blocks = [np.concatenate([blocks[i] for i in merged_block_indices])
+                      for merged_block_indices in np.array_split(np.arange(len(blocks)), max_frames)]
+        if len(blocks) == len(time_indices):
+            return x_dataset
+
+        self.fixed_x_limits = self.__getFixedXLimits__()
+        last_indices = np.array([block[-1] for block in blocks])
+        for var in self.all_plots:
+            if average_frames:
+                var.data = np.array([DataReader.__averageData__(var.data, block[0], block[-1] + 1,
+                                                                log_short_intervals=False)
+                                     for block in blocks])
+            else:
+                var.data = var.data[last_indices, :]
+            var.x = np.asarray(x_dataset)[last_indices]
+        return np.asarray(x_dataset)[last_indices]
+
+    def __alignTimeSteps__(self):
+        """
+        Finds the time steps of the shortest plotted simulation.
+        If the simulations have different numbers of time steps, the data of the longer simulations is
+        filtered down to the time steps of the shortest one.
+
+        :return: Tuple (time steps of the shortest simulation, number of time steps,
+            True if time steps had to be filtered out)
+        """
+        #find tmax and x_dataset
+        #tmax -- # of time steps of shortest simulation
+        #x_dataset = time step list of shortest sim.
+        tmax = np.inf ; idx = 0
+        sim_lengths=[]
+        for var in self.all_plots:
+            sim_lengths.append(len(var.x))
+            if len(var.x) < tmax:
+                x_dataset=var.x
+                tmax=len(x_dataset)
+                idx_max = idx
+            idx+=1
+
+        #if discrepanies in number of time steps, filter out the
+        #extraneous time steps from those simulations that have extra steps
+        if np.all(np.array(sim_lengths) == tmax):
+            filteringFlag=False
+        else:
+            filteringFlag=True
+            idx = 0
+            for var in self.all_plots:
+                if idx == idx_max:
+                    idx+=1
+                else:
+                    temp_x_data=var.x
+                    temp_y_data=var.y
+                    temp_data=var.data
+                    filtered_data = np.zeros((len(x_dataset),len(temp_y_data)))
+                    for i in range(len(x_dataset)):
+                        for j in range(len(temp_x_data)):
+                            if x_dataset[i] == temp_x_data[j] or abs(x_dataset[i]-temp_x_data[j]) < 0.5:
+                                filtered_data[i,:]=temp_data[j,:]
+                    var.data = filtered_data
+                    idx+=1
+        return x_dataset, tmax, filteringFlag
+
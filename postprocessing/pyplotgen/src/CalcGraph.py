@@ -0,0 +1,264 @@
+"""
+:date: October 2026
+
+Shared evaluation of calc functions and their inputs.
+Many calc functions of a case need the same netcdf variables (e.g. W2 is used by the wp2 calcs of VariableGroupBase,
+VariableGroupSamProfiles and by several SAM budget calcs), and every call to getVarForCalculations() rebuilds,
+trims and time-averages the variable again. A CaseGallerySetup therefore owns one CalcGraph, through which all of
+its VariableGroups evaluate calc functions and their getVarForCalculations() inputs, so that each input
+(and each declared calc function) is only evaluated once per dataset.
+
+Calc functions declare their inputs with the calcInputs decorator:
+
+.. code-block:: python
+
+    @calcInputs('TWBUOY', 'TWPRES')
+    def getTwBuoyPlusPres(self, dataset_override=None):
+        ...
+
+Inputs are either netcdf variable names (or lists of alternative names, as passed to getVarForCalculations())
+or other calc functions. Together, the declarations form a directed acyclic graph in which
+calc functions that are inputs of another calc function are evaluated before it.
+While a declared calc function is evaluated, every variable it reads is checked against its declared variable
+inputs, so the declarations cannot drift away from the function bodies unnoticed.
+"""
+from src.Profiler import CATEGORY_CALC, getProfiler
+
+
+def calcInputs(*inputs):
+    """
+    Decorator declaring the inputs of a calc function.
+    By declaring its inputs, a calc function also declares that its result only depends on the given datasets
+    and on the time and height settings of its VariableGroup, so its result can be shared between all
+    VariableGroups of a case.
+
+    :param inputs: Variable names, lists of alternative variable names, or calc functions defined earlier
+    :return: The decorator, which returns the calc function itself with the ``calc_inputs`` attribute set
+    """
+    def decorator(calc_function):
+        calc_function.calc_inputs = inputs
+        return calc_function
+    return decorator
+
+
+def evaluateCalc(calc_function, datasets):
+    """
+    Calls a calc function, sharing its result through the CalcGraph of its VariableGroup if there is one
+
+    :param calc_function: A calc function bound to a VariableGroup
+    :param datasets: A netCDF4 Dataset object or dict of such, passed as dataset_override
+    :return: The (dependent_data, independent_data) tuple returned by the calc function
+    """
+    calc_graph = getattr(getattr(calc_function, '__self__', None), 'calc_graph', None)
+    with getProfiler().measure(CATEGORY_CALC, calc_function.__qualname__):
+        if calc_graph is None:
+            return calc_function(dataset_override=datasets)
+        return calc_graph.evaluate(calc_function, datasets)
+
+
+class CalcGraph:
+    """
+    Per-case memo of calc function results and getVarForCalculations() inputs.
+    Entries are keyed by the evaluated variable or function, the identity of the datasets and the settings
+    of the VariableGroup that affect the result (see __getSettingsKey__()).
+
+    Results are shared between all callers, so every caller gets its own copy of the cached arrays.
+    The graph references the datasets of its entries, so it must be cleared once the datasets of the case
+    are released.
+
+    For information on the input parameters of this class, please see the documentation for the
+    ``__init__()`` method.
+    """
+
+    def __init__(self):
+        """
+        Creates an empty graph
+        """
+        # Maps key -> (datasets, result). The datasets are kept so their ids cannot be reused while the entry exists.
+        self.__entries = {}
+        # Stack of (calc function, declared variable inputs or None) of the calc functions being evaluated
+        self.__evaluating = []
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def getInput(self, variable_group, varname, datasets, conversion_factor, read_function):
+        """
+        Returns the result of getVarForCalculations() for a variable, reading it only on the first request
+
+        :param variable_group: The VariableGroup requesting the variable
+        :param varname: Variable name or list of alternative variable names
+        :param datasets: A netCDF4 Dataset object or dict of such
+        :param conversion_factor: Conversion factor applied to the variable
+        :param read_function: Function taking (varname, datasets, conversion_factor) that reads the variable
+        :return: Copy of the (dependent_data, independent_data, datasets) tuple returned by read_function
+        """
+        if len(self.__evaluating) > 0:
+            calc_function, declared_inputs = self.__evaluating[-1]
+            if declared_inputs is not None and self.__getVarnameKey__(varname) not in declared_inputs:
+                raise ValueError("Calc function {} reads {}, which is not declared in its calcInputs".format(
+                    calc_function.__qualname__, varname))
+        varname_key = tuple(varname) if isinstance(varname, list) else varname
+        key = ('input', varname_key, conversion_factor, self.__getDatasetsKey__(datasets),
+               self.__getSettingsKey__(variable_group))
+        return self.__getOrCompute__(key, datasets, lambda: read_function(varname, datasets, conversion_factor))
+
+    def evaluate(self, calc_function, datasets):
+        """
+        Returns the result of a calc function for the given datasets.
+        Calc functions without declared inputs (see calcInputs()) are always called, but still share
+        their getVarForCalculations() inputs through this graph. Declared calc functions are only called
+        the first time, after the calc functions they depend on have been evaluated, and may only read
+        their declared variable inputs.
+
+        :param calc_function: A calc function bound to a VariableGroup
+        :param datasets: A netCDF4 Dataset object or dict of such, passed as dataset_override
+        :return: Copy of the (dependent_data, independent_data) tuple returned by the calc function
+        """
+        if not hasattr(calc_function, 'calc_inputs'):
+            return self.__callCalc__(calc_function, datasets)
+        variable_group = calc_function.__self__
+        result = None
+        for function in self.getEvaluationOrder(calc_function.__func__):
+            bound_function = function.__get__(variable_group)
+            key = ('calc', function, self.__getDatasetsKey__(datasets), self.__getSettingsKey__(variable_group))
+            result = self.__getOrCompute__(key, datasets, lambda: self.__callCalc__(bound_function, datasets))
+        return result
+
+    @staticmethod
+    def getEvaluationOrder(calc_function):
+        """
+        Returns the declared calc functions the given calc function depends on, in an order in which
+        every calc function comes after all of its inputs
+
+        :param calc_function: An unbound calc function
+        :return: List of unbound calc functions, ending with calc_function itself
+        """
+        order = []
+        visiting = []
+
+        def visit(function):
+            if function in order:
+                return
+            if function in visiting:
+                raise ValueError("Calc function {} depends on itself".format(function.__qualname__))
+            visiting.append(function)
+            for calc_input in getattr(function, 'calc_inputs', ()):
+                if callable(calc_input):
+                    visit(calc_input)
+            visiting.remove(function)
+            order.append(function)
+
+        visit(calc_function)
+        return order
+
+    @staticmethod
+    def getDeclaredVariables(calc_function):
+        """
+        Returns the variable inputs declared for a calc function, i.e. its calc_inputs except other calc functions
+
+        :param calc_function: A calc function, bound or unbound
+        :return: Set of variable names, with lists of alternative names converted to tuples,
+            or None if the calc function has no declared inputs
+        """
+        if not hasattr(calc_function, 'calc_inputs'):
+            return None
+        return set(CalcGraph.__getVarnameKey__(calc_input) for calc_input in calc_function.calc_inputs
+                   if not callable(calc_input))
+
+    def clear(self):
+        """
+        Drops all entries
+
+        :return: None
+        """
+        self.__entries.clear()
+
+    def __callCalc__(self, calc_function, datasets):
+        """
+        Calls a calc function, checking the variables it reads against its declared inputs if it has any.
+        The variables read by calc functions it calls itself are checked against the inputs of those.
+
+        :param calc_function: A calc function bound to a VariableGroup
+        :param datasets: A netCDF4 Dataset object or dict of such, passed as dataset_override
+        :return: The (dependent_data, independent_data) tuple returned by the calc function
+        """
+        self.__evaluating.append((calc_function, self.getDeclaredVariables(calc_function)))
+        try:
+            return calc_function(dataset_override=datasets)
+        finally:
+            self.__evaluating.pop()
+
+    def __getOrCompute__(self, key, datasets, compute_function):
+        """
+        Returns a copy of the cached result for key, computing and caching it first if needed
+
+        :param key: Hashable key of the result
+        :param datasets: Datasets the result was computed from
+        :param compute_function: Function without arguments computing the result
+        :return: Copy of the result
+        """
+        if key in self.__entries:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.__entries[key] = (datasets, compute_function())
+        return self.__copyResult__(self.__entries[key][1])
+
+    @staticmethod
+    def __getVarnameKey__(varname):
+        """
+        Returns a hashable key for a variable name, so that 'RHO' and ['RHO'] are the same input
+
+        :param varname: Variable name or list of alternative variable names
+        :return: Tuple of variable names
+        """
+        if isinstance(varname, (list, tuple)):
+            return tuple(varname)
+        return (varname,)
+
+    @staticmethod
+    def __getDatasetsKey__(datasets):
+        """
+        Returns a key identifying a Dataset or a collection of Datasets
+
+        :param datasets: A netCDF4 Dataset object, dict or list of such
+        :return: Tuple of dataset ids
+        """
+        if isinstance(datasets, dict):
+            datasets = datasets.values()
+        elif not isinstance(datasets, (list, tuple)):
+            datasets = [datasets]
+        return tuple(id(dataset) for dataset in datasets)
+
+    @staticmethod
+    def __getSettingsKey__(variable_group):
+        """
+        Returns the settings of a VariableGroup that are used when reading variables for calculations
+
+        :param variable_group: A VariableGroup object
+        :return: Tuple of settings
+        """
+        return (variable_group.time_height, variable_group.animation is not None, variable_group.start_time,
+                variable_group.end_time, variable_group.height_min_value, variable_group.height_max_value)
+
+    @staticmethod
+    def __copyResult__(result):
+        """
+        Copies the arrays of a result, so callers can modify them without changing the cached result.
+        Other objects, e.g. datasets, are not copied.
+
+        :param result: Value returned by a calc function or getVarForCalculations()
+        :return: Copy of the result
+        """
+        if isinstance(result, tuple):
+            return tuple(CalcGraph.__copyResult__(element) for element in result)
+        if isinstance(result, list):
+            return [CalcGraph.__copyResult__(element) for element in result]
+        if isinstance(result, dict):
+            return {key: CalcGraph.__copyResult__(value) for key, value in result.items()}
+        if hasattr(result, 'copy') and hasattr(result, 'dtype'):
+            return result.copy()
+        return result
@@ -12,9 +12,13 @@ from config.VariableGroupBaseBudgetsLumpedBuoy import VariableGroupBaseBudgetsLu
 from config.VariableGroupSamBudgets import VariableGroupSamBudgets
 from config.VariableGroupSubcolumns import VariableGroupSubcolumns
 from config.VariableGroupSamProfiles import VariableGroupSamProfiles
+from src.CalcGraph import CalcGraph
 from src.DataReader import DataReader
 from src.Panel import Panel
-from src.OutputHandler import logToFile, logToFileAndConsole, updateProgress
+from src.PanelDataCache import PanelDataCache
+from src.PanelPlotJob import PanelPlotJob
+from src.Profiler import CATEGORY_VARIABLE_GROUP, getProfiler
+from src.OutputHandler import logToFile, logToFileAndConsole
 
 
 class CaseGallerySetup:
@@ -28,11 +32,16 @@ class CaseGallerySetup:
     For information on the input parameters of this class, please see the documentation for the
     ``__init__()`` method.
     """
+    # VariableGroups that may be created for a case in addition to the ones listed in its 'var_groups'
+    ADDITIONAL_VARIABLE_GROUPS = [VariableGroupBaseBudgets, VariableGroupBaseBudgetsLumpedBuoy,
+                                  VariableGroupBaseBudgetsSamStyle, VariableGroupSamBudgets, VariableGroupSubcolumns,
+                                  VariableGroupSamProfiles]
 
     def __init__(self, case_definition, clubb_folders=[], diff_datasets=None, sam_folders=[""], wrf_folders=[""],
                  plot_les=False, plot_budgets=False, lumped_buoy_budgets=False, background_rcm=False, plot_r408=False,
                  plot_hoc=False, e3sm_folders=[], cam_folders=[], time_height=False, animation=None, samstyle=False,
-                 plot_subcolumns=False, image_extension=".png", total_panels_to_plot=0, priority_vars=False):
+                 plot_subcolumns=False, image_extension=".png", total_panels_to_plot=0, priority_vars=False,
+                 cache_folder=None, lazy=False):
         """
         Initialize a CaseGallerySetup object with the passed parameters
         :param case_definition: dict containing case specific elements. These are pulled in from Case_definitions.py,
@@ -56,7 +65,14 @@ class CaseGallerySetup:
         :param cam_folders: List of foldernames containing cam netcdf files to be plotted
         :param time_height: TODO
         :param animation: TODO
+        :param cache_folder: Folder for the persistent panel data cache (see PanelDataCache).
+            If None (default), all panels are generated from the netcdf files.
+        :param lazy: If True, the VariableGroups only create LazyPanels, and the data of a panel is read
+            when its plot job is resolved (see getPlotJobs()). Incremental runs then read no data for panels
+            whose output is up to date. Lazy mode is not used together with the panel data cache,
+            which avoids reading unchanged data on its own, or with difference plots.
         """
+        self.case_definition = case_definition
         self.name = case_definition['name']
         self.start_time = case_definition['start_time']
         self.end_time = case_definition['end_time']
@@ -88,8 +104,16 @@ class CaseGallerySetup:
         self.wrf_benchmark_file = None
         self.r408_datasets = None
         self.hoc_datasets = None
+        self.sam_datasets = None
+        self.wrf_datasets = None
+        self.e3sm_datasets = None
+        self.cam_file = None
+        self.background_rcm_folder = None
         self.image_extension = image_extension
         self.priority_vars = priority_vars
+        # All model files of this case are opened through this reader, which holds them in the shared dataset cache
+        # until the panels have been generated
+        self.data_reader = DataReader()
 
         self.VALID_MODEL_NAMES = ['clubb', 'clubb_hoc','clubb_r408', 'e3sm', 'sam', 'cam', 'wrf', 'coamps']
 
@@ -97,6 +121,38 @@ class CaseGallerySetup:
             self.plot_budgets = False
             self.lumped_buoy_budgets = False
 
+        # Options that change which panels and lines are generated, used in the panel data cache keys
+        self.panel_options = {'plot_les': self.plot_les, 'plot_budgets': self.plot_budgets,
+                              'lumped_buoy_budgets': self.lumped_buoy_budgets, 'background_rcm': self.background_rcm,
+                              'plot_r408': self.plot_r408, 'plot_hoc': self.plot_hoc, 'time_height': self.time_height,
+                              'animation': self.animation, 'samstyle': self.sam_style_budgets,
+                              'plot_subcolumns': self.plot_subcolumns, 'priority_vars': self.priority_vars}
+        self.panel_data_cache = None
+        if cache_folder is not None:
+            if diff_datasets is None:
+                self.panel_data_cache = PanelDataCache(cache_folder)
+            else:
+                logToFile("Warning: The panel data cache is not used for difference plots (--diff).")
+        self.lazy = lazy and self.panel_data_cache is None and diff_datasets is None
+        # Only used to build the definition keys of lazy panels
+        self.panel_keys = PanelDataCache(None)
+        # Shares calc functions and their inputs between the VariableGroups of this case
+        self.calc_graph = CalcGraph()
+
+        # If the panels of the whole case are cached, no netcdf file has to be opened
+        case_cache_key = None
+        if self.panel_data_cache is not None:
+            case_cache_key = self.panel_data_cache.getKey(
+                'case', case_definition, self.panel_options, self.ADDITIONAL_VARIABLE_GROUPS,
+                self.__getInputFingerprints__(case_definition, clubb_folders, sam_folders, wrf_folders, e3sm_folders,
+                                              cam_folders))
+            cached_panels = self.panel_data_cache.get(case_cache_key)
+            if cached_panels is not None:
+                logToFile("\tLoaded {} panels from the panel data cache".format(len(cached_panels)))
+                self.panels = cached_panels
+                self.total_panels_to_plot = len(self.panels)
+                return
+
         # Load benchmark files
         if self.plot_les:
             self.sam_benchmark_file = self.__loadModelFiles__(None,case_definition,"sam")
@@ -119,6 +175,7 @@ class CaseGallerySetup:
             self.background_rcm_folder = clubb_folders[0]
         else:
             self.background_rcm_folder = None
+        self.__computeBackgroundRcm__()
 
         # Call generateSubcolumnPanels twice, once for CLUBB and once for WRF,
         # since the WRF-LASSO cases may also have subcolumn output to plot
@@ -130,6 +187,50 @@ class CaseGallerySetup:
 
         self.total_panels_to_plot = total_panels
 
+        if case_cache_key is not None:
+            self.panel_data_cache.put(case_cache_key, self.panels)
+
+        # The panels hold copies of all data they need, so the datasets can be handed back to the shared cache
+        # where they stay open for other cases using the same files (e.g. benchmark files).
+        # Lazy panels still need the datasets until their plot jobs are resolved.
+        if not self.lazy:
+            self.data_reader.cleanup()
+            self.calc_graph.clear()
+
+
+    def __computeBackgroundRcm__(self):
+        """
+        Computes the time-averaged rcm profile (and the heights and indices belonging to it)
+        shown behind the CLUBB profiles if background_rcm is enabled.
+        It is computed once per case and shared by all VariableGroups and their panels.
+
+        :return: None
+        """
+        # Set the relevant "output" variables to a value just to have them set.
+        # They will be flagged out of interacting with the code.
+        self.bkgrnd_rcm_tavg = 0
+        self.altitude_bkgrnd_rcm = 0
+        self.start_alt_idx = 0
+        self.end_alt_idx = 0
+        if not self.background_rcm or self.clubb_datasets is None or len(self.clubb_datasets) == 0:
+            return
+        # Extract rcm from the zt NetCDF file. Also extract the time and height values to which the
+        # rcm data points correspond.
+        zt_dataset = self.clubb_datasets[self.background_rcm_folder]['zt']
+        bkgrnd_rcm = np.squeeze(zt_dataset.variables['rcm'])
+        self.altitude_bkgrnd_rcm = np.squeeze(zt_dataset.variables['altitude'])
+        time_bkgrnd_rcm = np.squeeze(zt_dataset.variables['time'])
+        # Find the indices in the rcm data that correspond to the start time and end time requested as the
+        # time-averaging interval for the case, as well as the minimum height and maximum height requested
+        # for the plots. self.start_time and self.end_time are in minutes, while time_bkgrnd_rcm is in seconds.
+        start_time_idx, end_time_idx = DataReader.__getStartEndIndex__(time_bkgrnd_rcm, 60.0 * self.start_time,
+                                                                       60.0 * self.end_time)
+        self.start_alt_idx, self.end_alt_idx = DataReader.__getStartEndIndex__(self.altitude_bkgrnd_rcm,
+                                                                               self.height_min_value,
+                                                                               self.height_max_value)
+        # Time-averaged vertical profile of rcm for use as contours in the background of plots
+        # of CLUBB time-averaged vertical profiles of various model fields.
+        self.bkgrnd_rcm_tavg = np.mean(bkgrnd_rcm[start_time_idx:end_time_idx], axis=0, dtype=np.float64)
 
     def __generateSubcolumnPanels__(self,silhs_datasets):
         """
@@ -146,9 +247,8 @@ class CaseGallerySetup:
                     folder_name = os.path.basename(input_folder)
                     subcols_defined_for_this_folder = "subcolumns" in silhs_datasets[input_folder]
                     if input_folder in silhs_datasets.keys() and subcols_defined_for_this_folder:
-                        subcolumn_variables = VariableGroupSubcolumns(self,
-                                                    clubb_datasets={folder_name:silhs_datasets[input_folder]})
-                        self.panels.extend(subcolumn_variables.panels)
+                        self.panels.extend(self.__getVariableGroupPanels__(VariableGroupSubcolumns,
+                                                    clubb_datasets={folder_name:silhs_datasets[input_folder]}))
                     else:
                         logToFile("" + folder_name + " does not seem to contain data for case" + self.name)
 
@@ -170,15 +270,13 @@ class CaseGallerySetup:
                     if input_folder in self.clubb_datasets.keys():
                         if not self.sam_style_budgets:
                             if not self.lumped_buoy_budgets:
-                                budget_variables = VariableGroupBaseBudgets(self, priority_vars=self.priority_vars,
-                                                             clubb_datasets={folder_name:self.clubb_datasets[input_folder]})
+                                BudgetGroup = VariableGroupBaseBudgets
                             else:
-                                budget_variables = VariableGroupBaseBudgetsLumpedBuoy(self, priority_vars=self.priority_vars,
-                                                             clubb_datasets={folder_name:self.clubb_datasets[input_folder]})
+                                BudgetGroup = VariableGroupBaseBudgetsLumpedBuoy
                         else:
-                            budget_variables = VariableGroupBaseBudgetsSamStyle(self, priority_vars=self.priority_vars,
-                                                         clubb_datasets={folder_name:self.clubb_datasets[input_folder]})
-                        self.panels.extend(budget_variables.panels)
+                            BudgetGroup = VariableGroupBaseBudgetsSamStyle
+                        self.panels.extend(self.__getVariableGroupPanels__(BudgetGroup, priority_vars=self.priority_vars,
+                                                    clubb_datasets={folder_name:self.clubb_datasets[input_folder]}))
                     else:
                         logToFile("" + folder_name + " does not seem to contain data for case" + self.name)
             if self.wrf_datasets is not None and len(self.wrf_datasets) != 0:
@@ -186,23 +284,23 @@ class CaseGallerySetup:
                 #     budget_variables = VariableGroupBaseBudgets(self, wrf_datasets=folders_datasets)
                 for input_folder in self.wrf_datasets:
                     folder_name = os.path.basename(input_folder)
-                    budget_variables = VariableGroupBaseBudgets(self, priority_vars=self.priority_vars,
-                                                                wrf_datasets={folder_name:self.wrf_datasets[input_folder]})
-                    self.panels.extend(budget_variables.panels)
+                    self.panels.extend(self.__getVariableGroupPanels__(VariableGroupBaseBudgets,
+                                                    priority_vars=self.priority_vars,
+                                                    wrf_datasets={folder_name:self.wrf_datasets[input_folder]}))
             if self.e3sm_datasets is not None and len(self.e3sm_datasets) != 0:
                 for dataset_name in self.e3sm_datasets:
                     # E3SM dataset must be wrapped in the same form as the clubb datasets
-                    e3sm_budgets = VariableGroupBaseBudgets(self, priority_vars=self.priority_vars,
-                                                            e3sm_datasets={dataset_name: self.e3sm_datasets[dataset_name]})
-                    self.panels.extend(e3sm_budgets.panels)
+                    self.panels.extend(self.__getVariableGroupPanels__(VariableGroupBaseBudgets,
+                                                    priority_vars=self.priority_vars,
+                                                    e3sm_datasets={dataset_name: self.e3sm_datasets[dataset_name]}))
             if self.sam_datasets is not None and len(self.sam_datasets) != 0:
                 # for dataset in sam_datasets.values():
                 for input_folder in self.sam_datasets:
                     folder_name = os.path.basename(input_folder)
-                    budget_variables = VariableGroupSamBudgets(self, priority_vars=self.priority_vars,
-                                                               sam_datasets={folder_name:self.sam_datasets[input_folder]})
                 # sam_budgets = VariableGroupSamBudgets(self, sam_datasets=sam_datasets)
-                    self.panels.extend(budget_variables.panels)
+                    self.panels.extend(self.__getVariableGroupPanels__(VariableGroupSamBudgets,
+                                                    priority_vars=self.priority_vars,
+                                                    sam_datasets={folder_name:self.sam_datasets[input_folder]}))
 
 
     def __generateDiffPanels__(self):
@@ -242,49 +340,120 @@ class CaseGallerySetup:
         # Loop over the VariableGroup classes listed in the 'var_groups' entry
         for VarGroup in self.var_groups:
             # Calls the __init__ function of the VarGroup class and, by doing this, create an instance of it
-            temp_group = VarGroup(self, clubb_datasets=self.clubb_datasets, sam_benchmark_dataset=self.sam_benchmark_file,
-                                  coamps_benchmark_dataset=self.coamps_benchmark_file, 
+            self.panels.extend(self.__getVariableGroupPanels__(VarGroup, clubb_datasets=self.clubb_datasets,
+                                  sam_benchmark_dataset=self.sam_benchmark_file,
+                                  coamps_benchmark_dataset=self.coamps_benchmark_file,
                                   wrf_benchmark_dataset=self.wrf_benchmark_file,
                                   sam_datasets=self.sam_datasets,
                                   wrf_datasets=self.wrf_datasets, r408_dataset=self.r408_datasets, hoc_dataset=self.hoc_datasets,
                                   e3sm_datasets=self.e3sm_datasets, cam_datasets=self.cam_file, priority_vars=self.priority_vars,
-                                  background_rcm=self.background_rcm, background_rcm_folder=self.background_rcm_folder)
-            self.panels.extend(temp_group.panels)
+                                  background_rcm=self.background_rcm, background_rcm_folder=self.background_rcm_folder))
 
         if self.sam_datasets is not None and len(self.sam_datasets) != 0:
-            temp_group=VariableGroupSamProfiles(self,sam_datasets=self.sam_datasets,priority_vars=self.priority_vars)
-            self.panels.extend(temp_group.panels)
+            self.panels.extend(self.__getVariableGroupPanels__(VariableGroupSamProfiles, sam_datasets=self.sam_datasets,
+                                                               priority_vars=self.priority_vars))
 
         total_panels = len(self.panels)
         return total_panels
 
 
-    def __loadModelFiles__(self, folders, case_definition, model_name):
+    def __getVariableGroupPanels__(self, VarGroup, **group_kwargs):
+        """
+        Creates an instance of VarGroup for this case and returns its panels.
+        If the panel data cache is enabled, the panels are loaded from the cache instead if neither the
+        datasets passed to the group, nor the case definition, options or the source code of the group changed.
+
+        :param VarGroup: The VariableGroup class to create
+        :param group_kwargs: Keyword arguments passed on to the VarGroup constructor
+        :return: List of Panel objects
+        """
+        # The other VariableGroups of the case do not affect this group, so changing one of them must not
+        # invalidate the cached panels of this one
+        case_settings = {key: value for key, value in self.case_definition.items() if key != 'var_groups'}
+        if self.lazy:
+            group_key = self.panel_keys.getKey('group', VarGroup, case_settings, self.panel_options, group_kwargs)
+            panels = self.__createVariableGroupPanels__(VarGroup, **group_kwargs)
+            for panel in panels:
+                panel.definition_key = self.panel_keys.getKey(group_key, panel.variable_index)
+            return panels
+        if self.panel_data_cache is None:
+            return self.__createVariableGroupPanels__(VarGroup, **group_kwargs)
+        cache_key = self.panel_data_cache.getKey('group', VarGroup, case_settings, self.panel_options, group_kwargs)
+        panels = self.panel_data_cache.get(cache_key)
+        if panels is None:
+            panels = self.__createVariableGroupPanels__(VarGroup, **group_kwargs)
+            self.panel_data_cache.put(cache_key, panels)
+        else:
+            logToFile("\tLoaded {} panels of {} from the panel data cache".format(len(panels), VarGroup.__name__))
+        return panels
+
+    def __createVariableGroupPanels__(self, VarGroup, **group_kwargs):
+        """
+        Creates an instance of VarGroup for this case and returns its panels
+
+        :param VarGroup: The VariableGroup class to create
+        :param group_kwargs: Keyword arguments passed on to the VarGroup constructor
+        :return: List of Panel objects
+        """
+        with getProfiler().measure(CATEGORY_VARIABLE_GROUP, VarGroup.__name__):
+            return VarGroup(self, **group_kwargs).panels
+
+    def __getInputFingerprints__(self, case_definition, clubb_folders, sam_folders, wrf_folders, e3sm_folders,
+                                 cam_folders):
+        """
+        Returns the fingerprints (see PanelDataCache.getFileFingerprint) of all netcdf files that are loaded
+        for this case, without opening any of them.
+
+        :return: List of fingerprint strings
+        """
+        model_folders = [(None, "sam"), (None, "coamps"), (None, "wrf"), (None, "clubb_r408"), (None, "clubb_hoc"),
+                         (clubb_folders, "clubb"), (sam_folders, "sam"), (wrf_folders, "wrf"),
+                         (e3sm_folders, "e3sm"), (cam_folders, "cam")]
+        fingerprints = []
+        for folders, model_name in model_folders:
+            for dataset_key, type_ext, filename in self.__getModelFilenames__(folders, case_definition, model_name):
+                fingerprints.append(PanelDataCache.getFileFingerprint(filename))
+        return fingerprints
+
+    def __getModelFilenames__(self, folders, case_definition, model_name):
+        """
+        Returns the names of the netcdf files of a model for this case.
+        If folders is None, the benchmark files of the model are returned.
+
+        :param folders: List of input folders or None for benchmark files
+        :param case_definition: dict containing case specific elements (see Case_definitions.py)
+        :param model_name: Name of the model, must be one of self.VALID_MODEL_NAMES
+        :return: List of tuples (dataset key, type extension, filename). The dataset key is the input folder
+            (or the key of the benchmark file), the type extension is e.g. 'zm' and None for benchmark files.
+        """
         if model_name not in self.VALID_MODEL_NAMES:
             raise ValueError("Model name " + model_name + " is not a valid model name. Valid model names are: " +
                              str(self.VALID_MODEL_NAMES))
-        datareader = DataReader()
-
-        # Load clubb nc files
-        model_datasets = {}
+        model_filenames = []
         if folders is not None and len(folders) != 0 and case_definition[model_name +'_file'] is not None:
             for foldername in folders:
-                files_in_folder = {}
                 filenames = case_definition[model_name +'_file']
                 for type_ext in filenames:
-                    filepath = foldername + filenames[type_ext]
-                    ncdf_file = datareader.__loadNcFile__(filepath)
-                    if ncdf_file is not None:
-                        files_in_folder[type_ext] = ncdf_file
-                        model_datasets[foldername] = files_in_folder
+                    model_filenames.append((foldername, type_ext, foldername + filenames[type_ext]))
         # If is a benchmark
         elif folders is None and case_definition[model_name +'_benchmark_file'] is not None:
             filename_dict = case_definition[model_name +'_benchmark_file']
             for key in filename_dict:
-                filename = filename_dict[key]
-                ncdf_file = datareader.__loadNcFile__(filename)
-                if ncdf_file is not None:
-                    model_datasets[key] = ncdf_file
+                model_filenames.append((key, None, filename_dict[key]))
+        return model_filenames
+
+    def __loadModelFiles__(self, folders, case_definition, model_name):
+        datareader = self.data_reader
+
+        # Load clubb nc files
+        model_datasets = {}
+        for dataset_key, type_ext, filename in self.__getModelFilenames__(folders, case_definition, model_name):
+            ncdf_file = datareader.__loadNcFile__(filename)
+            if ncdf_file is not None:
+                if type_ext is None:
+                    model_datasets[dataset_key] = ncdf_file
+                else:
+                    model_datasets.setdefault(dataset_key, {})[type_ext] = ncdf_file
 
         if len(model_datasets) == 0:
             model_datasets = None
@@ -347,11 +516,19 @@ class CaseGallerySetup:
         # Return absolute difference between both arrays
         return np.abs(long-short)
 
-    def plot(self, output_folder, replace_images=False, no_legends=False, thin_lines=False,
-             show_alphabetic_id=False, total_progress_counter=[0,0]):
+    def getPlotJobs(self, output_folder, replace_images=False, no_legends=False, thin_lines=False,
+                    show_alphabetic_id=False, incremental=False, stream_movies=False, max_movie_frames=None,
+                    movie_frame_interval=None, average_movie_frames=False, extra_image_extensions=(),
+                    thumbnail_width=None):
         """
-        Plot all panels associated with the case, these will be saved to image files in the <<output>>/<<casename>>
-        folder
+        Creates a picklable PanelPlotJob for every panel of this case.
+        The jobs contain everything needed to render the panels, so they can be handed to other processes
+        and rendered in any order. Alphabetic IDs and filename timestamps are assigned here in panel order,
+        so the output does not depend on the order in which the jobs are run.
+        In lazy mode, the jobs are resolved here (see PanelPlotJob.resolve()), which reads the data of all
+        panels that have to be plotted. Since this happens after the IDs have been assigned, the alphabetic IDs
+        skip the variables for which no data was found.
+        The jobs are run by PyPlotGen, which schedules the panels of all cases on one process pool.
 
         :param output_folder: Absolute name of the folder to save output into.
         :param replace_images: If True, pyplotgen will overwrite images with the same name.
@@ -370,48 +547,55 @@ class CaseGallerySetup:
             and although pyplotgen won't crash it may start to use weird characters.
             The rotation resets between each case,
             e.g. if one case ends on label (ad), the next case will start on (a).
-        :param total_progress_counter: a variable shared between processes that tracks the total
-            number to panels to be plotted as well as the total number plotted so far.  Used
-            to give user some sense of total progress.
-        :return: None
+        :param incremental: If True, the filenames are based on the position of the panels instead of the current
+            time, and panels whose output file is up to date are not plotted again (see PanelPlotJob).
+        :param stream_movies: If True, animations are rendered in memory and piped to the movie encoder
+            (see AnimationPanel.streamMovie())
+        :param max_movie_frames: Maximum number of frames of each animation, or None to use every time step
+        :param movie_frame_interval: Minimum number of simulated minutes between two frames of an animation, or None
+        :param average_movie_frames: If True, the frames of decimated animations show time averages
+            instead of single time steps (see AnimationPanel.__decimateTimeSteps__())
+        :param extra_image_extensions: Further formats every panel is saved to besides self.image_extension,
+            e.g. ('.svg', '.pdf'). Each panel is only plotted once (see Panel.saveFigure()).
+        :param thumbnail_width: If given, panels create the gallery thumbnails of their png images while plotting
+        :return: List of PanelPlotJob objects in panel order
         """
-        # add total_panels_to_plot to first slot of shared variable counter
-        with total_progress_counter.get_lock():
-            total_progress_counter[0] += self.total_panels_to_plot
-
-        logToFile("\tSaving panels to {} images".format(self.image_extension))
+        plot_jobs = []
         num_plots = len(self.panels)
-        curr_panel_num = 1
-        for panel in self.panels:
-            logToFile("\tPlotting {} of {}: {}".format(curr_panel_num,num_plots,panel.title))
+        if incremental:
+            timestamps = PanelPlotJob.getPositionStamps(num_plots)
+        else:
+            timestamps = PanelPlotJob.getTimestamps(num_plots)
+        for panel_idx, panel in enumerate(self.panels):
             if show_alphabetic_id:
                 alphabetic_id = self.__getNextAlphabeticID__()
             else:
                 alphabetic_id = ""
             plot_paired_lines = True
-            if panel.panel_type == panel.TYPE_BUDGET or panel.panel_type == panel.TYPE_SUBCOLUMN:
+            if panel.panel_type == Panel.TYPE_BUDGET or panel.panel_type == Panel.TYPE_SUBCOLUMN:
                 plot_paired_lines = False
+            plot_options = {'replace_images': replace_images, 'no_legends': no_legends, 'thin_lines': thin_lines,
+                            'alphabetic_id': alphabetic_id, 'paired_plots': plot_paired_lines,
+                            'image_extension': self.image_extension}
             if self.animation is not None:
-                movie_extension="."+self.animation
-                filteringFlag = panel.plot(output_folder, self.name, replace_images=replace_images,
-                                           no_legends=no_legends, thin_lines=thin_lines,
-                                           alphabetic_id=alphabetic_id, paired_plots=plot_paired_lines,
-                                           image_extension=self.image_extension, movie_extension=movie_extension)
+                plot_options['movie_extension'] = "." + self.animation
+                plot_options['stream_movie'] = stream_movies
+                plot_options['max_frames'] = max_movie_frames
+                plot_options['frame_interval'] = movie_frame_interval
+                plot_options['average_frames'] = average_movie_frames
             else:
-                panel.plot(output_folder, self.name, replace_images=replace_images, no_legends=no_legends,
-                           thin_lines=thin_lines, alphabetic_id=alphabetic_id, paired_plots=plot_paired_lines,
-                           image_extension=self.image_extension)
-            curr_panel_num += 1
-
-            # increment by 1 for each plotted panel
-            with total_progress_counter.get_lock():
-                total_progress_counter[1] += 1
-
-            updateProgress(total_progress_counter,self.image_extension,self.animation)
-
-        if self.animation and filteringFlag:
-            logToFile('Time slices have been filtered from some {} simulations '.format(self.name.upper()) +
-                      'due to mismatched time stepping.')
+                # Only added if used, so incremental runs without these options keep their plot options
+                if len(extra_image_extensions) > 0:
+                    plot_options['extra_image_extensions'] = tuple(extra_image_extensions)
+                if thumbnail_width is not None:
+                    plot_options['thumbnail_width'] = thumbnail_width
+            plot_jobs.append(PanelPlotJob(panel, self.name, output_folder, timestamps[panel_idx], plot_options,
+                                          panel_number=panel_idx + 1, num_panels=num_plots, incremental=incremental))
+        if self.lazy:
+            plot_jobs = [plot_job for plot_job in plot_jobs if plot_job.resolve()]
+            self.data_reader.cleanup()
+            self.calc_graph.clear()
+        return plot_jobs
 
     def __getNextAlphabeticID__(self):
         """
@@ -49,8 +49,18 @@ class ContourPanel(Panel):
         """
         super().__init__(plots, panel_type, title, dependent_title, sci_scale=None, centered=False)
 
+    def getFilename(self, timestamp):
+        """
+        Returns the name of the image file for a contour of this panel, without folder and file extension.
+
+        :param timestamp: String identifying the time (or position) at which the panel was plotted
+        :return: Filename string
+        """
+        return self.__removeInvalidFilenameChars__("timeheight_"+ timestamp + "_" + self.title)
+
     def plot(self, output_folder, casename, replace_images = False, no_legends = True, thin_lines = False,
-             alphabetic_id = '', paired_plots = True, image_extension=".png"):
+             alphabetic_id = '', paired_plots = True, image_extension=".png", timestamp=None,
+             extra_image_extensions=(), thumbnail_width=None):
         """
         Generate a single contourf plot from the given data
 
@@ -58,6 +68,11 @@ class ContourPanel(Panel):
         :param casename: The name of the case that is plotted in this panel
         :param replace_images: Switch to tell pyplotgen if existing files should be overwritten
         :param alphabetic_id: A string printed into the Panel at coordinates (.9,.9) as an identifier.
+        :param timestamp: String used in the image filename to order the panels in the gallery.
+            If None (default), the current time is used.
+        :param extra_image_extensions: Further formats the contours are saved to, see Panel.saveFigure()
+        :param thumbnail_width: If given, the gallery thumbnails of png images are created as well,
+            see Panel.saveFigure()
         :return: None
         """
         # Suppress deprecation warnings
@@ -76,7 +91,7 @@ class ContourPanel(Panel):
         plt.rc('figure', titlesize=Style_definitions.TITLE_TEXT_SIZE)  # fontsize of the figure title
 
         # For each Contour object stored in self.all_plots generate an individual contourf plot
-        for var in self.all_plots:
+        for contour_idx, var in enumerate(self.all_plots):
             x_data = var.x
             y_data = var.y
             c_data = var.data
@@ -114,12 +129,17 @@ class ContourPanel(Panel):
                 pass # do nothing
 
             # Generate image filename
-            filename = "timeheight_"+ str(datetime.now())+ "_" + self.title
-
-            filename = self.__removeInvalidFilenameChars__(filename)
+            if timestamp is None:
+                filename = self.getFilename(str(datetime.now()))
+            elif len(self.all_plots) > 1:
+                # Keep the filenames of several contours in this panel unique and in order
+                filename = self.getFilename(timestamp + "_" + str(contour_idx))
+            else:
+                filename = self.getFilename(timestamp)
             # Concatenate with output foldername
             relative_filename = output_folder + '/' + casename + '/' + filename
             relative_filename = clean_path(relative_filename)
             # Save image file
-            plt.savefig(relative_filename+image_extension)
+            self.saveFigure(plt.gcf(), relative_filename, image_extension,
+                            extra_image_extensions=extra_image_extensions, thumbnail_width=thumbnail_width)
             plt.close()
@@ -4,6 +4,7 @@
 """
 import os
 import pathlib as pathlib
+from collections import OrderedDict
 from collections.abc import Iterable
 from os import path
 
@@ -11,7 +12,10 @@ import numpy as np
 from netCDF4 import Dataset
 
 from config import Case_definitions
+from src.CalcGraph import evaluateCalc
+from src.DatasetCache import getSharedArrayCache, getSharedDatasetCache
 from src.OutputHandler import logToFile, logToFileAndConsole
+from src.Profiler import getProfiler
 
 class NetCdfVariable:
     """
@@ -256,7 +260,7 @@ class NetCdfVariable:
                 dependent_data, independent_data = data_reader.getVarData(self.ncdf_data, self)
             # if it's not a string, then it's a function
             else:
-                dependent_data, independent_data = varname_element(dataset_override=all_datasets)
+                dependent_data, independent_data = evaluateCalc(varname_element, all_datasets)
 
             # When plotting subcolumns, dependent_data can be multidimentional. This accounts for that.
             if np.any(np.isnan(dependent_data)):
@@ -297,6 +301,10 @@ class DataReader():
     :author: Nicolas Strike
     :date: January 2019
     """
+    # Maximum number of remembered __getStartEndIndex__() lookups
+    MAX_CACHED_INDEX_LOOKUPS = 256
+    # Maps (id(data), start_value, end_value) -> (data, (start_idx, end_idx)) for read-only data arrays
+    __start_end_index_cache = OrderedDict()
 
     def __init__(self):
         """
@@ -305,6 +313,8 @@ class DataReader():
         """
         self.nc_filenames = {}
         self.nc_datasets = {}
+        # Datasets this reader acquired from the shared dataset cache, released again in cleanup()
+        self.acquired_datasets = []
         self.root_dir = pathlib.Path(__file__).parent
         self.panels_dir = self.root_dir.as_uri() + "/cases/panels/"
 
@@ -312,22 +322,16 @@ class DataReader():
         """
         This is the cleanup method. This is called on the instance's destruction
         to deallocate resources that may be held (e.g. dataset files).
+        Datasets are handed back to the shared dataset cache instead of being closed,
+        so other readers in this process can reuse them.
 
         :return: None
         :author: Nicolas Strike
         """
-        # self.nc_datasets is a 3-level dictionary with the following key levels:
-        # 1. case
-        # 2. folder
-        # 3. filetype
-        # So in order to close the Dataset objects we need to cycle through all three levels
-        for case in self.nc_datasets:
-            casedict = self.nc_datasets[case]
-            for folder in casedict:
-                folderdict = casedict[folder]
-                for filetype in folderdict:
-                    dataset = folderdict[filetype]
-                    dataset.close()
+        dataset_cache = getSharedDatasetCache()
+        for dataset in self.acquired_datasets:
+            dataset_cache.release(dataset)
+        self.acquired_datasets = []
 
     def loadFolder(self, folder_path, ignore_git=True):
         """
@@ -376,6 +380,8 @@ class DataReader():
         """
         Given a Dataset and NetCdfVariable object, this function returns the numerical
         dependent_data and independent_data for the given variable.
+        The dependent_data is always an array of its own that the caller may modify, while the independent_data
+        may be read-only arrays shared through the array cache.
 
         TODO: Split up reading and averaging into different functions
             since time-height plots do not need averaging
@@ -392,10 +398,12 @@ class DataReader():
         independent_var_name = ncdf_variable.independent_var_name
         time_conv_factor = 1
         time_values = None
+        time_var_name = None
 
         # Get time dimension from netcdf_dataset
         for time_var in Case_definitions.TIME_VAR_NAMES:
             if time_var in netcdf_dataset.variables.keys():
+                time_var_name = time_var
                 time_values = self.__getValuesFromNc__(netcdf_dataset, time_var, time_conv_factor)
                 # np.savetxt("time.csv", time_values, delimiter=',', fmt='%f') # occasionally used when debugging
 
@@ -443,9 +451,16 @@ class DataReader():
             # occasionally used when debugging
             # np.savetxt("" + independent_var_name + ".csv", independent_values,  delimiter=',', fmt='%f')
 
+        # Only read the averaging window from disk if the variable is averaged over its leading time axis
+        time_slice = None
+        if avg_axis == 0 and start_avg_idx < end_avg_idx \
+                and self.__hasLeadingTimeAxis__(netcdf_dataset, variable_name, time_var_name):
+            time_slice = slice(start_avg_idx, end_avg_idx)
+
         # Try and get dependent_data from nc file
         try:
-            dependent_values = self.__getValuesFromNc__(netcdf_dataset, variable_name, conv_factor)
+            dependent_values = self.__getValuesFromNc__(netcdf_dataset, variable_name, conv_factor,
+                                                        time_slice=time_slice)
             # occasionally used when debugging
             # np.savetxt("" + variable_name + ".csv", dependent_values,  delimiter=',', fmt='%f')
         except ValueError:
@@ -460,10 +475,18 @@ class DataReader():
 
         # If dependent_data is more than 1-dimensional, average over avg_axis if needed
         if dependent_values.ndim > 1 and avg_axis in [0,1]:  # not ncdf_variable.one_dimensional:
+            if time_slice is not None:
+                # The values only contain the averaging window
+                start_avg_idx, end_avg_idx = 0, end_avg_idx - start_avg_idx
             dependent_values = self.__averageData__(dependent_values, start_avg_idx, end_avg_idx, avg_axis=avg_axis)
         # SAM data may contain NaNs at this point. Change those to 0
         if 'SAM version' in netcdf_dataset.ncattrs():
             dependent_values = np.where(np.isnan(dependent_values), 0, dependent_values)
+        # Arrays that were not averaged may still be the read-only arrays of the shared array cache.
+        # Callers modify the dependent data in place (e.g. adding subgrid fluxes), so they get their own copy.
+        # The independent data is only sliced and stays shared.
+        if not dependent_values.flags.writeable:
+            dependent_values = dependent_values.copy()
 
         return dependent_values, independent_values
 
@@ -490,20 +513,24 @@ class DataReader():
 
     def __loadNcFile__(self, filename):
         """
-        Load the given NetCDF file
+        Load the given NetCDF file.
+        Files are opened through the process-wide dataset cache, so a file that was already opened
+        (and not modified since) by any DataReader in this process is not opened again.
 
         :param filename: The netcdf file to be loaded
         :return: A netCDF4 Dataset object containing the data from the given file
         """
         dataset = None
         if path.exists(filename):
-            dataset = Dataset(filename, "r", format="NETCDF4")
+            dataset = getSharedDatasetCache().acquire(filename)
+            self.acquired_datasets.append(dataset)
         else:
             logToFile("Failed to find file " + filename)
 
         return dataset
 
-    def __averageData__(self, var, idx_t0=0, idx_t1=-1, idx_z0=0, idx_z1=-1, avg_axis=0):
+    @staticmethod
+    def __averageData__(var, idx_t0=0, idx_t1=-1, idx_z0=0, idx_z1=-1, avg_axis=0, log_short_intervals=True):
         """
         Averages 2d data with one time and one height dimension and returns the averaged data
 
@@ -517,13 +544,15 @@ class DataReader():
         :param idx_z1: Index corresponding to the highest model height of the averaging interval
         :param avg_axis: If 0, the data will be averaged over axis 0, the time axis;
             If 1, the data will be averaged over axis 1, the height axis
+        :param log_short_intervals: If True (default), a note is written to the log file if the
+            time averaging interval is small. Callers that average many short intervals on purpose can disable this.
         :return: 1d data, averaged over the interval [idx_t0:idx_t1] or [idx_z0:idx_z1],
             depending on the averaging axis
         """
         if avg_axis not in [0,1]:
             raise ValueError('An invalid value for avg_axis was specified. '+
                              'Only 0 (time) and 1 (height) are valid values.')
-        if idx_t1 - idx_t0 <= 10:
+        if log_short_intervals and idx_t1 - idx_t0 <= 10:
             logToFile("Time averaging interval is small (less than or equal to 10): " + str(idx_t1 - idx_t0) +
                  " | (idx_t0 = " + str(idx_t0) + ", idx_t1 = " + str(
                 idx_t1) + "). Note, start index is inclusive, end index is exclusive.")
@@ -624,19 +653,39 @@ class DataReader():
                     return axis_title
         return axis_title
 
-    def __getValuesFromNc__(self, ncdf_data, varname, conversion):
+    def __getValuesFromNc__(self, ncdf_data, varname, conversion, time_slice=None):
         """
-        Get dependent_data values out of a netcdf object, returning them as an array
+        Get dependent_data values out of a netcdf object, returning them as an array.
+        Decoded arrays are kept in the process-wide array cache, so repeated requests for the same variable
+        and conversion factor from the same dataset do not read the file again.
+        The returned array is shared with other callers and read-only.
+
+        If time_slice is given, only that hyperslab of the leading time axis is read from disk.
+        The time axis is kept even if the slice has length 1, so the result is the same as slicing
+        the fully read (squeezed) variable. Use __hasLeadingTimeAxis__ to check if a variable can be sliced.
 
         :param ncdf_data: Netcdf file object
         :param varname: Variable name string
         :param conversion: Conversion factor
+        :param time_slice: Optional slice object selecting a window of the leading time axis
         :return: Data array of the specified variable, scaled by conversion factor
         """
         if ncdf_data is None:
             raise ValueError("ncdf_data was passed as None into __getValuesFromNc__ while looking for variable " +
                              varname)
 
+        array_cache = getSharedArrayCache()
+        region = None
+        if time_slice is not None:
+            region = (time_slice.start, time_slice.stop)
+            # A cached copy of the whole variable is cheaper to slice than reading the window again
+            full_values = array_cache.get(ncdf_data, varname, conversion)
+            if full_values is not None:
+                return full_values[time_slice]
+        cached_values = array_cache.get(ncdf_data, varname, conversion, region=region)
+        if cached_values is not None:
+            return cached_values
+
         # TODO this model detection method is old and can no longer be trusted
         src_model = self.guessNcdfSourceModel(ncdf_data)
         if src_model == 'unknown-model':
@@ -647,7 +696,12 @@ class DataReader():
         keys = ncdf_data.variables.keys()
         if varname in keys:
             var_values = ncdf_data.variables[varname]
-            var_values = np.squeeze(var_values)
+            if time_slice is None:
+                var_values = np.squeeze(var_values)
+            else:
+                singleton_axes = tuple(axis for axis, length in enumerate(var_values.shape) if length == 1)
+                var_values = np.squeeze(np.asarray(var_values[time_slice]), axis=singleton_axes)
+            getProfiler().addBytesRead(np.asarray(var_values).nbytes)
             # Check if data comes from SAM and convert -9999 values to NaN
             if 'SAM version' in ncdf_data.ncattrs():
                 var_values = np.where(np.isclose(var_values, -9999), np.nan, var_values)
@@ -680,10 +734,9 @@ class DataReader():
             if len(var_values) > 1:
                 delta_t = var_values[1] - var_values[0]
 
-            # In a lot of cases this loop has no effect, but for some cases (e.g. r408 lines on atex case)
+            # In a lot of cases this has no effect, but for some cases (e.g. r408 lines on atex case)
             # it corrects time data.
-            for i in range(len(var_values)):
-                var_values[i] = delta_t * (i + 1)
+            var_values[:] = delta_t * np.arange(1, len(var_values) + 1)
 
             # Fix for mismatched lengths of data in the COAMPS RICO case.  The CLUBB and SAM RICO
             # cases have 4320 minutes (3 days), but the COAMPS RICO case has only the third day (1440 minutes).
@@ -697,8 +750,30 @@ class DataReader():
                 logToFile("First time value is " + str(var_values[0]) +
                      " instead of 0-1. Are these time values supposed to be scaled to minutes?")
 
+        if isinstance(var_values, np.ndarray):
+            array_cache.put(ncdf_data, varname, conversion, var_values, region=region)
         return var_values
 
+    @staticmethod
+    def __hasLeadingTimeAxis__(ncdf_data, varname, time_varname):
+        """
+        Checks if a variable can be read in time windows by __getValuesFromNc__, i.e. if its first dimension
+        is the time dimension and it still has more than one non-singleton dimension after squeezing.
+        Variables that squeeze down to a 1d time series are not averaged by getVarData and must be read whole.
+
+        :param ncdf_data: Netcdf file object
+        :param varname: Variable name string
+        :param time_varname: Name of the time variable found in ncdf_data
+        :return: True if the variable has a leading time axis followed by other non-singleton axes
+        """
+        if varname not in ncdf_data.variables.keys():
+            return False
+        variable = ncdf_data.variables[varname]
+        time_dimensions = ncdf_data.variables[time_varname].dimensions
+        if variable.ndim < 2 or len(time_dimensions) != 1 or variable.dimensions[0] != time_dimensions[0]:
+            return False
+        return variable.shape[0] > 1 and any(length > 1 for length in variable.shape[1:])
+
     @staticmethod
     def __getStartEndIndex__(data, start_value, end_value):
         """
@@ -710,6 +785,9 @@ class DataReader():
         The data array MUST be presorted and start_value <= end_value for pyplotgen to work correctly!
         If neither are found, returns 0 and array size - 1.
 
+        The indices are found by binary search. Lookups on read-only arrays (i.e. arrays coming from the
+        shared array cache) are remembered, so repeated lookups on the same array are free.
+
         :param data: Array of numerical values. Must be presorted!
         :param start_value: The first value to be graphed (may return indexes to values smaller than this)
         :param end_value: The last value that needs to be graphed (may return indexes to values larger than this)
@@ -721,10 +799,6 @@ class DataReader():
         if (len(data) == 1):
             return 0, 1
 
-        start_idx = 0
-        end_idx = len(data)
-        ascending_data = data[0] < data[1]
-
         # Check that the 'data' array includes start_value and end_value (ie nc data includes all desired pts).
         # Start_value == 0 means a time-series plot, in which case we want to plot everything, so pass.
         # I rounded the last data[-1] becuase COAMPS sometimes has funny time numbers and this helps with that.
@@ -734,6 +808,83 @@ class DataReader():
             logToFile("Error: The input data does not contain all or part of the specified time or height data." +
                       " Check Case_definitions.py.")
 
+        # Only arrays that cannot change anymore are safe to remember lookups for
+        cacheable = isinstance(data, np.ndarray) and not data.flags.writeable
+        cache_key = (id(data), start_value, end_value)
+        if cacheable and cache_key in DataReader.__start_end_index_cache:
+            cached_data, indices = DataReader.__start_end_index_cache[cache_key]
+            if cached_data is data:
+                return indices
+
+        indices = DataReader.__searchStartEndIndex__(np.asarray(data), start_value, end_value)
+
+        if cacheable:
+            DataReader.__start_end_index_cache[cache_key] = (data, indices)
+            if len(DataReader.__start_end_index_cache) > DataReader.MAX_CACHED_INDEX_LOOKUPS:
+                DataReader.__start_end_index_cache.popitem(last=False)
+        return indices
+
+    @staticmethod
+    def __searchStartEndIndex__(data, start_value, end_value):
+        """
+        Binary search implementation of __getStartEndIndex__().
+        Descending data is handled by searching the negated array.
+        Arrays that are not sorted in the direction given by their first two values are passed
+        to __scanStartEndIndex__() instead.
+
+        :param data: numpy array of numerical values with at least 2 elements
+        :param start_value: The first value to be graphed
+        :param end_value: The last value that needs to be graphed
+        :return: (tuple) start_idx, end_idx
+        """
+        ascending_data = data[0] < data[1]
+        with np.errstate(invalid='ignore'):
+            steps = np.diff(data)
+            sorted_data = np.all(steps >= 0) if ascending_data else np.all(steps <= 0)
+        if not sorted_data:
+            return DataReader.__scanStartEndIndex__(data, start_value, end_value)
+
+        if ascending_data:
+            sorted_values, lower_value, upper_value = data, start_value, end_value
+        else:
+            # Searching the negated array turns the descending search into an ascending one
+            # where the roles of start_value and end_value are swapped
+            sorted_values, lower_value, upper_value = -data.astype(float), -end_value, -start_value
+
+        # Start index: first value >= lower_value, or 0 if there is none
+        start_idx = int(np.searchsorted(sorted_values, lower_value, side='left'))
+        if start_idx == len(sorted_values):
+            start_idx = 0
+
+        # End index: one past the last value == upper_value if upper_value is in the data.
+        # Otherwise the first value > upper_value, unless that value is the largest one in the data,
+        # in which case the entire rest of the array is included.
+        end_idx = int(np.searchsorted(sorted_values, upper_value, side='right'))
+        upper_value_found = end_idx > 0 and sorted_values[end_idx - 1] == upper_value
+        if not upper_value_found and not (end_idx < len(sorted_values) and sorted_values[end_idx] < sorted_values[-1]):
+            end_idx = len(sorted_values)
+        # If all values are > upper_value, the original scan compared against data[-1] again after
+        # setting end_idx to 0 and moved the end index to 1. Keep that behavior.
+        if end_idx == 0 and sorted_values[1] < sorted_values[-1]:
+            end_idx = 1
+
+        return start_idx, end_idx
+
+    @staticmethod
+    def __scanStartEndIndex__(data, start_value, end_value):
+        """
+        Linear scan implementation of __getStartEndIndex__().
+        This is only used for arrays that are not sorted, where the binary search is not defined.
+
+        :param data: Array of numerical values with at least 2 elements
+        :param start_value: The first value to be graphed
+        :param end_value: The last value that needs to be graphed
+        :return: (tuple) start_idx, end_idx
+        """
+        start_idx = 0
+        end_idx = len(data)
+        ascending_data = data[0] < data[1]
+
         start_idx_found = False
         if ascending_data:
             # dependent_data is ascending
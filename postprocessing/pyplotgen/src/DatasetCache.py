@@ -0,0 +1,257 @@
+"""
+:date: October 2026
+
+Process-wide caches for NetCDF input.
+Every DataReader in a process goes through the same DatasetCache instance, so a file that is used by
+several cases (e.g. a SAM or COAMPS benchmark file) or by several readers is only opened
+and parsed once per process.
+The ArrayCache holds decoded variable arrays (or time windows of them), so a variable that is needed by
+several panels, budgets or calc functions is only read, squeezed and scaled once.
+"""
+import os
+from collections import OrderedDict
+
+from netCDF4 import Dataset
+
+from src.OutputHandler import logToFile
+
+# Maximum number of datasets kept open at once. Datasets that are still referenced are never closed,
+# so this limit can be exceeded temporarily if more files than this are in use at the same time.
+MAX_OPEN_DATASETS = 64
+
+# Memory budget (in bytes) for decoded variable arrays held by the ArrayCache of each process
+MAX_CACHED_ARRAY_BYTES = 512 * 1024 ** 2
+
+
+class DatasetCache:
+    """
+    Reference-counted cache of netCDF4 Dataset objects, keyed by absolute file path and modification time.
+
+    Datasets are handed out with acquire() and handed back with release().
+    A released dataset stays open so it can be reused by the next acquire() of the same file.
+    Once more than max_open datasets are open, the least recently used datasets that are not referenced
+    anymore are closed.
+
+    For information on the input parameters of this class, please see the documentation for the
+    ``__init__()`` method.
+    """
+
+    def __init__(self, max_open=MAX_OPEN_DATASETS):
+        """
+        Create a new, empty dataset cache
+
+        :param max_open: Maximum number of open dataset handles before unreferenced datasets are closed
+        """
+        self.max_open = max_open
+        # Maps (abs_path, mtime) -> [Dataset, reference count]. Ordered from least to most recently used.
+        self.__entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @staticmethod
+    def getKey(filename):
+        """
+        Returns the key under which the given file is cached
+
+        :param filename: Path to a netcdf file
+        :return: Tuple (absolute path, modification time in ns)
+        """
+        abs_filename = os.path.abspath(filename)
+        return abs_filename, os.stat(abs_filename).st_mtime_ns
+
+    def acquire(self, filename):
+        """
+        Returns an open Dataset for the given file and increments its reference count.
+        The file is only opened if it is not in the cache yet or if it has been modified since it was opened.
+
+        :param filename: Path to an existing netcdf file
+        :return: A netCDF4 Dataset object containing the data from the given file
+        """
+        key = self.getKey(filename)
+        if key in self.__entries:
+            self.__entries.move_to_end(key)
+            entry = self.__entries[key]
+            entry[1] += 1
+        else:
+            self.__closeStaleEntries__(key[0])
+            entry = [Dataset(key[0], "r", format="NETCDF4"), 1]
+            self.__entries[key] = entry
+            self.__evict__()
+        return entry[0]
+
+    def release(self, dataset):
+        """
+        Decrements the reference count of a dataset that was returned by acquire().
+        The dataset is not closed here. It is kept open for reuse until it gets evicted.
+
+        :param dataset: A Dataset object returned by acquire()
+        :return: None
+        """
+        for key, entry in self.__entries.items():
+            if entry[0] is dataset:
+                entry[1] = max(entry[1] - 1, 0)
+                break
+        self.__evict__()
+
+    def clear(self):
+        """
+        Closes every dataset in the cache regardless of its reference count.
+
+        :return: None
+        """
+        for entry in self.__entries.values():
+            self.__closeDataset__(entry[0])
+        self.__entries.clear()
+
+    def __closeStaleEntries__(self, abs_filename):
+        """
+        Closes datasets of the given file that were opened before the file was last modified,
+        as long as they are not referenced anymore.
+
+        :param abs_filename: Absolute path of the file
+        :return: None
+        """
+        stale_keys = [key for key, entry in self.__entries.items() if key[0] == abs_filename and entry[1] == 0]
+        for key in stale_keys:
+            self.__closeDataset__(self.__entries.pop(key)[0])
+
+    def __evict__(self):
+        """
+        Closes the least recently used unreferenced datasets until at most self.max_open datasets are open.
+
+        :return: None
+        """
+        excess = len(self.__entries) - self.max_open
+        if excess <= 0:
+            return
+        unused_keys = [key for key, entry in self.__entries.items() if entry[1] == 0]
+        for key in unused_keys[:excess]:
+            logToFile("Closing cached dataset " + key[0])
+            self.__closeDataset__(self.__entries.pop(key)[0])
+
+    @staticmethod
+    def __closeDataset__(dataset):
+        """
+        Closes a dataset, ignoring datasets that have already been closed elsewhere.
+        Arrays cached for the dataset are dropped as well.
+
+        :param dataset: A netCDF4 Dataset object
+        :return: None
+        """
+        getSharedArrayCache().discard(dataset)
+        if dataset.isopen():
+            dataset.close()
+
+
+class ArrayCache:
+    """
+    Memory-bounded cache of decoded variable arrays, keyed by (dataset, variable name, conversion factor, region).
+    The region is None for whole variables and a (start, stop) tuple for arrays that only hold a slice
+    of the leading time axis.
+
+    Cached arrays are shared between all callers and are therefore marked read-only.
+    Code that needs to modify an array it got from the cache must work on a copy.
+    Once the cached arrays take up more than max_bytes, the least recently used arrays are dropped.
+
+    For information on the input parameters of this class, please see the documentation for the
+    ``__init__()`` method.
+    """
+
+    def __init__(self, max_bytes=MAX_CACHED_ARRAY_BYTES):
+        """
+        Create a new, empty array cache
+
+        :param max_bytes: Memory budget in bytes for all arrays held by this cache
+        """
+        self.max_bytes = max_bytes
+        self.cached_bytes = 0
+        # Maps (id(dataset), varname, conversion, region) -> (Dataset, array).
+        # Ordered from least to most recently used.
+        # The Dataset is kept in the entry so its id cannot be reused by another object while the entry exists.
+        self.__entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, dataset, varname, conversion, region=None):
+        """
+        Returns the cached array for a variable or None if it is not cached
+
+        :param dataset: The netCDF4 Dataset object the variable was read from
+        :param varname: Variable name string
+        :param conversion: Conversion factor that was applied to the variable
+        :param region: (start, stop) tuple of the time slice that was read, or None for the whole variable
+        :return: Read-only data array or None
+        """
+        key = (id(dataset), varname, conversion, region)
+        entry = self.__entries.get(key)
+        if entry is None or entry[0] is not dataset:
+            return None
+        self.__entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, dataset, varname, conversion, values, region=None):
+        """
+        Stores a decoded variable array. The array is marked read-only.
+        Arrays larger than the whole memory budget are not cached.
+
+        :param dataset: The netCDF4 Dataset object the variable was read from
+        :param varname: Variable name string
+        :param conversion: Conversion factor that was applied to the variable
+        :param values: numpy array holding the decoded variable
+        :param region: (start, stop) tuple of the time slice that was read, or None for the whole variable
+        :return: None
+        """
+        if values.nbytes > self.max_bytes:
+            return
+        key = (id(dataset), varname, conversion, region)
+        if key in self.__entries:
+            self.cached_bytes -= self.__entries.pop(key)[1].nbytes
+        values.flags.writeable = False
+        self.__entries[key] = (dataset, values)
+        self.cached_bytes += values.nbytes
+        while self.cached_bytes > self.max_bytes:
+            self.cached_bytes -= self.__entries.popitem(last=False)[1][1].nbytes
+
+    def discard(self, dataset):
+        """
+        Drops all arrays that were read from the given dataset
+
+        :param dataset: A netCDF4 Dataset object
+        :return: None
+        """
+        dataset_keys = [key for key, entry in self.__entries.items() if entry[0] is dataset]
+        for key in dataset_keys:
+            self.cached_bytes -= self.__entries.pop(key)[1].nbytes
+
+    def clear(self):
+        """
+        Drops all cached arrays
+
+        :return: None
+        """
+        self.__entries.clear()
+        self.cached_bytes = 0
+
+
+__shared_cache = DatasetCache()
+__shared_array_cache = ArrayCache()
+
+
+def getSharedDatasetCache():
+    """
+    Returns the DatasetCache instance shared by all DataReaders of this process.
+
+    :return: The process-wide DatasetCache
+    """
+    return __shared_cache
+
+
+def getSharedArrayCache():
+    """
+    Returns the ArrayCache instance shared by all DataReaders of this process.
+
+    :return: The process-wide ArrayCache
+    """
+    return __shared_array_cache
@@ -0,0 +1,51 @@
+"""
+:date: October 2026
+
+A LazyPanel stands in for the panel of a single variable definition of a VariableGroup that was created in
+lazy mode. It knows everything about the panel that can be determined without reading any data,
+and only reads the data of its variable (through the VariableGroup) when materialize() is called.
+This way, panels that are skipped because their output is up to date never touch the netcdf files.
+"""
+
+
+class LazyPanel:
+    """
+    Deferred panel of one variable definition.
+    LazyPanels refer to their VariableGroup and thereby to open netcdf datasets, so they cannot be pickled
+    and must be materialized in the process that created them.
+
+    For information on the input parameters of this class, please see the documentation for the
+    ``__init__()`` method.
+    """
+
+    def __init__(self, variable_group, variable_def_dict, variable_index, panel_type):
+        """
+        Creates a deferred panel
+
+        :param variable_group: The VariableGroup object that defines the variable
+        :param variable_def_dict: The definition of the variable, see VariableGroup.addVariable()
+        :param variable_index: Position of the definition in variable_group.variable_definitions
+        :param panel_type: Type of the panel that will be created, one of the Panel.TYPE_* strings
+        """
+        self.variable_group = variable_group
+        self.variable_def_dict = variable_def_dict
+        self.variable_index = variable_index
+        self.panel_type = panel_type
+        # Identifies the definition of this panel and all inputs it depends on. Set by CaseGallerySetup.
+        self.definition_key = None
+
+    def materialize(self):
+        """
+        Reads the data of the variable and creates the actual panel
+
+        :return: The Panel (or Panel subclass) object, or None if there is no data for the variable
+        """
+        return self.variable_group.materializeVariable(self.variable_def_dict)
+
+    def __getstate__(self):
+        """
+        Prevents pickling, see the class documentation
+
+        :return: Does not return
+        """
+        raise TypeError("LazyPanel objects must be materialized before they are pickled")
@@ -0,0 +1,194 @@
+"""
+:date: October 2026
+
+Writes movies from frames that are held in memory.
+Instead of saving every frame as an image and stitching the images together afterwards,
+frames are handed to the encoder one at a time as RGB arrays. If ffmpeg is installed, the frames are piped to
+an ffmpeg process as raw video. Otherwise, they are written with OpenCV's VideoWriter.
+Either way, no temporary files are written.
+
+Movies that were written in several segments (e.g. by different processes) can be joined with concatenate().
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+
+try:
+    import cv2  #opencv-python for writing the movies
+except ImportError:
+    cv2 = None
+
+BACKEND_FFMPEG = 'ffmpeg'
+BACKEND_OPENCV = 'opencv'
+
+# ffmpeg arguments selecting the codec for each supported movie extension
+FFMPEG_CODEC_ARGS = {'.mp4': ['-vcodec', 'libx264', '-pix_fmt', 'yuv420p'],
+                     '.avi': ['-vcodec', 'mpeg4', '-vtag', 'XVID']}
+# OpenCV fourcc codes for each supported movie extension
+OPENCV_FOURCC_CODES = {'.mp4': 'mp4v', '.avi': 'XVID'}
+
+
+class MovieEncoder:
+    """
+    Encodes RGB frames into a movie file without writing intermediate images.
+    The encoder is started when the first frame is written, since the frame size is only known then.
+    All frames must have the size of the first frame.
+
+    Can be used as a context manager, which closes the encoder on exit.
+
+    For information on the input parameters of this class, please see the documentation for the
+    ``__init__()`` method.
+    """
+
+    def __init__(self, filename, movie_extension, frames_per_second, backend=None):
+        """
+        Creates an encoder for a movie file
+
+        :param filename: Name of the movie file, including the extension
+        :param movie_extension: One of the keys of FFMPEG_CODEC_ARGS, e.g. '.mp4'
+        :param frames_per_second: Frame rate of the movie
+        :param backend: BACKEND_FFMPEG or BACKEND_OPENCV. Defaults to the result of getAvailableBackend().
+        """
+        if movie_extension not in FFMPEG_CODEC_ARGS:
+            raise ValueError("Unsupported movie extension " + movie_extension)
+        if backend is None:
+            backend = self.getAvailableBackend()
+        if backend is None:
+            raise RuntimeError("Writing movies requires either ffmpeg or opencv-python (cv2) to be installed.")
+        self.filename = filename
+        self.movie_extension = movie_extension
+        self.frames_per_second = frames_per_second
+        self.backend = backend
+        self.frame_size = None
+        self.num_frames = 0
+        self.__process = None
+        self.__writer = None
+
+    @staticmethod
+    def getAvailableBackend():
+        """
+        Returns the preferred backend that is installed
+
+        :return: BACKEND_FFMPEG, BACKEND_OPENCV or None if neither is available
+        """
+        if shutil.which('ffmpeg') is not None:
+            return BACKEND_FFMPEG
+        if cv2 is not None:
+            return BACKEND_OPENCV
+        return None
+
+    @staticmethod
+    def concatenate(segment_filenames, filename, movie_extension, frames_per_second, backend=None):
+        """
+        Joins movie segments written by MovieEncoders with the same frame size and frame rate into one movie.
+        With ffmpeg, the encoded streams are copied without being decoded, so the movie is identical
+        to the segments. OpenCV cannot copy encoded streams, so with OpenCV the frames of the segments are
+        decoded and encoded again.
+
+        :param segment_filenames: Names of the segment files, in playing order
+        :param filename: Name of the joined movie file, including the extension
+        :param movie_extension: One of the keys of FFMPEG_CODEC_ARGS, e.g. '.mp4'
+        :param frames_per_second: Frame rate of the segments
+        :param backend: BACKEND_FFMPEG or BACKEND_OPENCV. Defaults to the result of getAvailableBackend().
+        :return: None
+        """
+        if len(segment_filenames) == 0:
+            raise ValueError("There are no movie segments to join into " + filename)
+        if len(segment_filenames) == 1:
+            os.replace(segment_filenames[0], filename)
+            return
+        if backend is None:
+            backend = MovieEncoder.getAvailableBackend()
+        if backend == BACKEND_FFMPEG:
+            # The concat demuxer reads the segments from a list file
+            with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as list_file:
+                for segment_filename in segment_filenames:
+                    list_file.write("file '{}'\n".format(os.path.abspath(segment_filename).replace("'", "'\\''")))
+            try:
+                subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0',
+                                '-i', list_file.name, '-c', 'copy', filename], check=True)
+            finally:
+                os.remove(list_file.name)
+        else:
+            with MovieEncoder(filename, movie_extension, frames_per_second, backend=backend) as encoder:
+                for segment_filename in segment_filenames:
+                    capture = cv2.VideoCapture(segment_filename)
+                    if not capture.isOpened():
+                        raise RuntimeError("OpenCV could not open the movie segment " + segment_filename)
+                    success, frame = capture.read()
+                    while success:
+                        encoder.write(frame[:, :, ::-1])
+                        success, frame = capture.read()
+                    capture.release()
+        for segment_filename in segment_filenames:
+            os.remove(segment_filename)
+
+    def write(self, frame):
+        """
+        Appends a frame to the movie
+
+        :param frame: uint8 array of shape (height, width, 3) holding the RGB values of the frame
+        :return: None
+        """
+        height, width = frame.shape[:2]
+        if self.frame_size is None:
+            self.__start__(width, height)
+        elif (width, height) != self.frame_size:
+            raise ValueError("Frame {} has size {}x{}, but the movie has size {}x{}".format(
+                self.num_frames, width, height, *self.frame_size))
+        if self.backend == BACKEND_FFMPEG:
+            self.__process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        else:
+            self.__writer.write(np.ascontiguousarray(frame[:, :, ::-1]))
+        self.num_frames += 1
+
+    def close(self):
+        """
+        Finishes the movie file
+
+        :return: None
+        """
+        if self.__process is not None:
+            self.__process.stdin.close()
+            return_code = self.__process.wait()
+            self.__process = None
+            if return_code != 0:
+                raise RuntimeError("ffmpeg failed with exit code {} while writing {}".format(return_code,
+                                                                                             self.filename))
+        if self.__writer is not None:
+            self.__writer.release()
+            self.__writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __start__(self, width, height):
+        """
+        Starts the encoder for frames of the given size
+
+        :param width: Frame width in pixels
+        :param height: Frame height in pixels
+        :return: None
+        """
+        self.frame_size = (width, height)
+        if self.backend == BACKEND_FFMPEG:
+            # yuv420p requires even frame dimensions, so the last row/column is dropped if necessary
+            command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+                       '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '{}x{}'.format(width, height),
+                       '-r', str(self.frames_per_second), '-i', '-',
+                       '-vf', 'crop=trunc(iw/2)*2:trunc(ih/2)*2'] + \
+                      FFMPEG_CODEC_ARGS[self.movie_extension] + [self.filename]
+            self.__process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*OPENCV_FOURCC_CODES[self.movie_extension])
+            self.__writer = cv2.VideoWriter(self.filename, fourcc, self.frames_per_second, self.frame_size)
+            if not self.__writer.isOpened():
+                self.__writer = None
+                raise RuntimeError("OpenCV could not open {} for writing with the {} codec".format(
+                    self.filename, OPENCV_FOURCC_CODES[self.movie_extension]))
@@ -10,10 +10,16 @@ from textwrap import fill
 import matplotlib.pyplot as plt
 import numpy as np
 from cycler import cycler
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
 
 from config import Style_definitions
 from src.interoperability import clean_path, clean_title
 
+# Name of the folder inside each case folder holding the thumbnails shown in the gallery
+THUMBNAIL_FOLDER = '.thumbnails'
+
 class Panel:
     """
     Represents an individual panel/graph. Each panel contains a number of details
@@ -31,6 +37,9 @@ class Panel:
 
     VALID_PANEL_TYPES = [TYPE_PROFILE, TYPE_BUDGET, TYPE_TIMESERIES, TYPE_TIMEHEIGHT, TYPE_ANIMATION, TYPE_SUBCOLUMN]
 
+    # Figure reused by all panels plotted in the same process (see __getFigure__)
+    __shared_figure = None
+
     def __init__(self, plots, bkgrnd_rcm_tavg, altitude_bkgrnd_rcm, start_alt_idx, end_alt_idx,
                  panel_type="profile", title="Unnamed panel", dependent_title="dependent variable", sci_scale = None,
                  centered = False, background_rcm = False):
@@ -92,7 +101,8 @@ class Panel:
                              '. Valid options are: ' + str(Panel.VALID_PANEL_TYPES))
 
     def plot(self, output_folder, casename, replace_images = False, no_legends = True, thin_lines = False,
-             alphabetic_id="", paired_plots = True, image_extension=".png"):
+             alphabetic_id="", paired_plots = True, image_extension=".png", timestamp=None,
+             extra_image_extensions=(), thumbnail_width=None):
         """
         Saves a single panel/graph as image to the output directory specified by the pyplotgen launch parameters
 
@@ -104,33 +114,18 @@ class Panel:
         :param alphabetic_id: A string printed into the Panel at coordinates (.9,.9) as an identifier.
         :paired_plots: If no format is specified and paired_plots is True,
             use the color/style rotation specified in Style_definitions.py
+        :param timestamp: String used in the image filename to order the panels in the gallery.
+            If None (default), the current time is used.
+        :param extra_image_extensions: Further formats (e.g. ('.svg', '.pdf')) the panel is saved to,
+            see saveFigure()
+        :param thumbnail_width: If given, the gallery thumbnail of a png image is created as well, see saveFigure()
         :return: None
         Warning! Argument `replace_images` is unused here!
         """
-        # Suppress deprecation warnings
-        with warnings.catch_warnings():
-            # Create new figure and axis
-            warnings.simplefilter("ignore")
-            plt.subplot(111)
-
-        # Set line color/style. This will cycle through all colors,
-        # then once colors run out use a new style and cycle through
-        # colors again
-        default_cycler = (
-                cycler(linestyle=Style_definitions.STYLE_ROTATION) * cycler(color=Style_definitions.COLOR_ROTATION))
-        plt.rc('axes', prop_cycle=default_cycler)
-
-        # Set graph size
-        plt.figure(figsize=Style_definitions.FIGSIZE)
-
-        # Set font sizes
-        plt.rc('font', size=Style_definitions.DEFAULT_TEXT_SIZE)          # controls default text sizes
-        plt.rc('axes', titlesize=Style_definitions.AXES_TITLE_FONT_SIZE)     # fontsize of the axes title
-        plt.rc('axes', labelsize=Style_definitions.AXES_LABEL_FONT_SIZE)    # fontsize of the x and y labels
-        plt.rc('xtick', labelsize=Style_definitions.X_TICKMARK_FONT_SIZE)    # fontsize of the tick labels
-        plt.rc('ytick', labelsize=Style_definitions.Y_TICKMARK_FONT_SIZE)    # fontsize of the tick labels
-        plt.rc('legend', fontsize=Style_definitions.LEGEND_FONT_SIZE)    # legend fontsize
-        plt.rc('figure', titlesize=Style_definitions.TITLE_TEXT_SIZE)  # fontsize of the figure title
+        # Get the cleared figure of this process and create a new axis
+        fig = self.__getFigure__()
+        ax = fig.add_subplot(111)
+        default_cycler = self.getDefaultCycler()
 
         label_scale_factor = ""
         # Use custom sci scaling
@@ -139,13 +134,13 @@ class Panel:
             if self.sci_scale != 0:
                 label_scale_factor = "x 1e" + str(self.sci_scale)
             math_scale_factor =  10 ** (scalepower)
-            plt.ticklabel_format(style='plain', axis='x')
+            ax.ticklabel_format(style='plain', axis='x')
         # Use pyplot's default sci scaling
         else:
-            plt.ticklabel_format(style='sci', axis='x', scilimits=Style_definitions.POW_LIMS)
+            ax.ticklabel_format(style='sci', axis='x', scilimits=Style_definitions.POW_LIMS)
 
         # Prevent x-axis label from getting cut off
-        plt.gcf().subplots_adjust(bottom=0.15)
+        fig.subplots_adjust(bottom=0.15)
 
         # Plot dashed line. This var will oscillate between true and false
         plot_dashed = True
@@ -186,13 +181,13 @@ class Panel:
                 line_width = Style_definitions.THIN_LINE_THICKNESS
             plotting_benchmark = var.line_format != ""
             if plotting_benchmark:
-                plt.plot(x_data, y_data, var.line_format, label=var.label, linewidth=line_width)
+                ax.plot(x_data, y_data, var.line_format, label=var.label, linewidth=line_width)
                 # If a benchmark defines a custom color (e.g. "gray" or "#404040) this messes up the color rotation.
-                # Setting the prop cycle to None and then redefining it fixes the color rotation.
+                # Setting the prop cycle to None resets it to the default cycler set in the rc params,
+                # which fixes the color rotation.
                 # This fix may be dependent on benchmarks being plotted first. If this stops being the case, colors may
                 # repeat themselves sooner than expected.
-                plt.gca().set_prop_cycle(None)
-                plt.rc('axes', prop_cycle=default_cycler)
+                ax.set_prop_cycle(None)
             # If format is not specified and paired_plots are enabled,
             # use the color/style rotation specified in Style_definitions.py
             elif paired_plots:
@@ -205,22 +200,21 @@ class Panel:
                     line_style = '-'
                     plot_dashed = True
 
-                plt.plot(x_data, y_data, linestyle=line_style, label=var.label, linewidth=line_width)
+                ax.plot(x_data, y_data, linestyle=line_style, label=var.label, linewidth=line_width)
             else:
-                plt.plot(x_data, y_data, label=var.label, linewidth=line_width)
+                ax.plot(x_data, y_data, label=var.label, linewidth=line_width)
 
         # Show grid if enabled
-        ax = plt.gca()
         ax.grid(Style_definitions.SHOW_GRID)
 
         ax.set_prop_cycle(default_cycler)
 
 
         # Set titles
-        plt.title(self.title)
-        plt.ylabel(self.y_title)
-        plt.text(1, -0.15, label_scale_factor, transform=ax.transAxes, fontsize=Style_definitions.MEDIUM_FONT_SIZE)
-        plt.xlabel(self.x_title)
+        ax.set_title(self.title)
+        ax.set_ylabel(self.y_title)
+        ax.text(1, -0.15, label_scale_factor, transform=ax.transAxes, fontsize=Style_definitions.MEDIUM_FONT_SIZE)
+        ax.set_xlabel(self.x_title)
 
 
         # Add alphabetic ID
@@ -242,23 +236,22 @@ class Panel:
         # Center plots
         if max_panel_value != 0:
             if self.centered:
-                plt.xlim(-1 * max_panel_value * Style_definitions.BUDGET_XAXIS_SCALE_FACTOR,
+                ax.set_xlim(-1 * max_panel_value * Style_definitions.BUDGET_XAXIS_SCALE_FACTOR,
                          max_panel_value * Style_definitions.BUDGET_XAXIS_SCALE_FACTOR)
 
         # Emphasize 0 line in profile plots if 0 is in x-axis range
-        xlim = plt.xlim()
+        xlim = ax.get_xlim()
         if xlim[0] == 0 and xlim[1] == 0:
-            plt.xlim=(-1,1)
+            ax.set_xlim(-1,1)
         if self.panel_type == Panel.TYPE_PROFILE and xlim[0] <= 0 <= xlim[1]:
-            plt.axvline(x=0, color='grey', ls='-')
+            ax.axvline(x=0, color='grey', ls='-')
 
         # Background rcm contour plot
         if self.background_rcm:
             num_points = self.end_alt_idx - self.start_alt_idx + 1
-            bkgrnd_rcm_tavg_contours = np.eye( num_points )
-            for i in range(num_points):
-                for j in range(num_points):
-                    bkgrnd_rcm_tavg_contours[i,j] = self.bkgrnd_rcm_tavg[self.start_alt_idx+i]
+            # Every column of the contour data is the (shared) time-averaged rcm profile
+            bkgrnd_rcm_tavg_contours = np.tile(
+                self.bkgrnd_rcm_tavg[self.start_alt_idx:self.start_alt_idx+num_points, np.newaxis], (1, num_points))
             min_value = min( self.bkgrnd_rcm_tavg )
             max_value = max( self.bkgrnd_rcm_tavg )
             x_vector_contour = np.zeros( num_points )
@@ -266,9 +259,9 @@ class Panel:
             x_interval = x_diff / ( num_points - 1 )
             for k in range(num_points):
                 x_vector_contour[k] = xlim[0] + float(k) * x_interval
-            plt.contourf( x_vector_contour, self.altitude_bkgrnd_rcm[self.start_alt_idx:self.end_alt_idx+1], bkgrnd_rcm_tavg_contours,
-                          vmin=min_value, vmax=2.0*max_value, cmap=plt.set_cmap("gist_yarg") )
-            plt.colorbar( label="rcm [kg/kg]", orientation="vertical" )
+            rcm_contours = ax.contourf( x_vector_contour, self.altitude_bkgrnd_rcm[self.start_alt_idx:self.end_alt_idx+1],
+                                        bkgrnd_rcm_tavg_contours, vmin=min_value, vmax=2.0*max_value, cmap="gist_yarg" )
+            fig.colorbar( rcm_contours, ax=ax, label="rcm [kg/kg]", orientation="vertical" )
 
         # Create folders
         # Because os.mkdir("output") can fail and prevent os.mkdir("output/" + casename) from being called we must
@@ -283,7 +276,114 @@ class Panel:
             pass # do nothing
 
         # Generate image filename
-        filename = self.panel_type + "_"+ str(datetime.now())
+        if timestamp is None:
+            timestamp = str(datetime.now())
+        filename = self.getFilename(timestamp)
+        # Concatenate with output foldername
+        rel_filename = output_folder + "/" +casename+'/' + filename
+        rel_filename = clean_path(rel_filename)
+        # Save image file
+        self.saveFigure(fig, rel_filename, image_extension, dpi=Style_definitions.IMG_OUTPUT_DPI,
+                        extra_image_extensions=extra_image_extensions, thumbnail_width=thumbnail_width)
+
+    @staticmethod
+    def saveFigure(fig, rel_filename, image_extension, dpi='figure', extra_image_extensions=(),
+                   thumbnail_width=None):
+        """
+        Saves a figure to its image file and, under the same name, to all extra formats.
+        The figure is only set up once and then drawn into every format,
+        so saving several formats costs far less than plotting the panel once per format.
+        If the image is a png and a thumbnail_width is given, the thumbnail shown in the gallery is created
+        from the raster buffer the png was written from, so the gallery does not need to read the png again.
+
+        :param fig: The matplotlib Figure to save
+        :param rel_filename: Name of the output files without extension
+        :param image_extension: Extension of the image shown in the gallery, e.g. '.png'
+        :param dpi: Resolution of the raster images, passed on to savefig()
+        :param extra_image_extensions: Extensions of further files to write, e.g. ('.svg', '.pdf')
+        :param thumbnail_width: Maximum width in pixels of the thumbnail, or None to not create a thumbnail
+        :return: None
+        """
+        fig.savefig(rel_filename + image_extension, dpi=dpi)
+        if thumbnail_width is not None and image_extension == '.png':
+            # Right after saving the png, the Agg buffer holds exactly the pixels of the png
+            Panel.__saveThumbnail__(np.asarray(fig.canvas.buffer_rgba()), rel_filename + image_extension,
+                                    thumbnail_width)
+        for extension in extra_image_extensions:
+            if extension != image_extension:
+                fig.savefig(rel_filename + extension, dpi=dpi)
+
+    @staticmethod
+    def __saveThumbnail__(rgba_buffer, image_filename, thumbnail_width):
+        """
+        Saves the gallery thumbnail of an image (see python_html_gallery/gallery.py)
+
+        :param rgba_buffer: Array of shape (height, width, 4) holding the pixels of the image
+        :param image_filename: Name of the image file
+        :param thumbnail_width: Maximum width in pixels of the thumbnail
+        :return: None
+        """
+        case_folder, basename = os.path.split(image_filename)
+        os.makedirs(os.path.join(case_folder, THUMBNAIL_FOLDER), exist_ok=True)
+        thumbnail = Image.fromarray(rgba_buffer)
+        thumbnail.thumbnail((thumbnail_width, thumbnail.height))
+        thumbnail.save(os.path.join(case_folder, THUMBNAIL_FOLDER, basename))
+
+    @staticmethod
+    def getDefaultCycler():
+        """
+        Returns the line color/style rotation. This will cycle through all colors,
+        then once colors run out use a new style and cycle through colors again
+
+        :return: A cycler object
+        """
+        return cycler(linestyle=Style_definitions.STYLE_ROTATION) * cycler(color=Style_definitions.COLOR_ROTATION)
+
+    @staticmethod
+    def __getFigure__():
+        """
+        Returns the figure that is reused by all panels plotted in this process, cleared and set to
+        Style_definitions.FIGSIZE.
+        The figure is created with the object-oriented Agg API, so plotting does not touch the pyplot state machine.
+        The rc params are set once, right before the figure is first created.
+
+        :return: An empty matplotlib Figure
+        """
+        if Panel.__shared_figure is None:
+            Panel.__applyRcParams__()
+            Panel.__shared_figure = Figure(figsize=Style_definitions.FIGSIZE)
+            FigureCanvasAgg(Panel.__shared_figure)
+        else:
+            Panel.__shared_figure.clear()
+            Panel.__shared_figure.set_size_inches(Style_definitions.FIGSIZE)
+        return Panel.__shared_figure
+
+    @staticmethod
+    def __applyRcParams__():
+        """
+        Sets the matplotlib rc params (line rotation and font sizes) used by all panels
+
+        :return: None
+        """
+        plt.rc('axes', prop_cycle=Panel.getDefaultCycler())
+        plt.rc('font', size=Style_definitions.DEFAULT_TEXT_SIZE)          # controls default text sizes
+        plt.rc('axes', titlesize=Style_definitions.AXES_TITLE_FONT_SIZE)     # fontsize of the axes title
+        plt.rc('axes', labelsize=Style_definitions.AXES_LABEL_FONT_SIZE)    # fontsize of the x and y labels
+        plt.rc('xtick', labelsize=Style_definitions.X_TICKMARK_FONT_SIZE)    # fontsize of the tick labels
+        plt.rc('ytick', labelsize=Style_definitions.Y_TICKMARK_FONT_SIZE)    # fontsize of the tick labels
+        plt.rc('legend', fontsize=Style_definitions.LEGEND_FONT_SIZE)    # legend fontsize
+        plt.rc('figure', titlesize=Style_definitions.TITLE_TEXT_SIZE)  # fontsize of the figure title
+
+    def getFilename(self, timestamp):
+        """
+        Returns the name of the image file for this panel, without folder and file extension.
+        Images are ordered by their filenames in the gallery, so the timestamp determines the position
+        of the panel among the panels of the same type.
+
+        :param timestamp: String identifying the time (or position) at which the panel was plotted
+        :return: Filename string
+        """
+        filename = self.panel_type + "_"+ timestamp
         # Force subcolumn plots to show up on top
         if self.panel_type == Panel.TYPE_SUBCOLUMN:
             filename = 'aaa' + filename
@@ -291,13 +391,7 @@ class Panel:
             filename = filename + "_"+ self.title
         else:
             filename = filename + '_' + self.y_title + "_VS_" + self.x_title
-        filename = self.__removeInvalidFilenameChars__(filename)
-        # Concatenate with output foldername
-        rel_filename = output_folder + "/" +casename+'/' + filename
-        rel_filename = clean_path(rel_filename)
-        # Save image file
-        plt.savefig(rel_filename + image_extension, dpi=Style_definitions.IMG_OUTPUT_DPI)
-        plt.close()
+        return self.__removeInvalidFilenameChars__(filename)
 
     def __removeInvalidFilenameChars__(self, filename):
         """
@@ -0,0 +1,172 @@
+"""
+:date: October 2026
+
+Persistent on-disk cache for the data of generated panels.
+Panels (including their Line objects holding the numeric x/y data) are stored in a cache folder, keyed by
+the fingerprints of the input files, the case definition, the command line options that change which lines
+are created, and the source code defining the VariableGroups. A re-run with unchanged inputs can then skip
+reading the netcdf files and evaluating the _calc functions and go straight to rendering.
+"""
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+import tempfile
+
+from config import Style_definitions
+from src.OutputHandler import logToFile
+
+# Bump this whenever the structure of the cached objects changes in a way that is not covered by the
+# source fingerprints below, to invalidate all existing cache entries
+CACHE_FORMAT_VERSION = 1
+
+# Modules whose source code affects the data of every panel.
+# CaseGallerySetup computes the background rcm stored in the panels, and CalcGraph evaluates the calc functions.
+SHARED_SOURCE_MODULES = ['src.VariableGroup', 'src.DataReader', 'src.Line', 'src.Contour', 'src.Panel',
+                         'src.AnimationPanel', 'src.ContourPanel', 'src.CaseGallerySetup', 'src.CalcGraph']
+
+# Style settings that are baked into the cached Line/Contour objects. All other style settings are only
+# used while rendering, so changing them does not invalidate the cache.
+CACHED_STYLE_SETTINGS = ['BENCHMARK_LABELS', 'BENCHMARK_LINE_STYLES', 'CLUBB_LABEL', 'CONTOUR_CMAP']
+
+CACHE_FILE_EXTENSION = '.pkl'
+
+
+class PanelDataCache:
+    """
+    Stores lists of Panel objects in a folder, one pickle file per key.
+    Keys are hex digests built with getKey(), so the cache never has to compare the (large) inputs themselves.
+    Entries are written atomically, so several processes can share one cache folder.
+
+    For information on the input parameters of this class, please see the documentation for the
+    ``__init__()`` method.
+    """
+
+    def __init__(self, cache_folder):
+        """
+        Creates a cache using the given folder. The folder is created if it does not exist.
+
+        :param cache_folder: Path to the folder holding the cache files. If None, nothing is stored and the object
+            is only used to build keys (see getKey()).
+        """
+        self.cache_folder = None
+        if cache_folder is not None:
+            self.cache_folder = os.path.abspath(cache_folder)
+            os.makedirs(self.cache_folder, exist_ok=True)
+        self.__source_fingerprints = {}
+
+    def get(self, key):
+        """
+        Returns the panels stored under the given key
+
+        :param key: Key string returned by getKey()
+        :return: List of Panel objects, or None if there is no (readable) entry for the key
+        """
+        if self.cache_folder is None:
+            return None
+        filename = self.__getFilename__(key)
+        if not os.path.exists(filename):
+            return None
+        try:
+            with open(filename, 'rb') as cache_file:
+                return pickle.load(cache_file)
+        except Exception as error:
+            # A damaged or outdated entry is treated like a missing one and overwritten by the next put()
+            logToFile("Warning: Could not read panel data cache file " + filename + ": " + str(error))
+            return None
+
+    def put(self, key, panels):
+        """
+        Stores panels under the given key, replacing any existing entry
+
+        :param key: Key string returned by getKey()
+        :param panels: List of Panel objects
+        :return: None
+        """
+        if self.cache_folder is None:
+            return
+        file_descriptor, temp_filename = tempfile.mkstemp(suffix='.tmp', dir=self.cache_folder)
+        with os.fdopen(file_descriptor, 'wb') as cache_file:
+            pickle.dump(panels, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, self.__getFilename__(key))
+
+    def getKey(self, *key_parts):
+        """
+        Builds a cache key from the given parts.
+        Parts are converted to strings with describe(), so they may contain (nested) dicts and lists of
+        netCDF4 Datasets, classes and plain values.
+
+        :param key_parts: Any number of objects that together identify a cache entry
+        :return: Hex digest string
+        """
+        key_hash = hashlib.sha256(str(CACHE_FORMAT_VERSION).encode())
+        for part in key_parts:
+            key_hash.update(self.describe(part).encode())
+        return key_hash.hexdigest()
+
+    def describe(self, obj):
+        """
+        Returns a string describing obj that only changes if obj changes.
+        Datasets are described by their path and file fingerprint, and classes by their name and the
+        fingerprint of the source code they are defined in.
+
+        :param obj: Object to describe
+        :return: Description string
+        """
+        if isinstance(obj, dict):
+            return '{' + ','.join(self.describe(key) + ':' + self.describe(obj[key])
+                                  for key in sorted(obj, key=str)) + '}'
+        if isinstance(obj, (list, tuple)):
+            return '[' + ','.join(self.describe(item) for item in obj) + ']'
+        if inspect.isclass(obj):
+            return 'class ' + obj.__module__ + '.' + obj.__qualname__ + ' ' + self.getSourceFingerprint(obj)
+        if hasattr(obj, 'filepath') and callable(obj.filepath):
+            return 'dataset ' + self.getFileFingerprint(obj.filepath())
+        return repr(obj)
+
+    @staticmethod
+    def getFileFingerprint(filename):
+        """
+        Returns a fingerprint of an input file made from its absolute path, size and modification time.
+        This avoids reading (and hashing) large netcdf files, while still detecting any rewrite of a file.
+
+        :param filename: Path to a file
+        :return: Fingerprint string. Files that do not exist get a fingerprint as well.
+        """
+        abs_filename = os.path.abspath(filename)
+        try:
+            stat = os.stat(abs_filename)
+        except OSError:
+            return abs_filename + ' missing'
+        return abs_filename + ' ' + str(stat.st_size) + ' ' + str(stat.st_mtime_ns)
+
+    def getSourceFingerprint(self, cls):
+        """
+        Returns a hash of the source files defining the given class and all of its base classes,
+        plus the modules listed in SHARED_SOURCE_MODULES and the style settings in CACHED_STYLE_SETTINGS.
+
+        :param cls: A class, usually a VariableGroup subclass
+        :return: Hex digest string
+        """
+        if cls not in self.__source_fingerprints:
+            source_hash = hashlib.sha256()
+            modules = [base.__module__ for base in inspect.getmro(cls) if base is not object]
+            for module_name in sorted(set(modules + SHARED_SOURCE_MODULES)):
+                source_filename = getattr(importlib.import_module(module_name), '__file__', None)
+                if source_filename is not None and os.path.exists(source_filename):
+                    with open(source_filename, 'rb') as source_file:
+                        source_hash.update(source_file.read())
+            for setting in CACHED_STYLE_SETTINGS:
+                source_hash.update(repr(getattr(Style_definitions, setting, None)).encode())
+            self.__source_fingerprints[cls] = source_hash.hexdigest()
+        return self.__source_fingerprints[cls]
+
+    def __getFilename__(self, key):
+        """
+        Returns the name of the cache file for a key
+
+        :param key: Key string returned by getKey()
+        :return: Absolute filename
+        """
+        return os.path.join(self.cache_folder, key + CACHE_FILE_EXTENSION)
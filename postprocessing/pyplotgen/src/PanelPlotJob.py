@@ -0,0 +1,335 @@
+"""
+:date: October 2026
+
+A PanelPlotJob is a picklable description of everything needed to render one panel.
+CaseGallerySetup creates one job per panel after all data has been extracted from the netcdf files,
+so jobs can be rendered in any process and in any order without changing the output.
+"""
+import hashlib
+import inspect
+import os
+import pickle
+from datetime import datetime, timedelta
+
+import matplotlib
+
+from config import Style_definitions
+from src.interoperability import clean_path
+from src.LazyPanel import LazyPanel
+from src.OutputHandler import logToFile
+from src.Profiler import CATEGORY_PANEL, getProfiler
+
+# Name of the folder inside each case folder holding the content hashes of incrementally rendered images
+HASH_FOLDER = '.panel_hashes'
+HASH_FILE_EXTENSION = '.sha256'
+# Prefix of the files in HASH_FOLDER recording which panel definition was plotted at which position
+DEFINITION_RECORD_PREFIX = 'definition_'
+
+
+class PanelPlotJob:
+    """
+    Render job for a single Panel.
+    The job holds the panel (which contains copies of all data it plots) and all plot options, including the
+    timestamp used in the image filename. Since the gallery orders images by filename, assigning these timestamps
+    when the jobs are created keeps the order of the panels on the webpage independent of the order
+    in which the jobs are rendered.
+
+    For information on the input parameters of this class, please see the documentation for the
+    ``__init__()`` method.
+    """
+
+    def __init__(self, panel, casename, output_folder, timestamp, plot_options, panel_number=1, num_panels=1,
+                 incremental=False):
+        """
+        Creates a new render job
+
+        :param panel: The Panel (or Panel subclass) object to plot. This may also be a LazyPanel,
+            in which case resolve() has to be called before the job is run or pickled.
+        :param casename: The name of the case that is plotted in this panel
+        :param output_folder: String containing path to folder in which the image files should be created
+        :param timestamp: String used in the image filename to order the panels of a case
+        :param plot_options: dict of keyword arguments passed on to panel.plot()
+        :param panel_number: Position of this panel in its case, only used for logging
+        :param num_panels: Number of panels in the case, only used for logging
+        :param incremental: If True, the panel is only plotted if its output file does not exist yet or if the
+            panel data, plot options, style settings or rendering code changed since the file was written
+        """
+        self.panel = panel
+        self.casename = casename
+        self.output_folder = output_folder
+        self.timestamp = timestamp
+        self.plot_options = plot_options
+        self.panel_number = panel_number
+        self.num_panels = num_panels
+        self.incremental = incremental
+        self.definition_hash = None
+        self.up_to_date_filename = None
+        self.output_filename = None
+        self.content_hash = None
+
+    def resolve(self):
+        """
+        Replaces a LazyPanel of this job by its actual panel, so the job can be pickled and run.
+        In incremental mode, the data of a lazy panel is not read at all if the file written for the same
+        panel definition at the same position by an earlier run is still up to date.
+        The job then only skips the panel when it is run.
+
+        :return: False if the job has nothing to plot because there is no data for its panel, True otherwise
+        """
+        if not isinstance(self.panel, LazyPanel):
+            return True
+        if self.incremental:
+            self.definition_hash = self.getDefinitionHash()
+            self.up_to_date_filename = self.__getRecordedOutputFilename__(self.definition_hash)
+            if self.up_to_date_filename is not None:
+                self.panel = None
+                return True
+        self.panel = self.panel.materialize()
+        return self.panel is not None
+
+    def run(self):
+        """
+        Plots the panel of this job to an image (or movie) file.
+        In incremental mode, unchanged panels are skipped.
+
+        :return: The return value of panel.plot(), i.e. the filtering flag for animations and None otherwise
+        """
+        if not self.needsPlotting():
+            return None
+
+        logToFile("\tPlotting {} of {}: {}".format(self.panel_number, self.num_panels, self.panel.title))
+        profiler = getProfiler()
+        with profiler.measure(CATEGORY_PANEL, self.panel.title, casename=self.casename):
+            plot_result = self.panel.plot(self.output_folder, self.casename, timestamp=self.timestamp,
+                                          **self.plot_options)
+        profiler.flush()
+        self.__recordOutput__()
+        return plot_result
+
+    def needsPlotting(self):
+        """
+        Checks if the output of this job has to be written. In incremental mode, this is not the case if the
+        output file is up to date, which is noted in the log file.
+
+        :return: False if the panel is skipped, True otherwise
+        """
+        if self.up_to_date_filename is not None:
+            logToFile("\tSkipping unchanged panel {} of {}: {}".format(self.panel_number, self.num_panels,
+                                                                      os.path.basename(self.up_to_date_filename)))
+            return False
+
+        self.output_filename = None
+        self.content_hash = None
+        if self.incremental:
+            self.output_filename = self.getOutputFilename()
+            self.content_hash = self.getContentHash()
+            if self.output_filename is not None and self.__isUpToDate__(self.output_filename, self.content_hash):
+                logToFile("\tSkipping unchanged panel {} of {}: {}".format(self.panel_number, self.num_panels,
+                                                                          self.panel.title))
+                return False
+        return True
+
+    def isSplittable(self):
+        """
+        Checks if the movie of this job can be written in chunks by several jobs (see getMovieChunkJobs())
+
+        :return: True if the panel is an animation whose frames are streamed to the movie encoder
+        """
+        return self.plot_options.get('stream_movie', False)
+
+    def getMovieChunkJobs(self, num_chunks):
+        """
+        Splits the movie of this job into jobs that each write a segment with a consecutive chunk of the frames
+        (see AnimationPanel.streamMovie()). The chunk jobs can be run in any process and in any order.
+        Afterwards, concatenateMovieChunks() has to be called to join the segments into the movie.
+        Should only be called if isSplittable() and needsPlotting() are True.
+
+        :param num_chunks: Number of chunks
+        :return: List of PanelPlotJob objects
+        """
+        return [PanelPlotJob(self.panel, self.casename, self.output_folder, self.timestamp,
+                             dict(self.plot_options, movie_chunk=(chunk_index, num_chunks)),
+                             panel_number=self.panel_number, num_panels=self.num_panels)
+                for chunk_index in range(num_chunks)]
+
+    def concatenateMovieChunks(self, num_chunks):
+        """
+        Joins the segments written by the jobs returned by getMovieChunkJobs() into the movie of this job.
+        In incremental mode, the movie is recorded as up to date like in run().
+
+        :param num_chunks: Number of chunks passed to getMovieChunkJobs()
+        :return: None
+        """
+        profiler = getProfiler()
+        with profiler.measure(CATEGORY_PANEL, self.panel.title, casename=self.casename):
+            self.panel.concatenateMovieChunks(self.output_folder, self.casename, num_chunks,
+                                              movie_extension=self.plot_options['movie_extension'],
+                                              timestamp=self.timestamp)
+        profiler.flush()
+        self.__recordOutput__()
+
+    def __recordOutput__(self):
+        """
+        In incremental mode, writes the content hash of the output file written by this job and records
+        which file was written for the panel definition at the position of this job
+
+        :return: None
+        """
+        if self.output_filename is None:
+            return
+        hash_filename = self.getHashFilename(self.output_filename)
+        os.makedirs(os.path.dirname(hash_filename), exist_ok=True)
+        with open(hash_filename, 'w') as hash_file:
+            hash_file.write(self.content_hash)
+        if self.definition_hash is not None:
+            with open(self.__getDefinitionRecordFilename__(), 'w') as record_file:
+                record_file.write(self.definition_hash + '\n' + os.path.basename(self.output_filename))
+
+    def getOutputFilename(self):
+        """
+        Returns the name of the file this job writes
+
+        :return: Absolute filename, or None if the panel writes more than one file
+        """
+        if self.up_to_date_filename is not None:
+            return self.up_to_date_filename
+        if len(self.panel.all_plots) > 1 and self.panel.panel_type == self.panel.TYPE_TIMEHEIGHT:
+            return None
+        extension = self.plot_options.get('movie_extension', self.plot_options['image_extension'])
+        return clean_path(self.output_folder + "/" + self.casename + '/' + self.panel.getFilename(self.timestamp)) \
+               + extension
+
+    def getContentHash(self):
+        """
+        Returns a hash of everything that determines how the output of this job looks:
+        The panel with all of its data, the plot options, all style settings,
+        the source code of the panel class and the matplotlib version.
+
+        :return: Hex digest string
+        """
+        content_hash = hashlib.sha256(pickle.dumps(self.panel, protocol=pickle.HIGHEST_PROTOCOL))
+        for panel_class in inspect.getmro(type(self.panel)):
+            if panel_class is not object:
+                with open(inspect.getsourcefile(panel_class), 'rb') as source_file:
+                    content_hash.update(source_file.read())
+        self.__updateWithRenderSettings__(content_hash)
+        return content_hash.hexdigest()
+
+    def getDefinitionHash(self):
+        """
+        Returns a hash of everything that determines how the output of a job with a LazyPanel looks,
+        without reading the data of the panel: The definition key of the panel (which covers the variable
+        definition, the input files and the source code of the VariableGroup and panel classes),
+        the plot options, all style settings and the matplotlib version.
+
+        :return: Hex digest string
+        """
+        definition_hash = hashlib.sha256(self.panel.definition_key.encode())
+        self.__updateWithRenderSettings__(definition_hash)
+        return definition_hash.hexdigest()
+
+    def __updateWithRenderSettings__(self, content_hash):
+        """
+        Adds the plot options, style settings and matplotlib version to a hash
+
+        :param content_hash: hashlib hash object
+        :return: None
+        """
+        content_hash.update(repr(sorted(self.plot_options.items())).encode())
+        style_settings = [(name, getattr(Style_definitions, name)) for name in sorted(dir(Style_definitions))
+                          if name.isupper()]
+        content_hash.update(repr(style_settings).encode())
+        content_hash.update(matplotlib.__version__.encode())
+
+    @staticmethod
+    def getHashFilename(output_filename):
+        """
+        Returns the name of the file holding the content hash of an output file.
+        Hash files are kept in a hidden subfolder, so they do not show up in the gallery or the pdf.
+
+        :param output_filename: Name of an image or movie file
+        :return: Filename string
+        """
+        return os.path.join(os.path.dirname(output_filename), HASH_FOLDER,
+                            os.path.basename(output_filename) + HASH_FILE_EXTENSION)
+
+    def __getDefinitionRecordFilename__(self):
+        """
+        Returns the name of the file recording the definition hash and the output file of the panel plotted
+        at the position of this job. Positions are only stable in incremental mode, where they replace timestamps.
+
+        :return: Filename string
+        """
+        return clean_path(os.path.join(self.output_folder, self.casename, HASH_FOLDER,
+                                       DEFINITION_RECORD_PREFIX + self.timestamp + HASH_FILE_EXTENSION))
+
+    def __getRecordedOutputFilename__(self, definition_hash):
+        """
+        Looks up the output file an earlier run wrote for the panel definition with the given hash
+        at the position of this job
+
+        :param definition_hash: Hash returned by getDefinitionHash()
+        :return: Absolute filename, or None if no up to date output file exists
+        """
+        record_filename = self.__getDefinitionRecordFilename__()
+        if not os.path.exists(record_filename):
+            return None
+        with open(record_filename) as record_file:
+            recorded_hash, output_basename = (record_file.read().split('\n') + [''])[:2]
+        output_filename = clean_path(os.path.join(self.output_folder, self.casename, output_basename))
+        if recorded_hash != definition_hash or output_basename == '' or not os.path.exists(output_filename):
+            return None
+        return output_filename
+
+    def __isUpToDate__(self, output_filename, content_hash):
+        """
+        Checks if an output file exists and was written from content with the given hash
+
+        :param output_filename: Name of an image or movie file
+        :param content_hash: Hash returned by getContentHash()
+        :return: True if the file does not need to be plotted again
+        """
+        hash_filename = self.getHashFilename(output_filename)
+        if not os.path.exists(output_filename) or not os.path.exists(hash_filename):
+            return False
+        with open(hash_filename) as hash_file:
+            return hash_file.read() == content_hash
+
+    @staticmethod
+    def logFilteredAnimations(casename, filtering_flags):
+        """
+        Notes in the log file if time slices had to be filtered from any of the animations of a case.
+
+        :param casename: The name of the case
+        :param filtering_flags: List of the values returned by run() for the jobs of the case
+        :return: None
+        """
+        if any(filtering_flags):
+            logToFile('Time slices have been filtered from some {} simulations '.format(casename.upper()) +
+                      'due to mismatched time stepping.')
+
+    @staticmethod
+    def getPositionStamps(num_stamps):
+        """
+        Returns a list of zero-padded panel positions to be used instead of timestamps in filenames.
+        Unlike timestamps these stay the same between runs, so output files can be reused by incremental runs.
+
+        :param num_stamps: Number of stamps to create
+        :return: List of strings that sort in the same order as the positions they represent
+        """
+        num_digits = max(len(str(num_stamps)), 4)
+        return [str(i).zfill(num_digits) for i in range(num_stamps)]
+
+    @staticmethod
+    def getTimestamps(num_timestamps):
+        """
+        Returns a list of strictly increasing timestamp strings starting at the current time.
+        The strings have the same format as str(datetime.now()), but always include microseconds
+        so they sort in the same order as the times they represent.
+
+        :param num_timestamps: Number of timestamps to create
+        :return: List of timestamp strings
+        """
+        start_time = datetime.now()
+        return [(start_time + timedelta(microseconds=i)).isoformat(sep=' ', timespec='microseconds')
+                for i in range(num_timestamps)]
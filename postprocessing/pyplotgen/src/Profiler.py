@@ -0,0 +1,232 @@
+"""
+:date: October 2026
+
+Opt-in instrumentation for pyplotgen runs (--profile).
+Every process has one Profiler, returned by getProfiler(). Code that wants to be measured wraps its work in
+``with getProfiler().measure(category, name):``, and DataReader reports the number of bytes it reads from
+netcdf files. While profiling is disabled (the default), measure() returns a no-op context manager.
+
+Worker processes cannot hand their records back to the main process directly, so each process appends its
+records to its own file in a shared records folder (see flush()). After all work is done, the main process
+reads the records of all processes and writes the report with writeReport().
+"""
+import contextlib
+import csv
+import glob
+import json
+import os
+import time
+
+# Categories of measured work, from outermost to innermost
+CATEGORY_CASE = 'case'
+CATEGORY_VARIABLE_GROUP = 'variable group'
+CATEGORY_VARIABLE = 'variable'
+CATEGORY_CALC = 'calc'
+CATEGORY_PANEL = 'panel'
+CATEGORIES = [CATEGORY_CASE, CATEGORY_VARIABLE_GROUP, CATEGORY_VARIABLE, CATEGORY_CALC, CATEGORY_PANEL]
+
+RECORD_FIELDS = ['category', 'name', 'case', 'process', 'wall_time', 'bytes_read']
+REPORT_JSON_FILENAME = 'profile.json'
+REPORT_CSV_FILENAME = 'profile.csv'
+RECORDS_FILE_EXTENSION = '.jsonl'
+
+# Number of entries per category shown in the summary table
+SUMMARY_ROWS_PER_CATEGORY = 10
+
+
+class Profiler:
+    """
+    Records the wall time and the number of bytes read from netcdf files of nested units of work.
+    Measurements are inclusive, e.g. the time of a variable group includes the time of its variables,
+    which in turn includes the time of the calc functions used for them.
+
+    For information on the input parameters of this class, please see the documentation for the
+    ``__init__()`` method.
+    """
+
+    def __init__(self):
+        """
+        Creates a disabled profiler
+        """
+        self.records_folder = None
+        self.records = []
+        self.__active_records = []
+
+    @property
+    def enabled(self):
+        """
+        True if this profiler records measurements
+        """
+        return self.records_folder is not None
+
+    def enable(self, records_folder):
+        """
+        Starts recording measurements
+
+        :param records_folder: Folder shared by all processes of the run into which flush() writes the records
+        :return: None
+        """
+        self.records_folder = records_folder
+
+    def disable(self):
+        """
+        Stops recording measurements and drops all records that were not flushed yet
+
+        :return: None
+        """
+        self.records_folder = None
+        self.records = []
+        self.__active_records = []
+
+    def measure(self, category, name, casename=None):
+        """
+        Returns a context manager measuring the work done inside of it
+
+        :param category: One of CATEGORIES
+        :param name: Name of the measured unit of work, e.g. the name of a VariableGroup class
+        :param casename: Name of the case the work belongs to.
+            Defaults to the name of the case that is currently being measured, if any.
+        :return: Context manager
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self.__measure__(category, name, casename)
+
+    def addBytesRead(self, num_bytes):
+        """
+        Adds bytes read from a netcdf file to all units of work that are currently being measured
+
+        :param num_bytes: Number of bytes read
+        :return: None
+        """
+        for record in self.__active_records:
+            record['bytes_read'] += num_bytes
+
+    def flush(self):
+        """
+        Appends all records of this process to its records file and clears them
+
+        :return: None
+        """
+        if not self.enabled or len(self.records) == 0:
+            return
+        records_filename = os.path.join(self.records_folder, str(os.getpid()) + RECORDS_FILE_EXTENSION)
+        with open(records_filename, 'a') as records_file:
+            for record in self.records:
+                records_file.write(json.dumps(record) + '\n')
+        self.records = []
+
+    @staticmethod
+    def readRecords(records_folder):
+        """
+        Reads the records that all processes flushed into a folder
+
+        :param records_folder: Folder passed to enable()
+        :return: List of record dicts
+        """
+        records = []
+        for records_filename in sorted(glob.glob(os.path.join(records_folder, '*' + RECORDS_FILE_EXTENSION))):
+            with open(records_filename) as records_file:
+                records.extend(json.loads(line) for line in records_file if line.strip() != '')
+        return records
+
+    @staticmethod
+    def summarize(records):
+        """
+        Aggregates records by category and name
+
+        :param records: List of record dicts
+        :return: List of dicts with the keys 'category', 'name', 'count', 'wall_time', 'max_wall_time' and
+            'bytes_read', ordered by category (see CATEGORIES) and descending total wall time
+        """
+        summary = {}
+        for record in records:
+            entry = summary.setdefault((record['category'], record['name']),
+                                       {'category': record['category'], 'name': record['name'], 'count': 0,
+                                        'wall_time': 0.0, 'max_wall_time': 0.0, 'bytes_read': 0})
+            entry['count'] += 1
+            entry['wall_time'] += record['wall_time']
+            entry['max_wall_time'] = max(entry['max_wall_time'], record['wall_time'])
+            entry['bytes_read'] += record['bytes_read']
+        return sorted(summary.values(), key=lambda entry: (CATEGORIES.index(entry['category']), -entry['wall_time']))
+
+    @staticmethod
+    def formatSummary(summary, rows_per_category=SUMMARY_ROWS_PER_CATEGORY):
+        """
+        Formats the entries returned by summarize() as a table showing the most expensive entries of each category
+
+        :param summary: List returned by summarize()
+        :param rows_per_category: Maximum number of entries shown per category
+        :return: Table string
+        """
+        lines = ["{:<15} {:<60} {:>6} {:>12} {:>12}".format('Category', 'Name', 'Count', 'Wall time', 'Read')]
+        for category in CATEGORIES:
+            entries = [entry for entry in summary if entry['category'] == category]
+            for entry in entries[:rows_per_category]:
+                lines.append("{:<15} {:<60} {:>6} {:>11.2f}s {:>8.1f} MiB".format(
+                    category, entry['name'][:60], entry['count'], entry['wall_time'], entry['bytes_read'] / 1024 ** 2))
+            if len(entries) > rows_per_category:
+                lines.append("{:<15} ({} more, see {})".format(category, len(entries) - rows_per_category,
+                                                               REPORT_CSV_FILENAME))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def writeReport(records, output_folder):
+        """
+        Writes all records to a csv file and the records together with their summary to a json file
+
+        :param records: List of record dicts
+        :param output_folder: Folder to write REPORT_JSON_FILENAME and REPORT_CSV_FILENAME into
+        :return: The summary returned by summarize()
+        """
+        summary = Profiler.summarize(records)
+        with open(os.path.join(output_folder, REPORT_JSON_FILENAME), 'w') as json_file:
+            json.dump({'summary': summary, 'records': records}, json_file, indent=1)
+        with open(os.path.join(output_folder, REPORT_CSV_FILENAME), 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=RECORD_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+        return summary
+
+    @contextlib.contextmanager
+    def __measure__(self, category, name, casename):
+        """
+        Measures the work done inside the context, see measure()
+
+        :return: Generator used by contextlib
+        """
+        if casename is None:
+            casename = next((record['name'] for record in reversed(self.__active_records)
+                             if record['category'] == CATEGORY_CASE), None)
+        record = {'category': category, 'name': name, 'case': casename, 'process': os.getpid(),
+                  'wall_time': 0.0, 'bytes_read': 0}
+        self.__active_records.append(record)
+        start_time = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_time'] = time.perf_counter() - start_time
+            self.__active_records.remove(record)
+            self.records.append(record)
+
+
+__profiler = Profiler()
+
+
+def getProfiler():
+    """
+    Returns the Profiler of this process.
+
+    :return: The process-wide Profiler
+    """
+    return __profiler
+
+
+def enableProfiling(records_folder):
+    """
+    Enables the Profiler of this process. Can be used as initializer of a multiprocessing.Pool.
+
+    :param records_folder: See Profiler.enable()
+    :return: None
+    """
+    __profiler.enable(records_folder)
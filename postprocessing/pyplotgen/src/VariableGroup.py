@@ -18,7 +18,10 @@ from src.DataReader import DataReader, NetCdfVariable
 from src.Line import Line
 from src.Panel import Panel
 from src.AnimationPanel import AnimationPanel
+from src.CalcGraph import evaluateCalc
+from src.LazyPanel import LazyPanel
 from src.OutputHandler import logToFile, logToFileAndConsole
+from src.Profiler import CATEGORY_VARIABLE, getProfiler
 
 class VariableGroup:
     """
@@ -79,10 +82,16 @@ class VariableGroup:
         self.priority_vars = priority_vars
         self.background_rcm = background_rcm
         self.background_rcm_folder = background_rcm_folder
+        # In lazy mode, no data is read here. Instead, self.panels is filled with one LazyPanel per variable,
+        # which reads the data of its variable when it is materialized.
+        self.lazy = getattr(case, 'lazy', False)
+        # Calc functions and their inputs are shared between all VariableGroups of a case through its CalcGraph
+        self.calc_graph = getattr(case, 'calc_graph', None)
+        self.bkgrnd_rcm_tavg = None
 
         # Loop over the list self.variable_definitions which is only defined in the subclasses
         # that can be found in the config folder such as VariableGroupBase
-        for variable in self.variable_definitions:
+        for variable_index, variable in enumerate(self.variable_definitions):
             logToFile("\tProcessing {}".format(variable['var_names']['clubb']))
             # Only add variable if none of the var_names are blacklisted
             all_var_names = []
@@ -90,53 +99,66 @@ class VariableGroup:
                 all_var_names.extend(model_var_names)
             variable_is_blacklisted = len(list(set(all_var_names).intersection(case.blacklisted_variables))) != 0
 
-            if not variable_is_blacklisted:
-                self.addVariable(variable)
-            else:
+            if variable_is_blacklisted:
                 logToFile('\tVariable {} is blacklisted and will therefore not be plotted.'.format(variable))
-
-        if self.background_rcm:
-            if self.clubb_datasets is not None and len(self.clubb_datasets) != 0:
-                # Extract rcm from the zt NetCDF file. Also extract the time and height values to which the
-                # rcm data points correspond.
-                bkgrnd_rcm = np.squeeze( self.clubb_datasets[self.background_rcm_folder]['zt'].variables['rcm'] )
-                self.altitude_bkgrnd_rcm = np.squeeze( self.clubb_datasets[self.background_rcm_folder]['zt'].variables['altitude'] )
-                time_bkgrnd_rcm = np.squeeze( self.clubb_datasets[self.background_rcm_folder]['zt'].variables['time'] )
-                # Find the indices in the rcm data that correspond to the start time and end time requested as the
-                # time-averaging interval for the case, as well as the minimum height and maximum height requested
-                # for the plots.
-                start_time_seconds = 60.0 * self.start_time # self.start_time is in minutes, while time_bkgrnd_rcm is in seconds.
-                end_time_seconds = 60.0 * self.end_time # self.end_time is in minutes, while time_bkgrnd_rcm is in seconds.
-                start_time_idx, end_time_idx = DataReader.__getStartEndIndex__(time_bkgrnd_rcm, start_time_seconds, end_time_seconds)
-                self.start_alt_idx, self.end_alt_idx = DataReader.__getStartEndIndex__(self.altitude_bkgrnd_rcm, self.height_min_value, self.height_max_value)
-                # Calculate the time-averaged vertical profile of rcm for use as contours in the background of plots
-                # of CLUBB time-averaged vertical profiles of various model fields.
-                nzt = np.shape(bkgrnd_rcm)[1]
-                self.bkgrnd_rcm_tavg = np.zeros(nzt)
-                for z_indx in range(nzt):
-                    lev_sum = 0
-                    count = 0
-                    for t_indx in range(start_time_idx, end_time_idx):
-                        lev_sum = lev_sum + bkgrnd_rcm[t_indx,z_indx]
-                        count = count + 1
-                    self.bkgrnd_rcm_tavg[z_indx] = lev_sum / float(count)
+            elif not self.__isPlotted__(variable):
+                # Skip reading data that generatePanels() would not use
+                continue
+            elif self.lazy:
+                self.panels.append(LazyPanel(self, variable, variable_index, self.__getPanelType__(variable)))
             else:
-                # Set the relevant "output" variables to a value just to have them set.
-                # They will be flagged out of interacting with the code.
-                self.bkgrnd_rcm_tavg = 0
-                self.altitude_bkgrnd_rcm = 0
-                self.start_alt_idx = 0
-                self.end_alt_idx = 0
-        else:
-            # Set the relevant "output" variables to a value just to have them set.
-            # They will be flagged out of interacting with the code.
-            self.bkgrnd_rcm_tavg = 0
-            self.altitude_bkgrnd_rcm = 0
-            self.start_alt_idx = 0
-            self.end_alt_idx = 0
-
-        self.generatePanels()
-        
+                with getProfiler().measure(CATEGORY_VARIABLE, self.__getProfileName__(variable)):
+                    self.addVariable(variable)
+
+        if not self.lazy:
+            self.__setBackgroundRcm__()
+            self.generatePanels()
+
+    def materializeVariable(self, variable_def_dict):
+        """
+        Reads the data of a single variable definition and creates its panel.
+        This is how LazyPanels of a VariableGroup created in lazy mode get their data.
+
+        :param variable_def_dict: A dict from self.variable_definitions
+        :return: The Panel (or Panel subclass) object for the variable,
+            or None if none of the datasets contain data for it
+        """
+        if self.bkgrnd_rcm_tavg is None:
+            self.__setBackgroundRcm__()
+        with getProfiler().measure(CATEGORY_VARIABLE, self.__getProfileName__(variable_def_dict)):
+            self.addVariable(variable_def_dict)
+        if len(variable_def_dict['plots']) == 0:
+            return None
+        return self.createPanel(variable_def_dict)
+
+    def __setBackgroundRcm__(self):
+        """
+        Takes the time-averaged rcm profile (and the heights and indices belonging to it)
+        shown behind the CLUBB profiles from the case, which computes it once for all of its VariableGroups
+
+        :return: None
+        """
+        self.bkgrnd_rcm_tavg = self.case.bkgrnd_rcm_tavg
+        self.altitude_bkgrnd_rcm = self.case.altitude_bkgrnd_rcm
+        self.start_alt_idx = self.case.start_alt_idx
+        self.end_alt_idx = self.case.end_alt_idx
+
+    def __getProfileName__(self, variable_def_dict):
+        """
+        Returns the name under which a variable is listed in --profile reports
+
+        :param variable_def_dict: A dict containing the information defining a variable
+        :return: String made of the class name of this group and the first variable name (or calc function name)
+            in the definition, preferring CLUBB names
+        """
+        var_names = variable_def_dict['var_names']
+        for varname in var_names['clubb'] + [name for model_var_names in var_names.values() for name in model_var_names]:
+            if callable(varname):
+                return type(self).__name__ + '.' + varname.__name__
+            if varname != '':
+                return type(self).__name__ + '.' + varname
+        return type(self).__name__ + '.' + variable_def_dict.get('title', 'unnamed variable')
+
     def addVariable(self, variable_def_dict):
         """
         Given basic details about a variable, this
@@ -321,7 +343,8 @@ class VariableGroup:
                     line['calculated'] = False
                     if (model_name + '_calc') in line.keys() and \
                             not self.__varnamesInDataset__(line['var_names'], dataset):
-                        plot_data, z = line[(model_name + '_calc')](dataset_override=dataset)
+                        calc_function = line[(model_name + '_calc')]
+                        plot_data, z = evaluateCalc(calc_function, dataset)
 
                         #kludgy trimming for these variables since they are processed here but never trimmed
                         if np.any(z<self.height_min_value):
@@ -411,34 +434,61 @@ class VariableGroup:
         :return: None
         """
         for variable in self.variables:
-            # Only display a variable if we are either not doing a priority run or the priority flag has been set and is True
-            if not self.priority_vars or (self.priority_vars and 'priority' in variable.keys() and variable['priority']):
-                title = variable['title']
-                axis_label = variable['axis_title']
-                plotset = variable['plots']
-                centered = False
-                panel_type = self.default_panel_type
-                if self.time_height:
-                    panel_type = Panel.TYPE_TIMEHEIGHT
-                elif 'type' in variable.keys():
-                    panel_type = variable['type']
-                if 'sci_scale' in variable.keys():
-                    sci_scale = variable['sci_scale']
-                else:
-                    sci_scale = None
-                if 'centered' in variable.keys():
-                    centered = variable['centered']
-            
-                if panel_type == Panel.TYPE_TIMEHEIGHT:
-                    panel = ContourPanel(plotset, title=title, dependent_title=axis_label, panel_type=panel_type)
-                elif self.animation is not None:
-                    panel = AnimationPanel(plotset, title=title, dependent_title=axis_label, panel_type=panel_type,
-                                           sci_scale=sci_scale, centered=centered)
-                else:
-                    panel = Panel(plotset, self.bkgrnd_rcm_tavg, self.altitude_bkgrnd_rcm, self.start_alt_idx, self.end_alt_idx,
-                                  title=title, dependent_title=axis_label, panel_type=panel_type, sci_scale=sci_scale,
-                                  centered=centered, background_rcm=self.background_rcm)
-                self.panels.append(panel)
+            if self.__isPlotted__(variable):
+                self.panels.append(self.createPanel(variable))
+
+    def createPanel(self, variable):
+        """
+        Creates the panel for a variable that was processed by addVariable()
+
+        :param variable: A dict from self.variables
+        :return: Panel (or Panel subclass) object
+        """
+        title = variable['title']
+        axis_label = variable['axis_title']
+        plotset = variable['plots']
+        centered = False
+        panel_type = self.__getPanelType__(variable)
+        if 'sci_scale' in variable.keys():
+            sci_scale = variable['sci_scale']
+        else:
+            sci_scale = None
+        if 'centered' in variable.keys():
+            centered = variable['centered']
+
+        if panel_type == Panel.TYPE_TIMEHEIGHT:
+            panel = ContourPanel(plotset, title=title, dependent_title=axis_label, panel_type=panel_type)
+        elif self.animation is not None:
+            panel = AnimationPanel(plotset, title=title, dependent_title=axis_label, panel_type=panel_type,
+                                   sci_scale=sci_scale, centered=centered)
+        else:
+            panel = Panel(plotset, self.bkgrnd_rcm_tavg, self.altitude_bkgrnd_rcm, self.start_alt_idx, self.end_alt_idx,
+                          title=title, dependent_title=axis_label, panel_type=panel_type, sci_scale=sci_scale,
+                          centered=centered, background_rcm=self.background_rcm)
+        return panel
+
+    def __isPlotted__(self, variable_def_dict):
+        """
+        Checks if a panel is created for a variable definition with the current options.
+        Only display a variable if we are either not doing a priority run or the priority flag has been set and is True
+
+        :param variable_def_dict: A dict containing the information defining a variable
+        :return: True if the variable is plotted
+        """
+        return not self.priority_vars or ('priority' in variable_def_dict.keys() and variable_def_dict['priority'])
+
+    def __getPanelType__(self, variable_def_dict):
+        """
+        Returns the type of the panel created for a variable definition
+
+        :param variable_def_dict: A dict containing the information defining a variable
+        :return: One of the Panel.TYPE_* strings
+        """
+        if self.time_height:
+            return Panel.TYPE_TIMEHEIGHT
+        elif 'type' in variable_def_dict.keys():
+            return variable_def_dict['type']
+        return self.default_panel_type
 
     def __getTitles__(self, variable_def_dict, plotted_models_varname):
         """
@@ -883,6 +933,15 @@ class VariableGroup:
             It's useful for doing basic model to model conversions, e.g. SAM -> CLUBB.
         :return: A tuple containing the dependent_data for the variable, the height data, and the datasets
         """
+        if self.calc_graph is not None:
+            return self.calc_graph.getInput(self, varname, datasets, conversion_factor, self.readVarForCalculations)
+        return self.readVarForCalculations(varname, datasets, conversion_factor=conversion_factor)
+
+    def readVarForCalculations(self, varname, datasets, conversion_factor=1):
+        """
+        Reads a variable for calculations without going through the CalcGraph of the case.
+        See getVarForCalculations() for the parameters and the return value.
+        """
         if self.time_height or self.animation is not None:
             var_ncdf = NetCdfVariable(varname, datasets,
                                       independent_var_names={'time': Case_definitions.TIME_VAR_NAMES,
@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+
+# Case_definitions has to be imported before DataReader to resolve the circular import
+# config.Case_definitions -> config.VariableGroupBase -> src.VariableGroup -> src.DataReader
+from config import Case_definitions  # noqa: F401 (only imported for the import order)
+from src.AnimationPanel import AnimationPanel
+from src.Contour import Contour
+
+
+class AnimationPanelTest(unittest.TestCase):
+    def test_frames_are_rendered_in_memory_with_a_fixed_size(self):
+        minutes = np.arange(1.0, 13.0)
+        heights = np.linspace(0, 2500, 40)
+        plots = [Contour(minutes, heights, np.sin(heights[np.newaxis, :] / 400 + minutes[:, np.newaxis]),
+                         label='clubb_a'),
+                 Contour(minutes, heights, np.cos(heights[np.newaxis, :] / 500 + minutes[:, np.newaxis]),
+                         label='clubb_b')]
+        panel = AnimationPanel(plots, title='thlm', dependent_title='thlm [K]')
+        x_dataset, num_time_steps, filtered = panel.__alignTimeSteps__()
+
+        frames = list(panel.renderFrames(x_dataset, no_legends=False, alphabetic_id='a'))
+        self.assertEqual(num_time_steps, len(frames))
+        self.assertFalse(filtered)
+        self.assertEqual(1, len(set(frame.shape for frame in frames)))
+        self.assertEqual(3, frames[0].shape[2])
+        self.assertEqual(np.uint8, frames[0].dtype)
+        self.assertFalse(np.array_equal(frames[0], frames[1]))
+
+        # Rendering a subset of the time steps gives the same frames
+        np.testing.assert_array_equal(frames[5], next(panel.renderFrames(x_dataset, no_legends=False,
+                                                                         alphabetic_id='a', time_indices=[5])))
+
+        # Rendering the frames in chunks, as done for --movie-chunks, gives the same frames
+        chunk_frames = [frame for time_indices in np.array_split(np.arange(num_time_steps), 3)
+                        for frame in panel.renderFrames(x_dataset, no_legends=False, alphabetic_id='a',
+                                                        time_indices=time_indices)]
+        np.testing.assert_array_equal(np.array(frames), np.array(chunk_frames))
+
+    def test_time_steps_are_decimated_to_the_frame_budget(self):
+        minutes = np.arange(1.0, 61.0)
+        heights = np.linspace(0, 2500, 5)
+        data = minutes[:, np.newaxis] * np.ones((1, len(heights)))
+
+        panel = AnimationPanel([Contour(minutes, heights, data.copy(), label='clubb')], title='thlm')
+        frame_minutes = panel.__decimateTimeSteps__(minutes, frame_interval=10)
+        np.testing.assert_array_equal(np.arange(10.0, 61.0, 10), frame_minutes)
+        np.testing.assert_array_equal(frame_minutes, panel.all_plots[0].data[:, 0])
+
+        panel = AnimationPanel([Contour(minutes, heights, data.copy(), label='clubb')], title='thlm')
+        frame_minutes = panel.__decimateTimeSteps__(minutes, max_frames=4, average_frames=True)
+        np.testing.assert_array_equal([15, 30, 45, 60], frame_minutes)
+        np.testing.assert_allclose([8, 23, 38, 53], panel.all_plots[0].data[:, 0])
+
+        # Short simulations are not changed
+        self.assertIs(minutes, panel.__decimateTimeSteps__(minutes, max_frames=100))
+
+    def test_single_frame_keeps_the_axis_limits_of_all_time_steps(self):
+        minutes = np.arange(1.0, 61.0)
+        heights = np.linspace(0, 2500, 5)
+        data = minutes[:, np.newaxis] * np.ones((1, len(heights)))
+
+        panel = AnimationPanel([Contour(minutes, heights, data.copy(), label='clubb')], title='thlm')
+        x_limits = panel.__getFixedXLimits__()
+        for average_frames in [False, True]:
+            panel = AnimationPanel([Contour(minutes, heights, data.copy(), label='clubb')], title='thlm')
+            frame_minutes = panel.__decimateTimeSteps__(minutes, max_frames=1, average_frames=average_frames)
+            self.assertEqual(1, len(frame_minutes))
+            self.assertEqual(x_limits, panel.__getFixedXLimits__())
+            self.assertEqual(1, len(list(panel.renderFrames(frame_minutes))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import tempfile
+import unittest
+
+# Case_definitions has to be imported before DataReader to resolve the circular import
+# config.Case_definitions -> config.VariableGroupBase -> src.VariableGroup -> src.DataReader
+from config import Case_definitions  # noqa: F401 (only imported for the import order)
+import benchmark
+
+
+class PipelineBenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_data_stages_are_measured(self):
+        pipeline_benchmark = benchmark.PipelineBenchmark(self.temp_dir.name, num_levels=10, num_timesteps=20)
+        stages = [benchmark.STAGE_CASE_LOADING, benchmark.STAGE_VARIABLE_GROUPS, benchmark.STAGE_CALC_FUNCTIONS]
+        results = pipeline_benchmark.run(stages)
+
+        self.assertEqual(stages, [result['stage'] for result in results])
+        for result in results:
+            self.assertGreaterEqual(result['wall_time'], 0)
+            self.assertGreaterEqual(result['peak_memory'], 0)
+        # The _calc functions are restored after the run
+        for VarGroup in pipeline_benchmark.var_groups:
+            for function in VarGroup.__dict__.values():
+                self.assertFalse(hasattr(function, '__wrapped__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
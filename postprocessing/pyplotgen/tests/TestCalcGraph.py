@@ -0,0 +1,107 @@
+import ast
+import inspect
+import textwrap
+import unittest
+
+import numpy as np
+
+# Case_definitions has to be imported before the VariableGroups to resolve the circular import
+from config import Case_definitions  # noqa: F401 (only imported for the import order)
+from config.VariableGroupBase import VariableGroupBase
+from config.VariableGroupSamBudgets import VariableGroupSamBudgets
+from config.VariableGroupSamProfiles import VariableGroupSamProfiles
+from src.CalcGraph import CalcGraph, calcInputs, evaluateCalc
+
+
+class FakeVariableGroup:
+    def __init__(self, calc_graph):
+        self.calc_graph = calc_graph
+        self.time_height = False
+        self.animation = None
+        self.start_time = 0
+        self.end_time = 60
+        self.height_min_value = 0
+        self.height_max_value = 1000
+        self.calls = []
+
+    def getVarForCalculations(self, varname, datasets, conversion_factor=1):
+        return self.calc_graph.getInput(self, varname, datasets, conversion_factor, self.readVarForCalculations)
+
+    def readVarForCalculations(self, varname, datasets, conversion_factor=1):
+        self.calls.append(varname)
+        return np.full(3, datasets[varname] * conversion_factor), np.arange(3), datasets
+
+    @calcInputs('W2', 'WP2_SGS')
+    def getWp2Calc(self, dataset_override=None):
+        self.calls.append('getWp2Calc')
+        w2, z, dataset = self.getVarForCalculations('W2', dataset_override)
+        wp2_sgs, z, dataset = self.getVarForCalculations('WP2_SGS', dataset_override)
+        return w2 + wp2_sgs, z
+
+    @calcInputs(getWp2Calc, 'W2')
+    def getWp2ResolvedFractionCalc(self, dataset_override=None):
+        self.calls.append('getWp2ResolvedFractionCalc')
+        wp2, z = evaluateCalc(self.getWp2Calc, dataset_override)
+        w2, z, dataset = self.getVarForCalculations('W2', dataset_override)
+        return w2 / wp2, z
+
+    @calcInputs('W2')
+    def getUndeclaredReadCalc(self, dataset_override=None):
+        w2, z, dataset = self.getVarForCalculations('W2', dataset_override)
+        wp2_sgs, z, dataset = self.getVarForCalculations(['WP2_SGS'], dataset_override)
+        return w2 + wp2_sgs, z
+
+
+class CalcGraphTest(unittest.TestCase):
+    def test_inputs_and_declared_calcs_are_evaluated_once(self):
+        calc_graph = CalcGraph()
+        groups = [FakeVariableGroup(calc_graph), FakeVariableGroup(calc_graph)]
+        datasets = {'W2': 3.0, 'WP2_SGS': 1.0}
+
+        fraction, z = evaluateCalc(groups[0].getWp2ResolvedFractionCalc, datasets)
+        np.testing.assert_allclose(fraction, 0.75)
+        self.assertEqual(['getWp2Calc', 'W2', 'WP2_SGS', 'getWp2ResolvedFractionCalc'], groups[0].calls)
+
+        # Another group of the same case shares the results, and callers get their own copies
+        wp2, z = evaluateCalc(groups[1].getWp2Calc, datasets)
+        wp2[:] = 0
+        self.assertEqual([], groups[1].calls)
+        np.testing.assert_allclose(evaluateCalc(groups[1].getWp2Calc, datasets)[0], 4.0)
+
+    def test_undeclared_variable_reads_are_rejected(self):
+        group = FakeVariableGroup(CalcGraph())
+        self.assertRaises(ValueError, evaluateCalc, group.getUndeclaredReadCalc, {'W2': 3.0, 'WP2_SGS': 1.0})
+
+    def test_declared_inputs_match_the_config_calc_functions(self):
+        num_declared = 0
+        for VarGroup in [VariableGroupBase, VariableGroupSamBudgets, VariableGroupSamProfiles]:
+            for function in VarGroup.__dict__.values():
+                declared_variables = CalcGraph.getDeclaredVariables(function)
+                if declared_variables is None:
+                    continue
+                num_declared += 1
+                tree = ast.parse(textwrap.dedent(inspect.getsource(function)))
+                read_variables = set(CalcGraph.__getVarnameKey__(ast.literal_eval(node.args[0]))
+                                     for node in ast.walk(tree) if isinstance(node, ast.Call)
+                                     and getattr(node.func, 'attr', None) == 'getVarForCalculations')
+                self.assertSetEqual(declared_variables, read_variables, function.__qualname__)
+        self.assertGreater(num_declared, 0)
+
+    def test_evaluation_order_follows_dependencies(self):
+        self.assertEqual([FakeVariableGroup.getWp2Calc, FakeVariableGroup.getWp2ResolvedFractionCalc],
+                         CalcGraph.getEvaluationOrder(FakeVariableGroup.getWp2ResolvedFractionCalc))
+
+    def test_dependency_cycles_are_rejected(self):
+        def getFirstCalc(self, dataset_override=None):
+            return None
+
+        @calcInputs(getFirstCalc)
+        def getSecondCalc(self, dataset_override=None):
+            return None
+
+        calcInputs(getSecondCalc)(getFirstCalc)
+        self.assertRaises(ValueError, CalcGraph.getEvaluationOrder, getSecondCalc)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,15 @@
+import os
+import tempfile
 import unittest
 
 import numpy as np
+from netCDF4 import Dataset
 
-from src.DataReader import DataReader
+# Case_definitions has to be imported before DataReader to resolve the circular import
+# config.Case_definitions -> config.VariableGroupBase -> src.VariableGroup -> src.DataReader
+from config import Case_definitions
+from src.DataReader import DataReader, NetCdfVariable
+from src.DatasetCache import getSharedArrayCache
 
 
 class DataReaderTest(unittest.TestCase):
@@ -36,6 +43,87 @@ class DataReaderTest(unittest.TestCase):
         rand_array_actual_time_avg_partial = datareader.__meanProfiles__(random_array, idx_t0=1, idx_t1=3).tolist()
         self.assertListEqual(rand_array_expected_time_avg_partial, rand_array_actual_time_avg_partial)
 
+    def test_start_end_index(self):
+        ascending = np.array([1., 2., 3., 4., 5.])
+        self.assertEqual((1, 3), DataReader.__getStartEndIndex__(ascending, 2, 3))
+        self.assertEqual((1, 2), DataReader.__getStartEndIndex__(ascending, 1.5, 2.5))
+        # If the first value above end_value is the last value, the whole rest of the array is included
+        self.assertEqual((3, 5), DataReader.__getStartEndIndex__(ascending, 4, 4.5))
+
+        descending = ascending[::-1]
+        self.assertEqual((2, 4), DataReader.__getStartEndIndex__(descending, 2, 3))
+
+        self.assertEqual((0, 1), DataReader.__getStartEndIndex__(np.array([7.]), 2, 3))
+
+    def test_start_end_index_matches_linear_scan(self):
+        rng = np.random.default_rng(0)
+        for _ in range(500):
+            data = np.cumsum(rng.integers(0, 3, size=rng.integers(2, 12))).astype(float)
+            if rng.random() < 0.5:
+                data = data[::-1]
+            if rng.random() < 0.1:
+                rng.shuffle(data)
+            start_value, end_value = np.sort(rng.integers(-1, data.max() + 2, size=2).astype(float))
+            self.assertEqual(DataReader.__scanStartEndIndex__(data, start_value, end_value),
+                             DataReader.__getStartEndIndex__(data, start_value, end_value))
+
+    def test_start_end_index_cache(self):
+        data = np.arange(10.)
+        data.flags.writeable = False
+        self.assertEqual((2, 5), DataReader.__getStartEndIndex__(data, 2, 4))
+        self.assertEqual((2, 5), DataReader.__getStartEndIndex__(data, 2, 4))
+        self.assertEqual((3, 5), DataReader.__getStartEndIndex__(data, 3, 4))
+
+    def test_time_slice_matches_full_read(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, "case_zt.nc")
+            dataset = Dataset(filename, "w", format="NETCDF4")
+            for dimension, size in [('time', 6), ('altitude', 4), ('latitude', 1), ('longitude', 1)]:
+                dataset.createDimension(dimension, size)
+            dataset.createVariable('time', 'f8', ('time',))[:] = np.arange(1, 7) * 60
+            dataset.createVariable('thlm', 'f8', ('time', 'altitude', 'latitude', 'longitude'))[:] = \
+                np.arange(24.).reshape(6, 4, 1, 1)
+            dataset.close()
+
+            datareader = DataReader()
+            dataset = datareader.__loadNcFile__(filename)
+            self.assertTrue(DataReader.__hasLeadingTimeAxis__(dataset, 'thlm', 'time'))
+            self.assertFalse(DataReader.__hasLeadingTimeAxis__(dataset, 'time', 'time'))
+            for time_slice in [slice(1, 4), slice(5, 6)]:
+                window = datareader.__getValuesFromNc__(dataset, 'thlm', 2, time_slice=time_slice)
+                np.testing.assert_array_equal(np.arange(24.).reshape(6, 4)[time_slice] * 2, window)
+            full = datareader.__getValuesFromNc__(dataset, 'thlm', 2)
+            window = datareader.__getValuesFromNc__(dataset, 'thlm', 2, time_slice=slice(1, 4))
+            self.assertTrue(np.shares_memory(full, window))
+            getSharedArrayCache().discard(dataset)
+            datareader.cleanup()
+
+    def test_time_height_data_is_writeable(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, "case_zt.nc")
+            dataset = Dataset(filename, "w", format="NETCDF4")
+            for dimension, size in [('time', 6), ('altitude', 4), ('latitude', 1), ('longitude', 1)]:
+                dataset.createDimension(dimension, size)
+            dataset.createVariable('time', 'f8', ('time',))[:] = np.arange(1, 7)
+            dataset.variables['time'].units = 'minutes'
+            dataset.createVariable('altitude', 'f8', ('altitude',))[:] = np.arange(4) * 100.
+            dataset.createVariable('wpthlp', 'f8', ('time', 'altitude', 'latitude', 'longitude'))[:] = \
+                np.arange(24.).reshape(6, 4, 1, 1)
+            dataset.close()
+
+            datareader = DataReader()
+            dataset = datareader.__loadNcFile__(filename)
+            independent_var_names = {'time': Case_definitions.TIME_VAR_NAMES,
+                                     'height': Case_definitions.HEIGHT_VAR_NAMES}
+            for _ in range(2):
+                # Time-height calcs add the subgrid fluxes in place, which must not change the cached array
+                wpthlp = NetCdfVariable('wpthlp', dataset, independent_var_names=independent_var_names,
+                                        start_time=0, end_time=6, avg_axis=2).dependent_data
+                wpthlp += 1
+                np.testing.assert_array_equal(np.arange(24.).reshape(6, 4) + 1, wpthlp)
+            getSharedArrayCache().discard(dataset)
+            datareader.cleanup()
+
 
 if __name__ == '__main__':
     unittest.main()
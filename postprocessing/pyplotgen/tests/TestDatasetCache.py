@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from netCDF4 import Dataset
+
+from src.DatasetCache import ArrayCache, DatasetCache
+
+
+class DatasetCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filenames = []
+        for i in range(3):
+            filename = os.path.join(self.temp_dir.name, "case" + str(i) + "_zt.nc")
+            dataset = Dataset(filename, "w", format="NETCDF4")
+            dataset.createDimension('time', 2)
+            dataset.createVariable('time', 'f8', ('time',))[:] = [60, 120]
+            dataset.close()
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_same_file_is_opened_once(self):
+        cache = DatasetCache()
+        first = cache.acquire(self.filenames[0])
+        second = cache.acquire(os.path.join(self.temp_dir.name, ".", "case0_zt.nc"))
+        self.assertIs(first, second)
+        self.assertEqual(1, len(cache))
+        cache.clear()
+
+    def test_unreferenced_datasets_are_evicted_lru(self):
+        cache = DatasetCache(max_open=2)
+        datasets = [cache.acquire(filename) for filename in self.filenames]
+        # Everything is still referenced, so nothing may be closed
+        self.assertEqual(3, len(cache))
+        self.assertTrue(all(dataset.isopen() for dataset in datasets))
+
+        cache.release(datasets[1])
+        self.assertEqual(2, len(cache))
+        self.assertFalse(datasets[1].isopen())
+        self.assertTrue(datasets[0].isopen())
+        cache.clear()
+
+    def test_modified_file_is_reopened(self):
+        cache = DatasetCache()
+        old_dataset = cache.acquire(self.filenames[0])
+        cache.release(old_dataset)
+        stat = os.stat(self.filenames[0])
+        os.utime(self.filenames[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        new_dataset = cache.acquire(self.filenames[0])
+        self.assertIsNot(old_dataset, new_dataset)
+        self.assertFalse(old_dataset.isopen())
+        self.assertEqual(1, len(cache))
+        cache.clear()
+
+
+class ArrayCacheTest(unittest.TestCase):
+    def test_arrays_are_shared_and_read_only(self):
+        cache = ArrayCache()
+        dataset = object()
+        values = np.arange(4.0)
+        cache.put(dataset, 'rcm', 1, values)
+        self.assertIs(values, cache.get(dataset, 'rcm', 1))
+        self.assertIsNone(cache.get(dataset, 'rcm', 1000))
+        self.assertIsNone(cache.get(object(), 'rcm', 1))
+        with self.assertRaises(ValueError):
+            values[0] = 1
+
+    def test_memory_budget_evicts_lru(self):
+        cache = ArrayCache(max_bytes=2 * np.arange(4.0).nbytes)
+        dataset = object()
+        for varname in ['rcm', 'wp2', 'thlm']:
+            cache.put(dataset, varname, 1, np.arange(4.0))
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(dataset, 'rcm', 1))
+        self.assertIsNotNone(cache.get(dataset, 'thlm', 1))
+
+        cache.discard(dataset)
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.cached_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src import MovieEncoder as movie_encoder
+from src.MovieEncoder import MovieEncoder
+
+
+class MovieEncoderTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_no_segments_cannot_be_joined(self):
+        filename = os.path.join(self.temp_dir.name, "movie.mp4")
+        with self.assertRaises(ValueError):
+            MovieEncoder.concatenate([], filename, ".mp4", 2)
+        self.assertFalse(os.path.exists(filename))
+
+    @unittest.skipIf(movie_encoder.cv2 is None, "opencv-python is not installed")
+    def test_opencv_writer_that_cannot_be_opened_raises(self):
+        filename = os.path.join(self.temp_dir.name, "missing_folder", "movie.mp4")
+        encoder = MovieEncoder(filename, ".mp4", 2, backend=movie_encoder.BACKEND_OPENCV)
+        with self.assertRaises(RuntimeError):
+            encoder.write(np.zeros((16, 16, 3), dtype=np.uint8))
+        encoder.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+# Case_definitions has to be imported before DataReader to resolve the circular import
+# config.Case_definitions -> config.VariableGroupBase -> src.VariableGroup -> src.DataReader
+from config import Case_definitions
+from config.VariableGroupBase import VariableGroupBase
+from src.Line import Line
+from src.Panel import Panel
+from src.PanelDataCache import PanelDataCache
+
+
+class PanelDataCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = PanelDataCache(os.path.join(self.temp_dir.name, "cache"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_panels_round_trip(self):
+        line = Line(np.arange(3.), np.arange(3.) * 10, label="current clubb")
+        panel = Panel([line], None, None, 0, 0, title="thlm", dependent_title="thlm [K]")
+        key = self.cache.getKey('group', VariableGroupBase, {'name': 'bomex'})
+        self.assertIsNone(self.cache.get(key))
+
+        self.cache.put(key, [panel])
+        cached_panels = self.cache.get(key)
+        self.assertEqual(1, len(cached_panels))
+        self.assertEqual("thlm", cached_panels[0].title)
+        np.testing.assert_array_equal(line.y, cached_panels[0].all_plots[0].y)
+
+    def test_key_depends_on_input_files(self):
+        filename = os.path.join(self.temp_dir.name, "bomex_zt.nc")
+        with open(filename, 'w') as input_file:
+            input_file.write("old")
+        old_key = self.cache.getKey(Case_definitions.BOMEX, [PanelDataCache.getFileFingerprint(filename)])
+        self.assertEqual(old_key, self.cache.getKey(Case_definitions.BOMEX,
+                                                    [PanelDataCache.getFileFingerprint(filename)]))
+
+        with open(filename, 'w') as input_file:
+            input_file.write("new data")
+        self.assertNotEqual(old_key, self.cache.getKey(Case_definitions.BOMEX,
+                                                       [PanelDataCache.getFileFingerprint(filename)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
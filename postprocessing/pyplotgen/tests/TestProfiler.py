@@ -0,0 +1,48 @@
+import tempfile
+import unittest
+
+from src.Profiler import CATEGORY_CALC, CATEGORY_CASE, CATEGORY_VARIABLE, Profiler
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_disabled_profiler_records_nothing(self):
+        profiler = Profiler()
+        with profiler.measure(CATEGORY_CASE, 'bomex'):
+            profiler.addBytesRead(100)
+        self.assertEqual([], profiler.records)
+
+    def test_nested_records_are_aggregated_across_processes(self):
+        profilers = [Profiler(), Profiler()]
+        for profiler in profilers:
+            profiler.enable(self.temp_dir.name)
+        with profilers[0].measure(CATEGORY_CASE, 'bomex'):
+            with profilers[0].measure(CATEGORY_VARIABLE, 'VariableGroupBase.thlm'):
+                profilers[0].addBytesRead(100)
+                with profilers[0].measure(CATEGORY_CALC, 'VariableGroupBase.getThlmSamCalc'):
+                    profilers[0].addBytesRead(20)
+        with profilers[1].measure(CATEGORY_VARIABLE, 'VariableGroupBase.thlm', casename='arm'):
+            profilers[1].addBytesRead(1)
+        # Both profilers live in this process, so they append to the same records file
+        for profiler in profilers:
+            profiler.flush()
+
+        records = Profiler.readRecords(self.temp_dir.name)
+        self.assertEqual(4, len(records))
+        summary = {(entry['category'], entry['name']): entry for entry in Profiler.summarize(records)}
+        self.assertEqual(120, summary[(CATEGORY_CASE, 'bomex')]['bytes_read'])
+        self.assertEqual(20, summary[(CATEGORY_CALC, 'VariableGroupBase.getThlmSamCalc')]['bytes_read'])
+        variable_entry = summary[(CATEGORY_VARIABLE, 'VariableGroupBase.thlm')]
+        self.assertEqual(2, variable_entry['count'])
+        self.assertEqual(121, variable_entry['bytes_read'])
+        self.assertEqual({'bomex', 'arm'}, set(record['case'] for record in records
+                                               if record['category'] == CATEGORY_VARIABLE))
+
+
+if __name__ == '__main__':
+    unittest.main()
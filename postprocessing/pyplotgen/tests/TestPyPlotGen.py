@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+
+from pyplotgen import PyPlotGen
+
+
+class PdfImageFilenamesTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_folder = os.path.join(self.temp_dir.name, "output")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def __createPyPlotGen__(self, extra_image_extensions):
+        pyplotgen = PyPlotGen(self.output_folder, clubb_folders=[self.temp_dir.name], e3sm_folders=[],
+                              sam_folders=[], wrf_folders=[], cam_folders=[], replace=True,
+                              extra_image_extensions=extra_image_extensions)
+        case_folder = os.path.join(pyplotgen.output_folder, "bomex")
+        os.mkdir(case_folder)
+        for filename in ["a.png", "a.svg", "b.png", "b.svg", "index.html"]:
+            open(os.path.join(case_folder, filename), 'w').close()
+        return pyplotgen
+
+    def test_extra_formats_are_not_printed(self):
+        pyplotgen = self.__createPyPlotGen__(['.svg'])
+        filenames = [os.path.basename(filename) for filename in pyplotgen.__getPdfImageFilenames__("bomex")]
+        self.assertListEqual(["a.png", "b.png"], filenames)
+
+    def test_extra_format_equal_to_gallery_format_is_printed(self):
+        pyplotgen = self.__createPyPlotGen__(['.png', '.svg'])
+        filenames = [os.path.basename(filename) for filename in pyplotgen.__getPdfImageFilenames__("bomex")]
+        self.assertListEqual(["a.png", "b.png"], filenames)
+
+
+if __name__ == '__main__':
+    unittest.main()
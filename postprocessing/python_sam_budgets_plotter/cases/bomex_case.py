@@ -45,6 +45,9 @@ out_pdf = '{case}_{dx}x{dx}_{{type}}_{{date}}.pdf'.format(case=case.lower(),dx=n
 sam_file = '/home/sdomke/workspace/clubb/avi_out/grid_change/BOMEX_64x64x75_100m_40m_1s.nc'
 # nc file generated from .bin3D output
 sam_3d_file = '/home/sdomke/workspace/clubb/avi_out/out3d/BOMEX_64x64x75_100m_40m_1s_64_0000021600.nc'
+# Glob of 3D snapshots to average the cloud conditional profiles over, processed by nprocs processes
+#sam_3d_files = '/home/sdomke/workspace/clubb/avi_out/out3d/BOMEX_64x64x75_100m_40m_1s_64_*.nc'
+#nprocs = 8
 
 # nc files for publishing runs with bigger horizontal grid (256x256):
 out_dir = '/home/sdomke/workspace/plotgen_out/publishing_runs/{case}_{{date}}/'.format(case=case.lower())
@@ -10,9 +10,13 @@ import os
 import sys
 import re
 import logging
+import multiprocessing
 from datetime import datetime as dt
 import numpy as np
-from scipy.ndimage.morphology import binary_dilation as bin_dilation
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None
 import matplotlib as mpl
 from matplotlib import pyplot as mpp
 import matplotlib.animation as manim
@@ -27,6 +31,23 @@ import plot_budgets as pb
 import OutputWriter as ow
 from plot_defs import *
 
+#--------------------
+# LOGGER
+#--------------------
+logger = logging.getLogger('plotgen.help.p3d')
+#logger.setLevel(logging.INFO)
+logger.setLevel(logging.DEBUG)
+#logger.setLevel(logging.CRITICAL)
+
+#--------------------
+# DEFINITIONS
+#--------------------
+# Fields of which cloud conditional profiles are computed
+conditional_fields = ('uw', 'vw', 'wq', 'u', 'v', 'w')
+# Cloud conditional masks: cloud, halo around the cloud, environment outside of cloud and halo,
+# and the dilated cloud consisting of cloud and halo
+conditional_masks = ('cld', 'halo', 'nocld', 'dilated')
+
 def generate_cmap(data, cmapName, maxCol='g', minCol='r', zeroCol='w', N=1000, quant=0, interpol=None):
     """
     Function generating segmented colormap from data array
@@ -89,6 +110,340 @@ def generate_meshgrids(d, skip):
     return (fullGrid, skipGrid)
 
 
+def get_dilation_length(dil_len):
+    """
+    Function restricting the dilation length of cloud masks to [1,5]
+    """
+    return min(5,max(1,dil_len))
+
+def dilate_cloud_mask(cld_mask, dil_len, periodic=True):
+    """
+    Function dilating a cloud mask into clouds with halos.
+    The dilation kernel contains all points within a taxicab distance of dil_len,
+    i.e. it is a stack of crosses, which grow by one point per level from the outermost levels to the center level.
+    This is the same as dil_len dilations with the 6 direct neighbours of a point, which is how the dilation is done:
+    with scipy.ndimage if it is available, otherwise with numpy shifts.
+    Input:
+    cld_mask - Boolean array of shape (z,x,y)
+    dil_len - Dilation length in grid points, restricted to [1,5]
+    periodic - If True, the mask is dilated across the lateral boundaries like SAM's doubly periodic domain.
+        Vertically, points outside of the mask are never cloudy.
+    Output:
+    Dilated boolean array of shape (z,x,y)
+    """
+    dil_len = get_dilation_length(dil_len)
+    if ndimage is not None:
+        structure = ndimage.generate_binary_structure(3, 1)
+        if not periodic:
+            return ndimage.binary_dilation(cld_mask, structure, iterations=dil_len)
+        # Surround the domain by its periodic continuation, which is cut off after the dilation
+        padded = np.pad(cld_mask, ((0,0),(dil_len,dil_len),(dil_len,dil_len)), mode='wrap')
+        dilated = ndimage.binary_dilation(padded, structure, iterations=dil_len)
+        return dilated[:,dil_len:-dil_len,dil_len:-dil_len]
+    dilated = np.array(cld_mask, dtype=bool)
+    for i in range(dil_len):
+        grown = dilated.copy()
+        grown[1:] |= dilated[:-1]
+        grown[:-1] |= dilated[1:]
+        if periodic:
+            for axis in (1,2):
+                grown |= np.roll(dilated, 1, axis=axis)
+                grown |= np.roll(dilated, -1, axis=axis)
+        else:
+            grown[:,1:] |= dilated[:,:-1]
+            grown[:,:-1] |= dilated[:,1:]
+            grown[:,:,1:] |= dilated[:,:,:-1]
+            grown[:,:,:-1] |= dilated[:,:,1:]
+        dilated = grown
+    return dilated
+
+def get_cloud_masks(qn, dil_len, below=0, above=0, periodic=True):
+    """
+    Function generating the cloud mask and the dilated cloud mask (cloud + halo) from cloud water.
+    Input:
+    qn - Cloud water array of shape (z,x,y)
+    dil_len - Dilation length, see dilate_cloud_mask
+    below, above - Number of additional levels at the bottom and top of qn, which are only used for the dilation of
+        the levels in between. If qn is part of a larger field, these should be the dilation length or reach the
+        bottom/top of the field, in order to get the same masks as for the whole field.
+    periodic - Dilate across the lateral boundaries, see dilate_cloud_mask
+    Output:
+    (cld_mask, dilated_mask) - Boolean arrays for the levels of qn without the additional levels
+    """
+    cld_mask = qn>cld_lim
+    dilated_mask = dilate_cloud_mask(cld_mask, dil_len, periodic)
+    top = cld_mask.shape[0]-above
+    return cld_mask[below:top], dilated_mask[below:top]
+
+def interpolate_staggered(u, v, w):
+    """
+    Function interpolating the wind components from the staggered grid of SAM onto the grid of the scalar fields.
+    Each value is averaged with its successor along the component's direction. The last entries cannot be averaged
+    and are set to NAN.
+    Input:
+    u, v, w - Wind component arrays of shape (z,x,y). w may contain one additional level on top,
+        which is used for averaging the last level of the output.
+    Output:
+    (u, v, w) - Interpolated arrays of shape (z,x,y), where z is the number of levels of u
+    """
+    nz = u.shape[0]
+    u_int = np.full(u.shape, np.nan)
+    v_int = np.full(v.shape, np.nan)
+    w_int = np.full(u.shape, np.nan)
+    u_int[:,:-1] = (u[:,:-1]+u[:,1:])/2.
+    v_int[:,:,:-1] = (v[:,:,:-1]+v[:,:,1:])/2.
+    w_int[:w.shape[0]-1] = (w[:-1]+w[1:])[:nz]/2.
+    return u_int, v_int, w_int
+
+def conditional_means(fields, masks):
+    """
+    Function computing the means of many fields over the points of many masks on every level in one pass,
+    ignoring NAN values. The sums over the points of a mask are vector-matrix products, and the fields are
+    processed one level at a time, so that all temporary arrays have the size of a single level.
+    Input:
+    fields - Dictionary of arrays of shape (z,x,y)
+    masks - Dictionary of boolean arrays of shape (z,x,y)
+    Output:
+    (means, counts) - Dictionaries of arrays of shape (z,) with keys <field>_<mask>, containing the means,
+        NAN where there are no valid points, and the numbers of valid points the means were taken over
+    """
+    field_names = sorted(fields)
+    mask_names = sorted(masks)
+    nz = fields[field_names[0]].shape[0]
+    # (z, masks, fields)
+    sums = np.zeros((nz, len(mask_names), len(field_names)))
+    cnts = np.zeros((nz, len(mask_names), len(field_names)))
+    for k in range(nz):
+        # (points, fields)
+        values = np.stack([np.ravel(fields[f][k]) for f in field_names], axis=1)
+        valid = np.logical_not(np.isnan(values))
+        values[~valid] = 0
+        valid = valid.astype(values.dtype)
+        for j, m in enumerate(mask_names):
+            selection = np.ravel(masks[m][k])
+            sums[k,j] = np.matmul(selection, values)
+            cnts[k,j] = np.matmul(selection, valid)
+    means = np.full(sums.shape, np.nan)
+    np.divide(sums, cnts, out=means, where=cnts>0)
+    cnts = cnts.astype(int)
+    result = {}
+    result_cnts = {}
+    for j, m in enumerate(mask_names):
+        for k, f in enumerate(field_names):
+            result[f+'_'+m] = means[:,j,k]
+            result_cnts[f+'_'+m] = cnts[:,j,k]
+    return result, result_cnts
+
+def get_conditional_profiles(qn, qv, u, v, w, cld_mask, dilated_mask):
+    """
+    Function computing the level statistics of a 3d snapshot, in particular cloud conditional profiles.
+    As every profile entry only depends on its level, the fields may also be slabs of consecutive levels
+    of a larger snapshot, and the profiles of all slabs can be concatenated.
+    Input:
+    qn, qv - Cloud water and water vapor arrays of shape (z,x,y)
+    u, v, w - Wind component arrays of shape (z,x,y), interpolated onto the scalar grid (see interpolate_staggered)
+    cld_mask, dilated_mask - Cloud mask and dilated cloud mask, see get_cloud_masks
+    Output:
+    Dictionary of arrays of shape (z,):
+    um, vm, wm, qm - Horizontal means of u, v, w, qt
+    up2, vp2 - Horizontal means of u'^2 and v'^2
+    cloud_frac - Fraction of cloudy points
+    cld_cnt, halo_cnt, nocld_cnt, dilated_cnt - Number of points in cloud, halo, environment and cloud+halo
+    <field>_<mask> - Mean of field over the points of mask, for all conditional_fields and conditional_masks
+    <field>_<mask>_cnt - Number of points of mask at which field is valid, i.e. the points <field>_<mask> is taken over
+    """
+    qt = qn+qv
+    halo_mask = np.logical_xor(dilated_mask, cld_mask)
+    nocld_mask = np.logical_not(dilated_mask)
+    masks = {'cld': cld_mask, 'halo': halo_mask, 'nocld': nocld_mask, 'dilated': dilated_mask}
+    profiles = {
+        'um': np.nanmean(u, axis=(1,2)),
+        'vm': np.nanmean(v, axis=(1,2)),
+        'wm': np.nanmean(w, axis=(1,2)),
+        'qm': np.nanmean(qt, axis=(1,2)),
+        'cloud_frac': cld_mask.mean(axis=(1,2)),
+        }
+    # Perturbations and fluxes
+    up = u - profiles['um'][:,None,None]
+    vp = v - profiles['vm'][:,None,None]
+    wp = w - profiles['wm'][:,None,None]
+    qp = qt - profiles['qm'][:,None,None]
+    profiles['up2'] = np.nanmean(up*up, axis=(1,2))
+    profiles['vp2'] = np.nanmean(vp*vp, axis=(1,2))
+    fields = {'uw': up*wp, 'vw': vp*wp, 'wq': wp*qp, 'u': u, 'v': v, 'w': w}
+    for m in conditional_masks:
+        profiles[m+'_cnt'] = masks[m].sum(axis=(1,2))
+    means, cnts = conditional_means(fields, masks)
+    profiles.update(means)
+    profiles.update({key+'_cnt': cnt for key, cnt in cnts.items()})
+    return profiles
+
+def read_3d_levels(nc, varname, k0, k1, conversion=1., filler=np.nan):
+    """
+    Function reading height levels k0 to k1 (exclusive) of a variable from a SAM 3d netcdf file.
+    Only these levels are read from the file.
+    Input:
+    nc - Dataset of the 3d file
+    varname - Variable name in the netcdf file
+    k0, k1 - Level boundaries
+    conversion - Conversion factor
+    filler - Value replacing invalid data
+    Output:
+    Array of shape (k1-k0,x,y)
+    """
+    var = nc.variables[varname]
+    # The height dimension is the third to last, possibly preceded by a time dimension of length 1
+    idx = [0]*(var.ndim-3) + [slice(k0,k1), slice(None), slice(None)]
+    data = np.asarray(var[tuple(idx)], dtype=float)*conversion
+    if np.any(np.isnan(data)) or np.any(data <= -1000):
+        logger.warning("Invalid data in variable %s.", varname)
+        data = np.where(np.logical_or(np.isnan(data), data<=-1000), filler, data)
+    return data
+
+def stream_conditional_profiles(nc, varnames, h0, h1, dil_len=1, slab_size=default_slab_size, filler=np.nan, periodic=True):
+    """
+    Function computing the level statistics of a SAM 3d snapshot (see get_conditional_profiles) slab by slab.
+    Only slab_size levels of every field, and additionally the cloud water within the dilation length
+    above and below the slab, are held in memory at a time, so snapshots of big grids can be processed.
+    The results are the same as for the whole field between levels h0 and h1.
+    Input:
+    nc - Dataset of the 3d file
+    varnames - Dictionary mapping qn, qv, u, v, w to (variable name, conversion factor) in the 3d file
+    h0, h1 - Height level boundaries
+    dil_len - Dilation length of the cloud mask, see dilate_cloud_mask
+    slab_size - Number of levels processed at a time
+    filler - Value replacing invalid data
+    periodic - Dilate the cloud mask across the lateral boundaries, see dilate_cloud_mask
+    Output:
+    (profiles, dims) - Dictionary of profiles of shape (h1-h0,) as returned by get_conditional_profiles,
+        shape of the 3d fields between h0 and h1 (z,x,y)
+    """
+    logger.info('stream_conditional_profiles')
+    # Levels needed below and above a slab to dilate the cloud mask
+    reach = get_dilation_length(dil_len)
+    profiles = {}
+    dims = None
+    for k0 in range(h0, h1, max(1,slab_size)):
+        k1 = min(k0+max(1,slab_size), h1)
+        logger.info('Processing levels %d to %d', k0, k1-1)
+        m0 = max(h0, k0-reach)
+        m1 = min(h1, k1+reach)
+        qn = read_3d_levels(nc, varnames['qn'][0], m0, m1, varnames['qn'][1], filler)
+        cld_mask, dilated_mask = get_cloud_masks(qn, dil_len, k0-m0, m1-k1, periodic)
+        qn = qn[k0-m0:k1-m0]
+        qv = read_3d_levels(nc, varnames['qv'][0], k0, k1, varnames['qv'][1], filler)
+        u = read_3d_levels(nc, varnames['u'][0], k0, k1, varnames['u'][1], filler)
+        v = read_3d_levels(nc, varnames['v'][0], k0, k1, varnames['v'][1], filler)
+        # w on the level above the slab is needed for interpolation
+        w = read_3d_levels(nc, varnames['w'][0], k0, min(h1,k1+1), varnames['w'][1], filler)
+        u, v, w = interpolate_staggered(u, v, w)
+        slab = get_conditional_profiles(qn, qv, u, v, w, cld_mask, dilated_mask)
+        if dims is None:
+            dims = (h1-h0,) + qn.shape[1:]
+            for key in slab:
+                profiles[key] = np.empty(h1-h0, dtype=slab[key].dtype)
+        for key in slab:
+            profiles[key][k0-h0:k1-h0] = slab[key]
+    return profiles, dims
+
+def process_snapshot(args):
+    """
+    Function computing the conditional profiles of one SAM 3d snapshot and saving them to a result file.
+    Takes a single tuple of arguments, so it can be mapped over a process pool.
+    Input:
+    args - Tuple (nc_file, out_file, varnames, h0, h1, dil_len, slab_size, filler),
+        nc_file is the name of the 3d file, out_file the name of the .npz result file,
+        the other arguments are passed to stream_conditional_profiles
+    Output:
+    out_file - Name of the result file, which contains the profiles and dims
+    """
+    nc_file, out_file, varnames, h0, h1, dil_len, slab_size, filler = args
+    logger.info('Processing snapshot %s', nc_file)
+    nc = Dataset(nc_file, 'r')
+    try:
+        profiles, dims = stream_conditional_profiles(nc, varnames, h0, h1, dil_len=dil_len, slab_size=slab_size, filler=filler)
+    finally:
+        nc.close()
+    np.savez(out_file, dims=np.array(dims), **profiles)
+    return out_file
+
+def process_snapshots(nc_files, out_dir, varnames, h0, h1, dil_len=1, slab_size=default_slab_size, filler=np.nan, nprocs=None):
+    """
+    Function computing the conditional profiles of many SAM 3d snapshots in parallel.
+    Every snapshot is processed by one process of a pool, reading slab_size levels at a time (see stream_conditional_profiles),
+    and its profiles are saved to out_dir/<index>_<snapshot name>.npz. The index of the snapshot in nc_files
+    keeps the result files apart if snapshots in different directories have the same name.
+    Input:
+    nc_files - Names of the 3d files
+    out_dir - Directory of the result files
+    varnames, h0, h1, dil_len, slab_size, filler - See stream_conditional_profiles
+    nprocs - Number of processes, defaults to the number of CPUs
+    Output:
+    List of result file names in the order of nc_files
+    """
+    logger.info('process_snapshots')
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    tasks = []
+    for i, nc_file in enumerate(nc_files):
+        out_name = '{:04d}_{}.npz'.format(i, os.path.splitext(os.path.basename(nc_file))[0])
+        out_file = os.path.join(out_dir, out_name)
+        tasks.append((nc_file, out_file, varnames, h0, h1, dil_len, slab_size, filler))
+    nprocs = min(nprocs or multiprocessing.cpu_count(), len(tasks))
+    if nprocs <= 1:
+        return [process_snapshot(task) for task in tasks]
+    logger.info('Processing %d snapshots with %d processes', len(tasks), nprocs)
+    pool = multiprocessing.Pool(nprocs)
+    try:
+        # One snapshot per task, as snapshots take long compared to the communication
+        out_files = pool.map(process_snapshot, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return out_files
+
+def average_profiles(out_files):
+    """
+    Function reducing the conditional profiles of many snapshots to time averages.
+    Conditional means (<field>_<mask>) are weighted with the number of valid points they were taken over
+    in every snapshot (<field>_<mask>_cnt), so they are the means over all valid masked points of all snapshots.
+    All other profiles are averaged over the snapshots.
+    Levels without valid data in a snapshot are ignored.
+    Input:
+    out_files - Names of result files written by process_snapshot, of snapshots with the same grid
+    Output:
+    (profiles, dims) - Dictionary of averaged profiles with the keys of get_conditional_profiles, shape of the 3d fields
+    """
+    logger.info('average_profiles')
+    sums = {}
+    weights = {}
+    dims = None
+    for out_file in out_files:
+        result = np.load(out_file)
+        if dims is None:
+            dims = tuple(result['dims'])
+        elif tuple(result['dims']) != dims:
+            raise ValueError('Snapshot {} has shape {} instead of {}'.format(out_file, tuple(result['dims']), dims))
+        for key in result.files:
+            if key == 'dims':
+                continue
+            profile = result[key].astype(float)
+            mask_name = key.split('_')[-1]
+            if mask_name in conditional_masks and not key.endswith('_cnt'):
+                weight = result[key+'_cnt'].astype(float)
+            else:
+                weight = np.ones(profile.shape)
+            weight[np.isnan(profile)] = 0
+            sums[key] = sums.get(key, 0) + np.where(weight>0, profile*weight, 0)
+            weights[key] = weights.get(key, 0) + weight
+        result.close()
+    profiles = {}
+    for key in sums:
+        profiles[key] = np.full(sums[key].shape, np.nan)
+        np.divide(sums[key], weights[key], out=profiles[key], where=weights[key]>0)
+    return profiles, dims
+
+
 #def plot_3d(plots, cf, data, h, h_limits, h_extent, prm_vars, fps=2, dil_len=1, gif=False):
 def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False):
     """
@@ -126,54 +481,16 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
     #logger.debug('uw_2d = %s',uw_2d)
     #logger.debug('vw_2d = %s',vw_2d)
     # interolate on the stupid s-grid
-    u_3d = np.cumsum(u_3d,axis=1)
-    v_3d = np.cumsum(v_3d,axis=2)
-    w_3d = np.cumsum(w_3d,axis=0)
-    u_3d[:,2:] = u_3d[:,2:] - u_3d[:,:-2]
-    v_3d[:,:,2:] = v_3d[:,:,2:] - v_3d[:,:,:-2]
-    w_3d[2:] = w_3d[2:] - w_3d[:-2]
-    u_3d[:,:-1] = u_3d[:,1:]/2.
-    v_3d[:,:,:-1] = v_3d[:,:,1:]/2.
-    w_3d[:-1] = w_3d[1:]/2.
-    # Set last entries to 0 or NAN, as they cannot b running averaged
-    u_3d[:,-1] = np.nan
-    v_3d[:,:,-1] = np.nan
-    w_3d[-1] = np.nan
+    u_3d, v_3d, w_3d = interpolate_staggered(u_3d, v_3d, w_3d)
     # Due to the interpolation of w, we might have to exclude the last level of h here (TODO)
     #logger.debug('u=%s', str(u_3d.shape))
     #logger.debug('v=%s', str(v_3d.shape))
     #logger.debug('w=%s', str(w_3d.shape))
     #logger.debug('qn=%s', str(qn_3d.shape))
     ## Calculate needed values
-    # Create cloud mask
-    cld_mask = qn_3d>cld_lim
+    # Create cloud mask and dilated cloud mask with cross kernel
+    cld_mask, dilated_mask = get_cloud_masks(qn_3d, dil_len)
     cld_cnt = cld_mask.sum(axis=(1,2))
-    # Create dilated cloud mask with cross kernel
-    # Create dilation kernel
-    # Restrict input
-    #logger.debug("dil_len=%i",dil_len)
-    dil_len = min(5,max(1,dil_len))
-    #logger.debug("dil_len=%i",dil_len)
-    # Calculate kernel size
-    s = 1 + 2*dil_len
-    # dot is outward most kernel layer
-    dot = np.zeros((s,s))
-    dot[dil_len,dil_len]=1
-    # Dilate dot with cross to generate additional layers
-    cross = np.zeros((3,3))
-    cross[1,:]=1
-    cross = np.logical_or(cross, cross.T)
-    # Generate kernel
-    kern = np.empty((s,s,s))
-    kern[0] = dot
-    kern[-1] = dot
-    for i in range(1,dil_len+1):
-        tmp = bin_dilation(kern[i-1],cross)
-        kern[i] = tmp
-        kern[-i-1] = tmp
-    logger.debug("Dilation kernel:\n%s", str(kern))
-    # Apply dilation
-    dilated_mask = bin_dilation(cld_mask, kern)
     dilated_cnt = dilated_mask.sum(axis=(1,2))
     # Difference is halo
     halo_mask = np.logical_xor(dilated_mask, cld_mask)
@@ -513,9 +830,9 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
         logger.info('Save files')
         logger.debug('%d frames',len(h))
         if gif:
-        ani.save(os.path.join(out_dir, plot_case_name.format(wt=wt, plot='mov'))+'.gif', writer='imagemagick', fps=fps)
+            ani.save(os.path.join(out_dir, plot_case_name.format(wt=wt, plot='mov'))+'.gif', writer='imagemagick', fps=fps)
         else:
-        ani.save(os.path.join(out_dir, plot_case_name.format(wt=wt, plot='mov'))+'.mp4', fps=fps)
+            ani.save(os.path.join(out_dir, plot_case_name.format(wt=wt, plot='mov'))+'.mp4', fps=fps)
         pdf.close()
     # Create plots for conditional u'w':
     logger.debug(plot_case_name)
@@ -433,6 +433,41 @@ def get_var_from_nc(nc, varname, conversion, n, t):
         
     return var
 
+def get_profiles_from_nc(nc, varname, n, t, idx_t0, idx_t1, idx_z0, idx_z1):
+    logger.info('get_profiles_from_nc:%s', varname)
+    """
+    Input:
+    nc         --  Netcdf file object
+    varname    --  Variable name string
+    n          --  amount of level
+    t          --  amount of timesteps
+    idx_t0     --  Index corrosponding to the beginning of the sampling interval
+    idx_t1     --  Index corrosponding to the end of the sampling interval
+    idx_z0     --  Index corrosponding to the lowest model level
+    idx_z1     --  Index corrosponding to the highest model level
+    n and t are used, if the variable cannot be found
+
+    Output:
+    time x height array of the specified variable in the sampling interval and height range.
+    Only this part of the variable is read from the file.
+    """
+
+    keys = nc.variables.keys()
+    if varname in keys:
+        logger.debug('%s is in keys', varname)
+        var = nc.variables[varname]
+        if var.shape[1]>n:
+            var = var[idx_t0:idx_t1,idx_z0:idx_z1]
+        else:
+            var = var[idx_t0:idx_t1]
+        # Drop trailing dimensions of size 1 (e.g. lat and lon in CLUBB output), but keep time and height
+        var = np.asarray(var).reshape(var.shape[:2])
+    else:
+        logger.debug('%s is not in keys', varname)
+        var = np.zeros(shape=(t,n)) - 1000.
+
+    return var
+
 def mean_profiles(var, idx_t0, idx_t1, idx_z0, idx_z1):
     logger.info('mean_profiles')
     """
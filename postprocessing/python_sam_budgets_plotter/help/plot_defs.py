@@ -229,6 +229,18 @@ legend_pos_3d = 1
 # Set dilation length for halo definition (1 is not enough!)
 dil_len = 4
 
+# Number of height levels of 3D snapshots processed at a time. With None, the whole snapshot is loaded
+# and the horizontal plots are created, otherwise only cloud conditional profiles are created with bounded memory.
+# Can be overridden by setting slab_size in the case file, e.g. for RICO.
+slab_size = None
+# Number of height levels processed at a time if slab_size is None, but 3D snapshots have to be processed in slabs,
+# i.e. when averaging over many snapshots (sam_3d_files in the case file)
+default_slab_size = 10
+
+# Number of processes computing the profiles of 3D snapshots in parallel, if sam_3d_files is set in the case file.
+# With None, one process per CPU is used. Can be overridden by setting nprocs in the case file.
+nprocs = None
+
 # Set quantile for outlier cutoff: 0<=quant<=100, enter 0 for min/max
 # The amount of outliers seems to be approximately constant with array size, but in order to get a visually acceptable distribution, we need to take quantiles
 quant = 1e-2
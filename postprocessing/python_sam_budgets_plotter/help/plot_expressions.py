@@ -0,0 +1,164 @@
+"""
+-------------------------------------------------------------------------------
+    DESCRIPTION
+-------------------------------------------------------------------------------
+Compile and evaluate the expressions of function lines in the case files.
+
+A function line, e.g.
+    ['residual', True, 'W2BT - (W2ADV + W2PRES + W2REDIS + W2BUOY + W2DIFF + W2SDMP)', 1, 0]
+computes its data from the other lines of the same plot, which are referenced by their variable names.
+Each expression is parsed once into an AST, checked and compiled to a code object. Variable names are bound
+explicitly to arrays when the expression is evaluated, so e.g. TKE in 'TKE + TKES' can never be replaced
+inside of TKES, and one evaluation computes the whole (time x) height array at once.
+
+The arrays bound to the expressions of a case are kept in an ArrayStore, so the data of a line is only read
+and prepared once, no matter how many plots and expressions use it.
+"""
+#-------------------------------------------------------------------------------
+#    I M P O R T S
+#-------------------------------------------------------------------------------
+import ast
+import logging
+import numpy as np
+
+#-------------------------------------------------------------------------------
+#   L O G G E R
+#-------------------------------------------------------------------------------
+logger = logging.getLogger('plotgen.help.expr')
+#logger.setLevel(logging.INFO)
+logger.setLevel(logging.DEBUG)
+#logger.setLevel(logging.CRITICAL)
+
+#-------------------------------------------------------------------------------
+#    D E F I N I T I O N S
+#-------------------------------------------------------------------------------
+# Names that are provided to every expression instead of being bound to plot lines:
+# np  -- numpy module, e.g. for np.maximum or np.sqrt
+# n   -- number of height levels, e.g. for np.full(n,1e-5)
+RESERVED_NAMES = ('np', 'n')
+# AST nodes that may appear in an expression (operators and expression contexts are always allowed)
+ALLOWED_NODES = ('Expression', 'BinOp', 'UnaryOp', 'BoolOp', 'Compare', 'IfExp', 'Call', 'keyword',
+                 'Attribute', 'Name', 'Num', 'Constant', 'Tuple', 'List')
+# Compiled expressions, keyed by expression string, shared by all plots and cases
+compiled_expressions = {}
+
+#-------------------------------------------------------------------------------
+#    C L A S S E S
+#-------------------------------------------------------------------------------
+class CompiledExpression(object):
+    """
+    Expression of a function line, parsed and compiled once.
+
+    Members:
+      expression -- Expression string from the case file
+      names      -- Tuple of variable names used in the expression, in order of first appearance
+    """
+
+    def __init__(self, expression):
+        """
+        Parse and compile an expression.
+        Raises a SyntaxError if the expression cannot be parsed and a ValueError if it uses
+        anything but arithmetic, comparisons, literals, variable names and numpy functions.
+        """
+        self.expression = expression
+        tree = ast.parse(expression.strip(), mode='eval')
+        names = []
+        for node in ast.walk(tree):
+            node_type = type(node).__name__
+            if node_type not in ALLOWED_NODES and not isinstance(node, (ast.operator, ast.unaryop, ast.cmpop, ast.boolop, ast.expr_context)):
+                raise ValueError('{} is not allowed in expressions'.format(node_type))
+            if isinstance(node, ast.Attribute) and not (isinstance(node.value, ast.Name) and node.value.id == 'np'):
+                raise ValueError('Only attributes of np are allowed in expressions')
+            if isinstance(node, ast.Attribute) and node.attr.startswith('_'):
+                raise ValueError('Private attribute {} is not allowed in expressions'.format(node.attr))
+            if isinstance(node, ast.Call) and not isinstance(node.func, ast.Attribute):
+                raise ValueError('Only numpy functions can be called in expressions')
+        # ast.walk is breadth first, so collect names separately to keep their order of appearance
+        for node in self.__names_in_order(tree):
+            if node.id not in RESERVED_NAMES and node.id not in names:
+                names.append(node.id)
+        self.names = tuple(names)
+        self.__code = compile(tree, '<expression {}>'.format(expression.strip()), 'eval')
+
+    def __names_in_order(self, node):
+        """
+        Yield the Name nodes below node in the order in which they appear in the expression
+        """
+        if isinstance(node, ast.Name):
+            yield node
+        for child in ast.iter_child_nodes(node):
+            for name in self.__names_in_order(child):
+                yield name
+
+    def evaluate(self, bindings, n):
+        """
+        Evaluate the expression.
+        Input:
+          bindings -- dictionary mapping each entry of names to an array (or number)
+          n        -- number of height levels, available as n in the expression
+        Output:
+          result of the expression
+        Raises a KeyError if a variable of the expression is not bound.
+        """
+        values = {'np': np, 'n': n}
+        for name in self.names:
+            values[name] = bindings[name]
+        return eval(self.__code, {'__builtins__': {}}, values)
+
+
+class ArrayStore(object):
+    """
+    Per-case store of line data.
+    Every entry is the data of a line, identified by a key made from the line's variable name,
+    conversion factor and everything else that determines its data, or the result of a function line
+    (see get_all_variables).
+    Entries are shared, so their arrays must not be modified in place.
+    """
+
+    def __init__(self):
+        self.__arrays = {}
+        self.__bindings = {}
+
+    def __contains__(self, key):
+        return key in self.__arrays
+
+    def __getitem__(self, key):
+        return self.__arrays[key]
+
+    def get(self, key, read_function):
+        """
+        Return the data stored for key. If there is none, read_function is called without arguments
+        and its result is stored.
+        """
+        if key not in self.__arrays:
+            self.__arrays[key] = read_function()
+        return self.__arrays[key]
+
+    def set(self, key, data):
+        """
+        Store data for key, replacing any data stored before.
+        """
+        self.__arrays[key] = data
+        self.__bindings.pop(key, None)
+
+    def get_binding(self, key):
+        """
+        Return the data stored for key with NAN values replaced by 0, as it is bound to expressions.
+        """
+        if key not in self.__bindings:
+            data = self.__arrays[key]
+            self.__bindings[key] = np.where(np.isnan(data), 0, data)
+        return self.__bindings[key]
+
+#-------------------------------------------------------------------------------
+#    F U N C T I O N S
+#-------------------------------------------------------------------------------
+def compile_expression(expression):
+    """
+    Return the CompiledExpression for an expression string, compiling it only on first use.
+    Raises a SyntaxError or ValueError if the expression is invalid (see CompiledExpression).
+    """
+    logger.info('compile_expression')
+    if expression not in compiled_expressions:
+        compiled_expressions[expression] = CompiledExpression(expression)
+    return compiled_expressions[expression]
@@ -6,10 +6,10 @@
 import os
 import sys
 import re
+import glob
 import logging
 from datetime import datetime as dt
 import numpy as np
-from scipy.ndimage.morphology import binary_dilation as bin_dilation
 import matplotlib as mpl
 from matplotlib import pyplot as mpp
 import matplotlib.animation as manim
@@ -22,6 +22,8 @@ from PyPDF2 import PdfFileWriter as pdfw, PdfFileReader as pdfr
 # plotgen imports
 import plot_budgets as pb
 import OutputWriter as ow
+import plot_expressions as pe
+import plot_3d as p3d
 from plot_defs import *
 
 #-------------------------------------------------------------------------------
@@ -59,9 +61,10 @@ def init_plotgen(plots, cf):
     
     return out_dir, jpg_dir, plot_case_name, out_pdf
 
-def load_nc(plots, cf, old_clubb=False):
+def load_nc(plots, cf, old_clubb=False, sam_3d=True):
     """
     Load netcdf files based on information from case files
+    The sam_3d file is skipped if sam_3d is False, e.g. when many 3D snapshots are processed instead
     """
     logger.info('load_nc')
     nc_list = []
@@ -86,7 +89,7 @@ def load_nc(plots, cf, old_clubb=False):
         except IOError as e:
             logger.error('The file {}, specified as sam_file in the {} case file, could not be opened: {}'.format(e.filename, cf.case, e.message))
             sys.exit()
-    if 'sam_3d' in plots.nc_files:
+    if 'sam_3d' in plots.nc_files and sam_3d:
         logger.info('Loading sam_3d netcdf')
         try:
             nc_list.append(Dataset(cf.sam_3d_file,'r'))
@@ -228,20 +231,26 @@ def get_all_variables(nc, lines, plotLabels, nh, nt, t0, t1, h0, h1, filler=0):
     logger.debug(plotLabels)
     # Initialize list of all plots
     plot_data = []
-    # Rename to make some of the expressions in SAM standalone work
-    n = nh
+    # Data of variable lines, shared by all plots and function lines of this case
+    store = pe.ArrayStore()
+    # Read every variable used in the plots once and store it without conversion
+    plan = plan_variables(lines)
+    logger.info('Reading %d variables', len(plan))
+    for varname in sorted(plan):
+        for unaveraged, data in read_variable(nc, varname, plan[varname], nh, nt, t0, t1, h0, h1, filler).items():
+            store.set((varname, 1, unaveraged), data)
     for i,l in enumerate(lines):
         logger.info("Getting variables for plot %s", plotLabels[i])
-        # If CLD (cloud fraction) data is used in this plot,
-        # we will have to evaluate expressions before averaging over sampling time interval,
-        # because cloud fraction changes over time, so conditional averaging changes with each time step
-        # Check if CLD needed:
-        condPlot = any([x[2]=='CLD' for x in l])
+        condPlot = is_conditional_plot(l)
         logger.debug('Cloud conditional plot? %s',condPlot)
         # Initialize list of all lines in plot l
         plot_lines = []
         # Initialize list of function lines in plot l
         functions = []
+        # Labels of the variable lines in plot l and their store keys
+        labels = []
+        # Store keys of the lines in plot l that can be used in expressions, by variable name or label
+        keys = {}
         logger.debug('Iterate over lines')
         for j,var in enumerate(l):
             logger.info("Getting variable %s", var[0])
@@ -250,98 +259,169 @@ def get_all_variables(nc, lines, plotLabels, nh, nt, t0, t1, h0, h1, filler=0):
                 logger.debug("Adding dummy line")
                 plot_lines.append([var[0], var[1], var[2], var[4], None])
             elif not isFunction(var[2]):
-                logger.debug(plotLabels[i])
-                logger.debug(var[2])
-                logger.debug(var[0])
-                long_name = pb.get_long_name(nc, var[2])
-                logger.debug(long_name)
-                logger.info('Plot %s: Variable %s, label %s, long_name %s', plotLabels[i], var[2], var[0], long_name)
-                # Fetch data
-                data = pb.get_var_from_nc(nc, var[2], var[3], nh, nt)
-                logger.debug(data.shape)
-                # NAN test: -1000 is the value assigned for invalid data
-                if np.any(np.isnan(data)) or np.any(data <= -1000):
-                    # if there are invalid data points in the variable replace by filler value
-                    logger.warning("Invalid data in variable %s of plot %s.", var[0], plotLabels[i])
-                    data = np.where(np.logical_or(np.isnan(data), data<=-1000), filler, data)
-                # Average over given time indices
-                logger.debug("%d>%d?",t1,t0)
-                logger.debug(t1>t0)
-                # TODO: Fix error when key not found -> data already has reduced size
-                # t1>t0 should only apply for profile data!
-                if t1>t0:
-                    if not condPlot:
-                        if data.shape[1]>nh:
-                            data = pb.mean_profiles(data, t0, t1, h0, h1)
-                        else:
-                            data = pb.mean_profiles(data, t0, t1, 0, nh)
-                    else:
-                        # Slice here in order to have right dimensions for function calculations
-                        if data.shape[1]>nh:
-                            data = data[t0:t1,h0:h1]
-                        logger.debug(data.shape)
-                else:
-                    # No time averaging
-                    if data.ndim==2 and data.shape[1]>nh:
-                        # 2d data here has the dimensions 0:time, 1:height(z)
-                        # usually, 2d data should be averaged over time, this might not work! (TODO: test)
-                        data=data[:,h0:h1]
-                    elif data.ndim==3 and data.shape[0]>nh:
-                        # 3d data here has the dimenions 0:z, 1:x, 2:y
-                        data = data[h0:h1]
-                # Save to plots, use var[2] as identifier string for replacement
-                #plot_lines.append([var[0], var[1], var[2], var[4], data])
+                logger.info('Plot %s: Variable %s, label %s', plotLabels[i], var[2], var[0])
+                key = (var[2], var[3], condPlot)
+                # Lines without conversion share the stored array
+                data = store.get(key, lambda: store[(var[2], 1, condPlot)] * var[3])
+                # The first line of a variable is bound to its name in expressions
+                if var[2] not in keys:
+                    keys[var[2]] = key
+                labels.append((var[0], key))
+                # Save to plots, use var[2] as identifier string for expressions
                 plot_lines.append([var[0], var[1], var[2], var[4], data])
             else:
                 logger.debug("Is function")
                 plot_lines.append(None)
                 functions.append([var[0], var[1], var[2], var[4], j])
+        # Names that are not variables of the plot may refer to line labels
+        for label, key in labels:
+            if label not in keys:
+                keys[label] = key
         logger.debug('Iterating over functions')
         for func in functions:
-            expression = func[2]
             logger.debug('Calculate %s', func[0])
-            #logger.debug('Expression before replacement: %s',expression)
-            # Insert plot_lines entries into function string
-            all_nan = True # Check if all values in expression are NAN
-            for k in range(len(plot_lines)):
-                #logger.debug('Replace plot_line[%d]',k)
-                if plot_lines[k] is not None and plot_lines[k][4] is not None:
-                    if not np.all(np.isnan(plot_lines[k][4])):
-                        all_nan = False
-                    # Replace variables in expression with their respective entries from plot_lines and replace NAN values with zero
-                    expression = expression.replace(plot_lines[k][2], 'np.where(np.isnan(plot_lines['+str(k)+'][4]),0,plot_lines['+str(k)+'][4])')
-            # if all entries are NAN, return array containing only NANs
-            if all_nan:
+            data = get_function(store, keys, func[2], nh, filler)
+            if data is None:
+                logger.error('Expression %s of line %s in plot %s could not be evaluated', func[2], func[0], plotLabels[i])
                 data = np.full(nh, np.nan)
-            else:
-                #logger.debug('Expression after replacement: %s',expression)
-                try:
-                    data = eval(expression)
-                    if np.any(np.isnan(data)) or np.any(np.isinf(data)):
-                        # if there are invalid data points in the variable replace by filler value
-                        logger.warning("Invalid data in variable %s of plot %s. The entries will be replaced by the fill value %s", var[0], plotLabels[i], str(filler))
-                        data = np.where(np.isinf(data), filler, data)
-                except Exception as e:
-                    logger.error('Expression %s of line %s in plot %s could not be evaluated: %s', expression, plotLabels[i], func[0], e.message)
-                    data = np.full(nh, np.nan)
+            # Later expressions may use the result by its label
+            if func[0] not in keys:
+                keys[func[0]] = ('function', plotLabels[i], func[0])
+                store.set(keys[func[0]], data)
             #logger.debug("Line insertion index: %d", func[4])
             plot_lines[func[4]] = [func[0], func[1], func[2], func[3], data]
         # Apply late averaging. Only for profile data!:
         if condPlot and t1>t0:
             logger.debug('Applying late averaging')
-            for i in range(len(plot_lines)):
-                data = plot_lines[i][4]
+            for k in range(len(plot_lines)):
+                data = plot_lines[k][4]
                 if data is not None:
-                    plot_lines[i][4] = pb.mean_profiles(data, 0, nt, 0, nh)
-                    #if data.shape[1]>nh:
-                        #plot_lines[i][4] = pb.mean_profiles(data, t0, t1, h0, h1)
-                    #else:
-                        #plot_lines[i][4] = pb.mean_profiles(data, t0, t1, 0, nh)
+                    plot_lines[k][4] = pb.mean_profiles(data, 0, nt, 0, nh)
         plot_data.append(plot_lines)
     
     return dict(zip(plotLabels, plot_data))
 
 
+def is_conditional_plot(plot_lines):
+    """
+    If CLD (cloud fraction) data is used in a plot,
+    we will have to evaluate expressions before averaging over sampling time interval,
+    because cloud fraction changes over time, so conditional averaging changes with each time step
+    Input:
+      plot_lines    -- List of lines in a plot
+    Output:
+      True if the plot contains CLD
+    """
+    return any([x[2]=='CLD' for x in plot_lines])
+
+def plan_variables(lines):
+    """
+    Collect the variables of all variable lines in the plots and how their data is needed.
+    Input:
+      lines         -- List of all individual plots, which in turn contain all lines (see get_all_variables)
+    Output:
+      dictionary with variable names as keys and sets as values, containing
+      False if the variable is used in a plot that is averaged before evaluating its expressions and
+      True if the variable is used in a cloud conditional plot, where averaging is done afterwards
+    """
+    logger.info('plan_variables')
+    plan = {}
+    for l in lines:
+        condPlot = is_conditional_plot(l)
+        for var in l:
+            if var[2] is not None and not isFunction(var[2]):
+                plan.setdefault(var[2], set()).add(condPlot)
+    return plan
+
+def read_variable(nc, varname, modes, nh, nt, t0, t1, h0, h1, filler=0):
+    """
+    Read the data of a variable from netcdf, replace invalid values and average over the sampling time interval.
+    Profile data is read only once for the sampling time interval and height bounds and averaged only once.
+    Input:
+      nc            -- Dataset created from netcdf file
+      varname       -- Variable name in nc file
+      modes         -- Set of the ways the data is needed (see plan_variables):
+                       False for averaged data, True for data that is only sliced to the sampling time interval,
+                       which is averaged later for cloud conditional plots (see get_all_variables)
+      nh            -- Size of height dimension in netcdf data
+      nt            -- Size of time dimension in netcdf data
+      t0, t1        -- Boundaries of sampling time interval
+      h0, h1        -- Height bounds for output plots
+      filler        -- Value replacing invalid data
+    Output:
+      dictionary with the entries of modes as keys and numpy arrays of the variable data without conversion as values
+    """
+    logger.info('read_variable:%s', varname)
+    long_name = pb.get_long_name(nc, varname)
+    logger.debug(long_name)
+    # Fetch data
+    # TODO: t1>t0 should only apply for profile data!
+    if t1>t0:
+        data = pb.get_profiles_from_nc(nc, varname, nh, nt, t0, t1, h0, h1)
+    else:
+        data = pb.get_var_from_nc(nc, varname, 1, nh, nt)
+    logger.debug(data.shape)
+    # NAN test: -1000 is the value assigned for invalid data
+    if np.any(np.isnan(data)) or np.any(data <= -1000):
+        # if there are invalid data points in the variable replace by filler value
+        logger.warning("Invalid data in variable %s.", varname)
+        data = np.where(np.logical_or(np.isnan(data), data<=-1000), filler, data)
+    if t1>t0:
+        variable_data = {}
+        if True in modes:
+            variable_data[True] = data
+        # Average over the sampling time interval
+        if False in modes:
+            variable_data[False] = pb.mean_profiles(data, 0, data.shape[0], 0, data.shape[1])
+        return variable_data
+    # No time averaging
+    if data.ndim==2 and data.shape[1]>nh:
+        # 2d data here has the dimensions 0:time, 1:height(z)
+        # usually, 2d data should be averaged over time, this might not work! (TODO: test)
+        data=data[:,h0:h1]
+    elif data.ndim==3 and data.shape[0]>nh:
+        # 3d data here has the dimenions 0:z, 1:x, 2:y
+        data = data[h0:h1]
+    return dict([(mode, data) for mode in modes])
+
+def get_function(store, keys, expression, nh, filler=0):
+    """
+    Evaluate the expression of a function line.
+    Input:
+      store         -- ArrayStore containing the data of the variable lines
+      keys          -- Dictionary mapping the names that can be used in the expression to store keys
+      expression    -- Expression string of the function line
+      nh            -- Size of height dimension in netcdf data
+      filler        -- Value replacing infinite results
+    Output:
+      numpy array of the function data, or None if the expression could not be evaluated
+    """
+    logger.info('get_function')
+    try:
+        compiled = pe.compile_expression(expression)
+    except (SyntaxError, ValueError) as e:
+        logger.error('Invalid expression %s: %s', expression, e)
+        return None
+    missing = [name for name in compiled.names if name not in keys]
+    if missing:
+        logger.error('Expression %s uses variables that are not in the plot: %s', expression, ', '.join(missing))
+        return None
+    # if all entries are NAN, return array containing only NANs
+    if compiled.names and all([np.all(np.isnan(store[keys[name]])) for name in compiled.names]):
+        return np.full(nh, np.nan)
+    bindings = dict([(name, store.get_binding(keys[name])) for name in compiled.names])
+    try:
+        data = compiled.evaluate(bindings, nh)
+    except Exception as e:
+        logger.error('Expression %s could not be evaluated: %s', expression, e)
+        return None
+    if np.any(np.isnan(data)) or np.any(np.isinf(data)):
+        # if there are invalid data points in the variable replace by filler value
+        logger.warning("Invalid data in expression %s. The entries will be replaced by the fill value %s", expression, str(filler))
+        data = np.where(np.isinf(data), filler, data)
+    return data
+
+
 def plot_default(plots, cf, data, h, centering):
     """
     Default plotting routine. Plots a series of figures containing height profiles from data.
@@ -462,7 +542,6 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
     ## Unpack arrays
     qn_3d = data['qn_3d']
     qv_3d = data['qv_3d']
-    qt_3d = qn_3d+qv_3d
     #thv_3d = data['thetav']
     u_3d = data['u_3d']
     v_3d = data['v_3d']
@@ -484,77 +563,29 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
     #logger.debug('uw_2d = %s',uw_2d)
     #logger.debug('vw_2d = %s',vw_2d)
     # interolate on the stupid s-grid
-    u_3d = np.cumsum(u_3d,axis=1)
-    v_3d = np.cumsum(v_3d,axis=2)
-    w_3d = np.cumsum(w_3d,axis=0)
-    u_3d[:,2:] = u_3d[:,2:] - u_3d[:,:-2]
-    v_3d[:,:,2:] = v_3d[:,:,2:] - v_3d[:,:,:-2]
-    w_3d[2:] = w_3d[2:] - w_3d[:-2]
-    u_3d[:,:-1] = u_3d[:,1:]/2.
-    v_3d[:,:,:-1] = v_3d[:,:,1:]/2.
-    w_3d[:-1] = w_3d[1:]/2.
-    # Set last entries to 0 or NAN, as they cannot b running averaged
-    u_3d[:,-1] = np.nan
-    v_3d[:,:,-1] = np.nan
-    w_3d[-1] = np.nan
+    u_3d, v_3d, w_3d = p3d.interpolate_staggered(u_3d, v_3d, w_3d)
     # Due to the interpolation of w, we might have to exclude the last level of h here (TODO)
     #logger.debug('u=%s', str(u_3d.shape))
     #logger.debug('v=%s', str(v_3d.shape))
     #logger.debug('w=%s', str(w_3d.shape))
     #logger.debug('qn=%s', str(qn_3d.shape))
     ## Calculate needed values
-    # Create cloud mask
-    cld_mask = qn_3d>cld_lim
-    cld_cnt = cld_mask.sum(axis=(1,2))
-    # Create dilated cloud mask with cross kernel
-    # Create dilation kernel
-    # Restrict input
-    #logger.debug("dil_len=%i",dil_len)
-    dil_len = min(5,max(1,dil_len))
-    #logger.debug("dil_len=%i",dil_len)
-    # Calculate kernel size
-    s = 1 + 2*dil_len
-    # dot is outward most kernel layer
-    dot = np.zeros((s,s))
-    dot[dil_len,dil_len]=1
-    # Dilate dot with cross to generate additional layers
-    cross = np.zeros((3,3))
-    cross[1,:]=1
-    cross = np.logical_or(cross, cross.T)
-    # Generate kernel
-    kern = np.empty((s,s,s))
-    kern[0] = dot
-    kern[-1] = dot
-    for i in range(1,dil_len+1):
-        tmp = bin_dilation(kern[i-1],cross)
-        kern[i] = tmp
-        kern[-i-1] = tmp
-    logger.debug("Dilation kernel:\n%s", str(kern))
-    # Apply dilation
-    dilated_mask = bin_dilation(cld_mask, kern)
-    dilated_cnt = dilated_mask.sum(axis=(1,2))
-    # Difference is halo
-    halo_mask = np.logical_xor(dilated_mask, cld_mask)
-    halo_cnt = halo_mask.sum(axis=(1,2))
-    # Complement of dilated is no cloud mask
-    nocld_mask = np.logical_not(dilated_mask)
-    nocld_cnt = nocld_mask.sum(axis=(1,2))
-    logger.debug("Masks cover all grid points: %s", str(np.all((dilated_mask+nocld_mask)==1)))
+    # Create cloud mask and dilated cloud mask with cross kernel
+    cld_mask, dilated_mask = p3d.get_cloud_masks(qn_3d, dil_len)
+    # Compute profiles, including cloud conditional profiles
+    profiles = p3d.get_conditional_profiles(qn_3d, qv_3d, u_3d, v_3d, w_3d, cld_mask, dilated_mask)
     # Profile of mean wind component
-    um = np.nanmean(u_3d, axis=(1,2))
-    vm = np.nanmean(v_3d, axis=(1,2))
-    wm = np.nanmean(w_3d, axis=(1,2))
-    qm = np.nanmean(qt_3d, axis=(1,2))
+    um = profiles['um']
+    vm = profiles['vm']
+    wm = profiles['wm']
     #thvm = np.nanmean(thv_3d, axis=(1,2))
-    # 3d field of u'w' and v'w'
+    # 3d field of u'w' and v'w', only the perturbations shown in the horizontal plots are kept
     up = u_3d - um[:,None,None]
     wp = w_3d - wm[:,None,None]
     vp = v_3d - vm[:,None,None]
-    qp = qt_3d - qm[:,None,None]
     #thvp = thv_3d - thvm[:,None,None]
     uw = up*wp
     vw = vp*wp
-    wq = wp*qp
     #upthvp = up*thvp
     #vpthvp = vp*thvp
     # Profile of horizontal wind strength
@@ -586,34 +617,6 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
     #logger.debug(h_limits)
     #h_extent = np.diff(h_limits)
     #logger.debug(h_extent)
-    # Create arrays to save conditional u'w'
-    uw_cld = np.full(wm.size, np.nan)
-    vw_cld = np.full(wm.size, np.nan)
-    wq_cld = np.full(wm.size, np.nan)
-    uw_halo = np.full(wm.size, np.nan)
-    vw_halo = np.full(wm.size, np.nan)
-    wq_halo = np.full(wm.size, np.nan)
-    uw_nocld = np.full(wm.size, np.nan)
-    vw_nocld = np.full(wm.size, np.nan)
-    wq_nocld = np.full(wm.size, np.nan)
-    u_cld_mean = np.full(um.size, np.nan)
-    v_cld_mean = np.full(vm.size, np.nan)
-    w_cld_mean = np.full(vm.size, np.nan)
-    u_halo_mean = np.full(um.size, np.nan)
-    v_halo_mean = np.full(vm.size, np.nan)
-    w_halo_mean = np.full(vm.size, np.nan)
-    u_nocld_mean = np.full(um.size, np.nan)
-    v_nocld_mean = np.full(vm.size, np.nan)
-    w_nocld_mean = np.full(vm.size, np.nan)
-    #upthvp_cld = np.full(um.size, np.nan)
-    #upthvp_halo = np.full(um.size, np.nan)
-    #upthvp_nocld = np.full(um.size, np.nan)
-    #vpthvp_cld = np.full(vm.size, np.nan)
-    #vpthvp_halo = np.full(vm.size, np.nan)
-    #vpthvp_nocld = np.full(vm.size, np.nan)
-    #thvp_cld = np.full(thvm.size, np.nan)
-    #thvp_halo = np.full(thvm.size, np.nan)
-    #thvp_nocld = np.full(thvm.size, np.nan)
     
     
     ### Get colormaps
@@ -622,7 +625,7 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
     ## Get cloud fraction color map
     # Calculate cloud fraction for shading of height indicator
     cloud_frac_cmap = mpl.cm.get_cmap(plots.cloud_frac_cmap)
-    cloud_frac = cld_mask.mean(axis=(1,2))
+    cloud_frac = profiles['cloud_frac']
     cloud_frac = cloud_frac/cloud_frac.max()
     # Generate colors from color map
     cloud_colors = cloud_frac_cmap(cloud_frac)
@@ -729,7 +732,6 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
     ## Plotting preparations
     # Get shape of arrays, here (z,x,y)
     dims = qn_3d.shape
-    N = dims[1]*dims[2]
     # Create meshgrid for 2d plot
     logger.info('Create meshgrids')
     # contour prep
@@ -775,53 +777,6 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
         u = u_3d[framenumber]
         v = v_3d[framenumber]
         
-        # Fill conditional u'w' arrays (TEST: divide by dimx*dimy or reduced because of NANs?)
-        if cld_mask[framenumber].sum()>0:
-            uw_cld[framenumber] = np.nanmean(uw[framenumber, cld_mask[framenumber]])
-            vw_cld[framenumber] = np.nanmean(vw[framenumber, cld_mask[framenumber]])
-            wq_cld[framenumber] = np.nanmean(wq[framenumber, cld_mask[framenumber]])
-            u_cld_mean[framenumber] = np.nanmean(u[cld_mask[framenumber]])
-            v_cld_mean[framenumber] = np.nanmean(v[cld_mask[framenumber]])
-            w_cld_mean[framenumber] = np.nanmean(w_3d[framenumber, cld_mask[framenumber]])
-            #uw_cld[framenumber] = np.nansum(uw[framenumber, cld_mask[framenumber]])/N
-            #vw_cld[framenumber] = np.nansum(vw[framenumber, cld_mask[framenumber]])/N
-            #u_cld_mean[framenumber] = np.nansum(u[cld_mask[framenumber]])/N
-            #v_cld_mean[framenumber] = np.nansum(v[cld_mask[framenumber]])/N
-            #w_cld_mean[framenumber] = np.nansum(w_3d[framenumber, cld_mask[framenumber]])/N
-            #upthvp_cld[framenumber] = np.nansum(upthvp[framenumber, cld_mask[framenumber]])/N
-            #vpthvp_cld[framenumber] = np.nansum(vpthvp[framenumber, cld_mask[framenumber]])/N
-            #thvp_cld[framenumber] = np.nansum(thvp[framenumber, cld_mask[framenumber]])/N
-        if halo_mask[framenumber].sum()>0:
-            uw_halo[framenumber] = np.nanmean(uw[framenumber, halo_mask[framenumber]])
-            vw_halo[framenumber] = np.nanmean(vw[framenumber, halo_mask[framenumber]])
-            wq_halo[framenumber] = np.nanmean(wq[framenumber, halo_mask[framenumber]])
-            u_halo_mean[framenumber] = np.nanmean(u[halo_mask[framenumber]])
-            v_halo_mean[framenumber] = np.nanmean(v[halo_mask[framenumber]])
-            w_halo_mean[framenumber] = np.nanmean(w_3d[framenumber, halo_mask[framenumber]])
-            #uw_halo[framenumber] = np.nansum(uw[framenumber, halo_mask[framenumber]])/N
-            #vw_halo[framenumber] = np.nansum(vw[framenumber, halo_mask[framenumber]])/N
-            #u_halo_mean[framenumber] = np.nansum(u[halo_mask[framenumber]])/N
-            #v_halo_mean[framenumber] = np.nansum(v[halo_mask[framenumber]])/N
-            #w_halo_mean[framenumber] = np.nansum(w_3d[framenumber, halo_mask[framenumber]])/N
-            #upthvp_halo[framenumber] = np.nansum(upthvp[framenumber, halo_mask[framenumber]])/N
-            #vpthvp_halo[framenumber] = np.nansum(vpthvp[framenumber, halo_mask[framenumber]])/N
-            #thvp_halo[framenumber] = np.nansum(thvp[framenumber, halo_mask[framenumber]])/N
-        if nocld_mask[framenumber].sum()>0:
-            uw_nocld[framenumber] = np.nanmean(uw[framenumber, nocld_mask[framenumber]])
-            vw_nocld[framenumber] = np.nanmean(vw[framenumber, nocld_mask[framenumber]])
-            wq_nocld[framenumber] = np.nanmean(wq[framenumber, nocld_mask[framenumber]])
-            u_nocld_mean[framenumber] = np.nanmean(u[nocld_mask[framenumber]])
-            v_nocld_mean[framenumber] = np.nanmean(v[nocld_mask[framenumber]])
-            w_nocld_mean[framenumber] = np.nanmean(w_3d[framenumber, nocld_mask[framenumber]])
-            #uw_nocld[framenumber] = np.nansum(uw[framenumber, nocld_mask[framenumber]])/N
-            #vw_nocld[framenumber] = np.nansum(vw[framenumber, nocld_mask[framenumber]])/N
-            #u_nocld_mean[framenumber] = np.nansum(u[nocld_mask[framenumber]])/N
-            #v_nocld_mean[framenumber] = np.nansum(v[nocld_mask[framenumber]])/N
-            #w_nocld_mean[framenumber] = np.nansum(w_3d[framenumber, nocld_mask[framenumber]])/N
-            #upthvp_nocld[framenumber] = np.nansum(upthvp[framenumber, nocld_mask[framenumber]])/N
-            #vpthvp_nocld[framenumber] = np.nansum(vpthvp[framenumber, nocld_mask[framenumber]])/N
-            #thvp_nocld[framenumber] = np.nansum(thvp[framenumber, nocld_mask[framenumber]])/N
-        
         # Clear figures
         fig.clear()
         # Prepare canvas
@@ -957,6 +912,99 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
             ani.save(os.path.join(out_dir, plot_case_name.format(wt=wt, plot='mov'))+'.mp4', fps=fps)
         pdf.close()
     # Create plots for conditional u'w':
+    plot_conditional_profiles(plots, cf, profiles, h, dims, out_dir, jpg_dir, plot_case_name, out_pdf, dil_len)
+    
+
+def plot_3d_chunked(plots, cf, nc_3d, h, idx_h0, idx_h1, dil_len=1, slab_size=default_slab_size):
+    """
+    Generates cloud conditional profiles from a SAM 3D snapshot with bounded memory.
+    Instead of loading the whole 3D fields, slab_size height levels are read from the netcdf file at a time,
+    see plot_3d.stream_conditional_profiles. The horizontal plots and movies of plot_3d need the whole fields
+    for their color scales and are not created.
+    Input:
+      plots             -- Plot setup module
+      cf                -- Case setup module
+      nc_3d             -- Dataset of the 3D snapshot
+      h                 -- Height levels between idx_h0 and idx_h1
+      idx_h0, idx_h1    -- Height level indices
+      dil_len           -- Dilation length used for the halo
+      slab_size         -- Number of height levels processed at a time
+    """
+    logger.info('plot_3d_chunked')
+    out_dir, jpg_dir, plot_case_name, out_pdf = init_plotgen(plots, cf)
+    varnames = get_3d_varnames(plots)
+    profiles, dims = p3d.stream_conditional_profiles(nc_3d, varnames, idx_h0, idx_h1, dil_len=dil_len, slab_size=slab_size, filler=plots.filler)
+    logger.debug("dims=%s", str(dims))
+    plot_conditional_profiles(plots, cf, profiles, h, dims, out_dir, jpg_dir, plot_case_name, out_pdf, dil_len)
+
+
+def plot_3d_series(plots, cf, nc_files, h, idx_h0, idx_h1, dil_len=1, slab_size=default_slab_size, nprocs=None):
+    """
+    Generates time averaged cloud conditional profiles from many SAM 3D snapshots.
+    The snapshots are processed in parallel (see plot_3d.process_snapshots), the profiles of every snapshot
+    are saved to the snapshots subfolder of the output directory, and the time averages
+    (see plot_3d.average_profiles) are saved to profiles_3d_mean.npz and plotted.
+    Input:
+      plots             -- Plot setup module
+      cf                -- Case setup module
+      nc_files          -- Names of the 3D snapshot files
+      h                 -- Height levels between idx_h0 and idx_h1
+      idx_h0, idx_h1    -- Height level indices
+      dil_len           -- Dilation length used for the halo
+      slab_size         -- Number of height levels processed at a time
+      nprocs            -- Number of processes, defaults to the number of CPUs
+    """
+    logger.info('plot_3d_series')
+    out_dir, jpg_dir, plot_case_name, out_pdf = init_plotgen(plots, cf)
+    varnames = get_3d_varnames(plots)
+    out_files = p3d.process_snapshots(nc_files, os.path.join(out_dir, 'snapshots'), varnames, idx_h0, idx_h1, dil_len=dil_len, slab_size=slab_size, filler=plots.filler, nprocs=nprocs)
+    profiles, dims = p3d.average_profiles(out_files)
+    logger.debug("dims=%s", str(dims))
+    np.savez(os.path.join(out_dir, 'profiles_3d_mean.npz'), h=h, dims=np.array(dims), **profiles)
+    plot_conditional_profiles(plots, cf, profiles, h, dims, out_dir, jpg_dir, plot_case_name, out_pdf, dil_len)
+
+
+def get_3d_varnames(plots):
+    """
+    Get the variable names and conversion factors of the 3D fields from the plot setup
+    Input:
+      plots             -- Plot setup module
+    Output:
+      Dictionary mapping qn, qv, u, v, w to (variable name, conversion factor)
+    """
+    varnames = {}
+    for label, lines in zip(plots.sortPlots_3d, plots.lines_3d):
+        varnames[label.replace('_3d','')] = (lines[0][2], lines[0][3])
+    return varnames
+
+
+
+def plot_conditional_profiles(plots, cf, profiles, h, dims, out_dir, jpg_dir, plot_case_name, out_pdf, dil_len=1):
+    """
+    Create cloud conditional profile plots from the profiles of a 3D snapshot
+    and write the plot parameters to a params file
+    Input:
+      plots             -- Plot setup module
+      cf                -- Case setup module
+      profiles          -- Dictionary of profiles, see plot_3d.get_conditional_profiles
+      h                 -- Height levels of the profiles
+      dims              -- Shape (z,x,y) of the 3D fields
+      out_dir, jpg_dir, plot_case_name, out_pdf -- Output names, see init_plotgen
+      dil_len           -- Dilation length used for the halo
+    """
+    logger.info('plot_conditional_profiles')
+    N = dims[1]*dims[2]
+    cld_cnt = profiles['cld_cnt']
+    halo_cnt = profiles['halo_cnt']
+    nocld_cnt = profiles['nocld_cnt']
+    dilated_cnt = profiles['dilated_cnt']
+    uw_cld, uw_halo, uw_nocld = profiles['uw_cld'], profiles['uw_halo'], profiles['uw_nocld']
+    vw_cld, vw_halo, vw_nocld = profiles['vw_cld'], profiles['vw_halo'], profiles['vw_nocld']
+    wq_cld, wq_halo, wq_nocld = profiles['wq_cld'], profiles['wq_halo'], profiles['wq_nocld']
+    u_cld_mean, u_halo_mean, u_nocld_mean = profiles['u_cld'], profiles['u_halo'], profiles['u_nocld']
+    v_cld_mean, v_halo_mean, v_nocld_mean = profiles['v_cld'], profiles['v_halo'], profiles['v_nocld']
+    w_cld_mean, w_halo_mean, w_nocld_mean = profiles['w_cld'], profiles['w_halo'], profiles['w_nocld']
+    # Create plots for conditional u'w':
     logger.debug(plot_case_name)
     cutoff=-10
     uw_pdf = PdfPages(os.path.join(out_dir, out_pdf.format(wt='conditional_uw_profiles')))
@@ -1067,8 +1115,8 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
         #pb.plot_profiles([uw_plots[k]], h[:cutoff], r"Cloud Conditional $\mathrm{\overline{u'w'}\ \left[\frac{m^2}{s^2}\right]}$", cf.yLabel, uw_plots[k][0], os.path.join(jpg_dir,'uw_cld{}'.format(k)), startLevel=0, lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
         pb.plot_profiles([uw_plots[k]], h[:cutoff], r"Cloud Conditional $\mathrm{\overline{u'w'}\ \left[\frac{m^2}{s^2}\right]}$", cf.yLabel, uw_plots[k][0], os.path.join(jpg_dir,'uw_cld{}'.format(k)), lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
 
-    #pb.plot_profiles([["u'^2",True,'dummy',0,np.nanmean(up*up, axis=(1,2))]], h, "u'^2", cf.yLabel, "u'^2", os.path.join(jpg_dir,'up2'), startLevel=0, lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
-    pb.plot_profiles([["u'^2",True,'dummy',0,np.nanmean(up*up, axis=(1,2))]], h, "u'^2", cf.yLabel, "u'^2", os.path.join(jpg_dir,'up2'), lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
+    #pb.plot_profiles([["u'^2",True,'dummy',0,profiles['up2']]], h, "u'^2", cf.yLabel, "u'^2", os.path.join(jpg_dir,'up2'), startLevel=0, lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
+    pb.plot_profiles([["u'^2",True,'dummy',0,profiles['up2']]], h, "u'^2", cf.yLabel, "u'^2", os.path.join(jpg_dir,'up2'), lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
     
     #pb.plot_profiles(uw_plots, h[:cutoff], r"Cloud conditional $\mathrm{\overline{u'w'}\ \left[\frac{m^2}{s^2}\right]}$", cf.yLabel, r"Conditional means of $\mathrm{\overline{u'w'}}$", os.path.join(jpg_dir,'uw_cld_all'), startLevel=0, lw=cf.lw, grid=False, centering=True, pdf=uw_pdf)
     pb.plot_profiles(uw_plots, h[:cutoff], r"Cloud conditional $\mathrm{\overline{u'w'}\ \left[\frac{m^2}{s^2}\right]}$", cf.yLabel, r"Conditional means of $\mathrm{\overline{u'w'}}$", os.path.join(jpg_dir,'uw_cld_all'), lw=cf.lw, grid=False, centering=True, pdf=uw_pdf)
@@ -1086,8 +1134,8 @@ def plot_3d(plots, cf, data, h, h_limits, h_extent, fps=2, dil_len=1, gif=False)
         #pb.plot_profiles([vw_plots[k]], h[:cutoff], r"Cloud conditional $\mathrm{\overline{v'w'}\ \left[\frac{m^2}{s^2}\right]}$", cf.yLabel, vw_plots[k][0], os.path.join(jpg_dir,'vw_cld{}'.format(k)), startLevel=0, lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
         pb.plot_profiles([vw_plots[k]], h[:cutoff], r"Cloud conditional $\mathrm{\overline{v'w'}\ \left[\frac{m^2}{s^2}\right]}$", cf.yLabel, vw_plots[k][0], os.path.join(jpg_dir,'vw_cld{}'.format(k)), lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
     
-    #pb.plot_profiles([["v'^2",True,'dummy', 0,np.nanmean(vp*vp, axis=(1,2))]], h, "v'^2", cf.yLabel, "v'^2", os.path.join(jpg_dir,'vp2'), startLevel=0, lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
-    pb.plot_profiles([["v'^2",True,'dummy', 0,np.nanmean(vp*vp, axis=(1,2))]], h, "v'^2", cf.yLabel, "v'^2", os.path.join(jpg_dir,'vp2'), lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
+    #pb.plot_profiles([["v'^2",True,'dummy', 0,profiles['vp2']]], h, "v'^2", cf.yLabel, "v'^2", os.path.join(jpg_dir,'vp2'), startLevel=0, lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
+    pb.plot_profiles([["v'^2",True,'dummy', 0,profiles['vp2']]], h, "v'^2", cf.yLabel, "v'^2", os.path.join(jpg_dir,'vp2'), lw=cf.lw, grid=False, centering=False, pdf=uw_pdf)
     
     #pb.plot_profiles(vw_plots, h[:cutoff], r"Cloud conditional $\mathrm{\overline{v'w'}\ \left[\frac{m^2}{s^2}\right]}$", cf.yLabel, r"Conditional means of $\mathrm{\overline{v'w'}}$", os.path.join(jpg_dir,'vw_cld_all'), startLevel=0, lw=cf.lw, grid=False, centering=True, pdf=uw_pdf)
     pb.plot_profiles(vw_plots, h[:cutoff], r"Cloud conditional $\mathrm{\overline{v'w'}\ \left[\frac{m^2}{s^2}\right]}$", cf.yLabel, r"Conditional means of $\mathrm{\overline{v'w'}}$", os.path.join(jpg_dir,'vw_cld_all'), lw=cf.lw, grid=False, centering=True, pdf=uw_pdf)
@@ -1355,8 +1403,23 @@ def plotgen_3d(plots, cf):
     Data is processed here and afterwards, the plot_3d routine is called to create plots and movies.
     """
     logger.info("plotgen_3d")
+    # Case files may set slab_size to process big 3D snapshots in chunks (see plot_3d_chunked)
+    chunk_levels = getattr(cf, 'slab_size', slab_size)
+    # Case files may set sam_3d_files to average over many 3D snapshots (see plot_3d_series)
+    series_files = []
+    if getattr(cf, 'sam_3d_files', None):
+        series_files = sorted(glob.glob(cf.sam_3d_files))
+        if not series_files:
+            logger.error('No files match {}, specified as sam_3d_files in the {} case file.'.format(cf.sam_3d_files, cf.case))
+            sys.exit()
+        logger.info("Found %d sam_3d snapshots matching %s", len(series_files), cf.sam_3d_files)
+        chunk_levels = chunk_levels or default_slab_size
     gif = None
     for n in range(ntrials):
+        if chunk_levels:
+            # No movies are created in chunked mode
+            gif = False
+            break
         user_input = raw_input('Movie output as .mp4 (1) or .gif(2)? -> ')
         try:
             if int(user_input)==2:
@@ -1374,7 +1437,12 @@ def plotgen_3d(plots, cf):
     if gif is None:
         logger.error('Too many invalid trials. Exiting...')
         sys.exit()
-    nc_std,nc_3d = load_nc(plots, cf)
+    if series_files:
+        # The snapshots are opened by the processes of plot_3d_series
+        nc_std, = load_nc(plots, cf, sam_3d=False)
+        nc_3d = None
+    else:
+        nc_std,nc_3d = load_nc(plots, cf)
     #logger.info('Fetching information from prm file')
     #prm_vars = get_values_from_prm(cf)
     logger.info('Fetching dimension variables')
@@ -1400,6 +1468,14 @@ def plotgen_3d(plots, cf):
     # Calculate height level extents
     h_extent = np.diff(h_limits)
     logger.debug(h_extent)
+    if series_files:
+        logger.info("Processing sam_3d snapshots in slabs of %d levels", chunk_levels)
+        plot_3d_series(plots, cf, series_files, h, idx_h0, idx_h1, dil_len=dil_len, slab_size=chunk_levels, nprocs=getattr(cf, 'nprocs', nprocs))
+        return
+    if chunk_levels:
+        logger.info("Processing sam_3d data in slabs of %d levels", chunk_levels)
+        plot_3d_chunked(plots, cf, nc_3d, h, idx_h0, idx_h1, dil_len=dil_len, slab_size=chunk_levels)
+        return
     logger.info("Fetching sam data")
     # TODO: Change structure of 3d setup file as well?
     data_std = get_all_variables(nc_std, plots.lines_std, plots.sortPlots_std, len(h), nt, idx_t0, idx_t1, idx_h0, idx_h1, filler=plots.filler)